@@ -0,0 +1,64 @@
+"""
+Cold-start comparison between the JSON shelf and the memory-mapped binary shelf.
+
+For each dataset size the script times how long it takes until the first lookup by id can be answered:
+    json        `json.load` of the whole file followed by a linear search
+    binary      `BinaryShelf` open followed by a binary search in the id index
+and then the cost of 1000 random lookups on the opened store.
+
+usage: python benchmarks/coldstart.py [size ...]        (default: 10000 100000 1000000)
+"""
+
+import json;
+import sys;
+import random;
+from time import perf_counter;
+
+from datasets import ensureDataset, datasetPath;
+from binShelves import BinaryShelf, jsonToBinary;
+
+COLDSTART__DEFAULT_SIZES = [10_000, 100_000, 1_000_000];
+COLDSTART__LOOKUPS = 1000;
+
+
+def coldstartJson(filepath: str, ids: list[int]) -> dict:
+    start = perf_counter();
+    with open(filepath, 'r') as f:
+        data = json.load(f);
+    next(entry for entry in data if entry['task']['id'] == ids[0]);
+    ready = perf_counter() - start;
+
+    by_id = {entry['task']['id']: entry for entry in data};
+    start = perf_counter();
+    for id in ids:
+        by_id[id];
+    lookups = perf_counter() - start;
+
+    return {'format': 'json', 'ready_s': ready, 'lookups_s': lookups};
+
+def coldstartBinary(filepath: str, ids: list[int]) -> dict:
+    start = perf_counter();
+    shelf = BinaryShelf(filepath);
+    shelf.find(ids[0]);
+    ready = perf_counter() - start;
+
+    start = perf_counter();
+    for id in ids:
+        shelf.find(id);
+    lookups = perf_counter() - start;
+    shelf.close();
+
+    return {'format': 'binary', 'ready_s': ready, 'lookups_s': lookups};
+
+
+if __name__ == '__main__':
+    sizes = [int(size) for size in sys.argv[1:]] or COLDSTART__DEFAULT_SIZES;
+
+    for size in sizes:
+        json_filepath   = ensureDataset(size);
+        binary_filepath = datasetPath(size, 'bin');
+        jsonToBinary(json_filepath, binary_filepath);
+
+        ids = random.Random(size).sample(range(1, size + 1), min(COLDSTART__LOOKUPS, size));
+        for result in (coldstartJson(json_filepath, ids), coldstartBinary(binary_filepath, ids)):
+            print(json.dumps({'size': size, **result}));
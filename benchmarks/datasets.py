@@ -0,0 +1,49 @@
+"""
+Reproducible synthetic task datasets for the benchmarks.
+
+Tasks come from `tasks.setRandomTask()` with a fixed seed; ids are renumbered sequentially so they stay unique at any size.
+"""
+
+import os;
+import sys;
+import random;
+
+MODULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules');
+if(MODULES_DIR not in sys.path):
+    sys.path.insert(0, MODULES_DIR);
+
+from tasks import setRandomTask;
+from jsonShelves import writeShelf;
+
+DATASET__SEED   = 20240428;
+DATASET__DIR    = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data');
+
+
+def randomTasks(count: int, seed: int = DATASET__SEED):
+    """Yields `count` random `FormattedTask` objects with ids `1..count`. The same seed always yields the same tasks.
+    """
+    state = random.getstate();
+    random.seed(seed);
+    try:
+        for id in range(1, count + 1):
+            task = setRandomTask();
+            task.id = id;
+            yield task;
+    finally:
+        random.setstate(state);
+
+def randomTaskDicts(count: int, seed: int = DATASET__SEED):
+    for task in randomTasks(count, seed):
+        yield task.get();
+
+def datasetPath(count: int, extension: str = 'json') -> str:
+    return os.path.join(DATASET__DIR, f"tasks_{count}.{extension}");
+
+def ensureDataset(count: int, seed: int = DATASET__SEED) -> str:
+    """Writes the `count`-task dataset under `benchmarks/data/` unless it is already there, and returns its path.
+    """
+    filepath = datasetPath(count);
+    if(not os.path.exists(filepath)):
+        os.makedirs(DATASET__DIR, exist_ok=True);
+        writeShelf(filepath, randomTaskDicts(count, seed));
+    return filepath;
@@ -0,0 +1,163 @@
+"""
+Failure checks for the shelves: each case injects a failure (a write that cannot complete, a crash mid-write) and checks
+that no task is lost. Prints one line per case and exits with status 1 if any fails.
+
+usage: python benchmarks/durability.py
+"""
+
+import os;
+import sys;
+import json;
+import errno;
+import shutil;
+import tempfile;
+from unittest import mock;
+
+from datasets import randomTaskDicts;
+from jsonShelves import IterableShelve, ShelfException;
+from sharedShelves import SharedShelve;
+import shardedShelves;
+from shardedShelves import ShardedShelve;
+from indexr import taskKey;
+
+DURABILITY__TASKS = 50;
+
+
+def failingReplace(target: str):
+    """An `os.replace` that fails with ENOSPC when renaming over `target`, as on a full disk.
+    """
+    replace = os.replace;
+    def patched(source, destination, **kwargs):
+        if(os.fspath(destination) == target):
+            raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC));
+        return replace(source, destination, **kwargs);
+    return patched;
+
+def _ids(entries) -> set:
+    return {taskKey(task_dict) for task_dict in entries};
+
+#   Cases
+#   -----------------------------------------------------------------------------------------------------------------------
+def compactionFailure(directory: str) -> bool:
+    """The snapshot cannot be renamed into place while compacting: every task must survive in the journal.
+    """
+    filepath = os.path.join(directory, 'tasks_dict.json');
+    shelve = IterableShelve(filepath, journal=True, key=taskKey, track_changes=True);
+    shelve.insert_many(list(randomTaskDicts(DURABILITY__TASKS)));
+    with mock.patch('os.replace', failingReplace(filepath)):
+        try:
+            shelve.compact();
+            return False;
+        except ShelfException:
+            pass;
+    #   Written after the failure, to the journal that was put back
+    extra = next(randomTaskDicts(1, seed=1));
+    extra['task']['id'] = DURABILITY__TASKS + 1;
+    shelve.insert(extra);
+    shelve.journal.close();
+
+    reloaded = IterableShelve(filepath, journal=True, key=taskKey);
+    survived = _ids(reloaded.data) == set(range(1, DURABILITY__TASKS + 2));
+    reloaded.close();
+    return survived and _ids(IterableShelve(filepath, key=taskKey).data) == set(range(1, DURABILITY__TASKS + 2));
+
+def tornJournal(directory: str) -> bool:
+    """A crash tears the last journal line: the records appended after reopening must not be glued to it.
+    """
+    filepath = os.path.join(directory, 'tasks_dict.json');
+    entries = list(randomTaskDicts(4));
+    shelve = IterableShelve(filepath, journal=True, key=taskKey);
+    shelve.insert(entries[0]);
+    shelve.insert(entries[1]);
+    shelve.journal.close();
+    with open(f"{filepath}.journal", 'a') as f:
+        f.write(json.dumps({'op': 'insert', 'data': entries[2]})[:20]);
+
+    shelve = IterableShelve(filepath, journal=True, key=taskKey);
+    shelve.insert(entries[2]);
+    shelve.insert(entries[3]);
+    shelve.journal.close();
+    return _ids(IterableShelve(filepath, journal=True, key=taskKey).data) == {1, 2, 3, 4};
+
+def sharedCompactionFailure(directory: str) -> bool:
+    """Same as `compactionFailure` for a `SharedShelve`, whose journal is shared by every process.
+    """
+    filepath = os.path.join(directory, 'tasks_dict.json');
+    shelve = SharedShelve(filepath, taskKey);
+    shelve.insert_many(list(randomTaskDicts(DURABILITY__TASKS)));
+    with mock.patch('os.replace', failingReplace(filepath)):
+        try:
+            shelve.compact();
+            return False;
+        except ShelfException:
+            pass;
+    other = SharedShelve(filepath, taskKey);
+    survived = _ids(other.data) == set(range(1, DURABILITY__TASKS + 1)) and other.generation == shelve.generation;
+    other.close();
+    shelve.journal.close();
+    return survived and _ids(SharedShelve(filepath, taskKey).data) == set(range(1, DURABILITY__TASKS + 1));
+
+def inPlaceEdit(directory: str) -> bool:
+    """A task modified in place, not through `update`, must still be saved by `close(rescan=True)` on a change-tracking shelve, plain or sharded.
+    """
+    saved = True;
+    for name, opener in (('plain', lambda filepath: IterableShelve(filepath, key=taskKey, track_changes=True)), ('sharded', lambda filepath: ShardedShelve(filepath, taskKey, shards=4, track_changes=True))):
+        filepath = os.path.join(directory, f"{name}.json");
+        shelve = opener(filepath);
+        shelve.insert_many(list(randomTaskDicts(DURABILITY__TASKS)));
+        shelve.close();
+
+        shelve = opener(filepath);
+        shelve.get(7)['task']['name'] = 'edited in place';
+        shelve.close(rescan=True);
+        saved = saved and opener(filepath).get(7)['task']['name'] == 'edited in place';
+    return saved;
+
+def shardedSaveFailure(directory: str) -> bool:
+    """A shard cannot be written while saving a sharded shelve: reopening must find the previous save whole, not a mix of shards.
+    """
+    filepath = os.path.join(directory, 'tasks_dict.json');
+    shelve = ShardedShelve(filepath, taskKey, shards=4);
+    shelve.insert_many(list(randomTaskDicts(DURABILITY__TASKS)));
+    shelve.close();
+    previous = shelve.files();
+
+    shelve = ShardedShelve(filepath, taskKey, shards=4);
+    for task_id in range(1, DURABILITY__TASKS + 1):
+        shelve.get(task_id)['task']['name'] = 'unsaved';
+    shelve.dirty_shards.update(range(shelve.shards));
+    write, calls = shardedShelves.writeShelf, [];
+    def failing(path, entries, *args, **kwargs):
+        calls.append(path);
+        if(len(calls) == 3):
+            raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC));
+        return write(path, entries, *args, **kwargs);
+    with mock.patch('shardedShelves.writeShelf', failing):
+        shelve.save();
+    if(not shelve.dirty_shards):
+        return False;
+    untouched = 'unsaved' not in {task_dict['task']['name'] for task_dict in ShardedShelve(filepath, taskKey).data};
+
+    shelve.save();
+    saved = {task_dict['task']['name'] for task_dict in ShardedShelve(filepath, taskKey).data} == {'unsaved'};
+    return untouched and saved and not any(os.path.exists(path) for path in previous);
+
+DURABILITY__CASES = [compactionFailure, tornJournal, sharedCompactionFailure, inPlaceEdit, shardedSaveFailure];
+
+
+if __name__ == '__main__':
+    failed = [];
+    for case in DURABILITY__CASES:
+        directory = tempfile.mkdtemp(prefix='plib-durability-');
+        try:
+            passed = case(directory);
+        finally:
+            shutil.rmtree(directory);
+        print(json.dumps({'case': case.__name__, 'passed': passed}));
+        if(not passed):
+            failed.append(case.__name__);
+
+    if(failed):
+        print(f"FAILED: {', '.join(failed)}");
+        sys.exit(1);
+    print('OK');
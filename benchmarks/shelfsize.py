@@ -0,0 +1,66 @@
+"""
+Size and load time of the compressed and key-deduplicated shelf layouts.
+
+For each dataset size every variant is written from the same entries with `writeShelf`, then read back with `loadShelf`:
+    json            plain `IterableShelve` list
+    json.gz/xz/bz2  the same list through a `compressr` codec (json.zst as well when zstd is available)
+    dedup           key-deduplicated JSON-lines layout, format profiles hoisted
+    dedup.gz/...    the deduplicated layout through a codec
+Each line reports the file size, its ratio to the plain file, and the write and load times.
+
+usage: python benchmarks/shelfsize.py [size ...]        (default: 10000 100000)
+"""
+
+import os;
+import sys;
+import json;
+from time import perf_counter;
+
+from datasets import ensureDataset, datasetPath;
+from compressr import CODECS, CodecException;
+from jsonShelves import loadShelf, writeShelf;
+
+COMPRESSION__DEFAULT_SIZES = [10_000, 100_000];
+COMPRESSION__EXTENSIONS = {'gzip': 'gz', 'lzma': 'xz', 'bz2': 'bz2', 'zstd': 'zst'};
+
+
+def variants() -> list[tuple[str, str | None, bool]]:
+    """`(name, codec, dedup)` for every layout and available codec.
+    """
+    codecs = [None] + [name for name in COMPRESSION__EXTENSIONS if name in CODECS];
+    return [(('dedup' if dedup else 'json') + ('' if codec is None else f".{COMPRESSION__EXTENSIONS[codec]}"), codec, dedup) for dedup in (False, True) for codec in codecs];
+
+def measure(entries: list, filepath: str, codec: str | None, dedup: bool) -> dict:
+    start = perf_counter();
+    writeShelf(filepath, entries, codec, dedup);
+    write = perf_counter() - start;
+
+    start = perf_counter();
+    loaded = loadShelf(filepath, codec);
+    load = perf_counter() - start;
+    if(loaded != entries):
+        raise AssertionError(f"{filepath} does not round-trip.");
+
+    return {'bytes': os.path.getsize(filepath), 'write_s': write, 'load_s': load};
+
+
+if __name__ == '__main__':
+    sizes = [int(size) for size in sys.argv[1:]] or COMPRESSION__DEFAULT_SIZES;
+
+    for size in sizes:
+        with open(ensureDataset(size), 'r') as f:
+            entries = json.load(f);
+
+        baseline = None;
+        for name, codec, dedup in variants():
+            filepath = datasetPath(size, name);
+            try:
+                result = measure(entries, filepath, codec, dedup);
+            except CodecException as e:
+                print(json.dumps({'size': size, 'variant': name, 'skipped': str(e)}));
+                continue;
+            finally:
+                if(os.path.exists(filepath)):
+                    os.remove(filepath);
+            baseline = baseline or result['bytes'];
+            print(json.dumps({'size': size, 'variant': name, **result, 'ratio': result['bytes'] / baseline}));
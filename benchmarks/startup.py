@@ -0,0 +1,89 @@
+"""
+Startup cost of the command-line entry point (`python -m modules`).
+
+Every command runs in a fresh interpreter under `-X importtime`. For each one the script reports the median wall time,
+the wall time of a bare interpreter (`-c pass`) for reference, and `import_ms`, the time spent importing modules beyond
+what a bare interpreter imports (from the top-level entries of `-X importtime`), next to the same figure for an eager `import Taskr`.
+The tasks file gets a metadata sidecar first, so `count` and `stats` answer without reading the tasks.
+
+The run fails (exit status 1) when a command spends more than the import budget, in milliseconds, importing modules.
+
+usage: python benchmarks/startup.py [--size 10000] [--runs 5] [--budget 60]
+"""
+
+import os;
+import sys;
+import json;
+import shutil;
+import tempfile;
+import argparse;
+import subprocess;
+from statistics import median;
+from time import perf_counter;
+
+from datasets import ensureDataset, MODULES_DIR;
+from jsonShelves import loadShelf, writeShelfMeta;
+from Taskr import taskShelfMeta;
+
+STARTUP__ROOT       = os.path.dirname(os.path.abspath(MODULES_DIR));
+STARTUP__BUDGET_MS  = 60;
+STARTUP__RUNS       = 5;
+STARTUP__COMMANDS   = [['count'], ['stats'], ['next', '5'], ['overdue'], ['query', 'status=PENDING', 'order:-priority', 'limit:5']];
+
+
+def importTime(stderr: str) -> float:
+    """Milliseconds spent in the top-level imports reported by `-X importtime`, interpreter startup included.
+    """
+    total = 0;
+    for line in stderr.splitlines():
+        if(not line.startswith('import time:') or 'cumulative' in line):
+            continue;
+        _, cumulative, name = line[len('import time:'):].split('|');
+        if(not name.startswith('  ')):
+            total += int(cumulative);
+    return total / 1000;
+
+def run(arguments: list[str], runs: int) -> dict:
+    walls, imports = [], [];
+    for _ in range(runs):
+        start = perf_counter();
+        process = subprocess.run([sys.executable, '-X', 'importtime', *arguments], cwd=STARTUP__ROOT, capture_output=True, text=True);
+        walls.append((perf_counter() - start) * 1000);
+        if(process.returncode != 0):
+            raise RuntimeError(f"{arguments} failed: {process.stderr[-500:]}");
+        imports.append(importTime(process.stderr));
+    return {'wall_ms': median(walls), 'import_ms': median(imports)};
+
+
+if __name__ == '__main__':
+    arguments = argparse.ArgumentParser(description='Measures the startup time of the command-line entry point.');
+    arguments.add_argument('--size', type=int, default=10_000);
+    arguments.add_argument('--runs', type=int, default=STARTUP__RUNS);
+    arguments.add_argument('--budget', type=float, default=STARTUP__BUDGET_MS, help='import time budget per command, in milliseconds');
+    options = arguments.parse_args();
+
+    directory = tempfile.mkdtemp();
+    try:
+        filepath = os.path.join(directory, 'tasks_dict.json');
+        shutil.copyfile(ensureDataset(options.size), filepath);
+        entries = loadShelf(filepath);
+        writeShelfMeta(filepath, len(entries), taskShelfMeta(entries));
+
+        bare = run(['-c', 'pass'], options.runs);
+        print(json.dumps({'command': 'python -c pass', **bare}));
+        eager = run(['-c', f"import sys; sys.path.insert(0, {MODULES_DIR!r}); import Taskr"], options.runs);
+        print(json.dumps({'command': 'import Taskr (eager)', 'wall_ms': eager['wall_ms'], 'import_ms': eager['import_ms'] - bare['import_ms']}));
+
+        over = [];
+        for command in STARTUP__COMMANDS:
+            result = run(['-m', 'modules', '--tasks', filepath, *command], options.runs);
+            result['import_ms'] -= bare['import_ms'];
+            print(json.dumps({'command': ' '.join(command), **result, 'budget_ms': options.budget}));
+            if(result['import_ms'] > options.budget):
+                over.append(' '.join(command));
+    finally:
+        shutil.rmtree(directory);
+
+    if(over):
+        print(f"Import budget of {options.budget}ms exceeded by: {', '.join(over)}", file=sys.stderr);
+        sys.exit(1);
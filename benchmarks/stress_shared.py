@@ -0,0 +1,91 @@
+"""
+Stress test for `SharedShelve`: many processes insert into the same shelf file at once.
+
+Each worker opens its own `SharedShelve`, inserts its share of tasks one by one and in small batches,
+updates some of them and compacts from time to time. At the end a fresh reader checks that every task is
+present exactly once with its last update applied. Exits with status 1 if anything was lost.
+
+usage: python benchmarks/stress_shared.py [workers] [tasks_per_worker]      (default: 8 500)
+"""
+
+import os;
+import sys;
+import json;
+import tempfile;
+from multiprocessing import Process;
+from time import perf_counter;
+
+from datasets import randomTaskDicts;
+from sharedShelves import SharedShelve;
+from indexr import taskKey;
+
+STRESS__BATCH       = 10;
+STRESS__COMPACT_EVERY = 97;
+
+
+def worker(filepath: str, number: int, count: int) -> None:
+    shelve = SharedShelve(filepath, taskKey, compact_threshold=200);
+    offset = number * count;
+
+    batch = [];
+    for position, task_dict in enumerate(randomTaskDicts(count, seed=number)):
+        task_dict['task']['id'] = offset + position + 1;
+        if(position % 2):
+            batch.append(task_dict);
+            if(len(batch) == STRESS__BATCH):
+                shelve.insert_many(batch);
+                batch = [];
+        else:
+            shelve.insert(task_dict);
+
+        if(position % STRESS__COMPACT_EVERY == 0):
+            shelve.compact();
+    if(batch):
+        shelve.insert_many(batch);
+
+    #   Mark every task of this worker as updated
+    shelve.refresh();
+    updated = [];
+    for position in range(count):
+        task_dict = json.loads(json.dumps(shelve.get(offset + position + 1)));
+        task_dict['task']['updated_at'] = f"worker-{number}";
+        updated.append(task_dict);
+    shelve.update_many(updated);
+    shelve.close();
+
+
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 8;
+    count   = int(sys.argv[2]) if len(sys.argv) > 2 else 500;
+
+    directory = tempfile.mkdtemp(prefix='plib-stress-');
+    filepath  = os.path.join(directory, 'tasks_dict.json');
+
+    start = perf_counter();
+    processes = [Process(target=worker, args=(filepath, number, count)) for number in range(workers)];
+    for process in processes:
+        process.start();
+    for process in processes:
+        process.join();
+    elapsed = perf_counter() - start;
+
+    reader = SharedShelve(filepath, taskKey);
+    expected = workers * count;
+    ids = [taskKey(task_dict) for task_dict in reader.data];
+    stale = [task_dict for task_dict in reader.data if not task_dict['task']['updated_at'].startswith('worker-')];
+    failed = any(process.exitcode != 0 for process in processes);
+
+    print(json.dumps({
+        'workers': workers,
+        'tasks': expected,
+        'stored': len(ids),
+        'unique': len(set(ids)),
+        'stale': len(stale),
+        'elapsed_s': elapsed,
+        'writes_per_s': 2 * expected / elapsed
+    }));
+
+    if(failed or len(ids) != expected or len(set(ids)) != expected or stale):
+        print('FAILED: tasks were lost, duplicated or not updated.');
+        exit(1);
+    print('OK');
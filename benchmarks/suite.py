@@ -0,0 +1,266 @@
+"""
+Benchmark suite for the task, shelf, parser and logger hot paths.
+
+Every case runs on the seeded datasets of `datasets.py` and reports the best of `--repeat` runs.
+Results are written as JSON so that runs can be compared; `--compare` fails (exit status 1) when a case
+got slower than the baseline by more than `--threshold`.
+
+usage:
+    python benchmarks/suite.py [--sizes 1000 10000 ...] [--cases name ...] [--repeat 3] [--output results.json]
+                               [--compare baseline.json] [--threshold 0.10]
+"""
+
+import os;
+import sys;
+import json;
+import shutil;
+import argparse;
+import platform;
+import tempfile;
+from time import perf_counter;
+from datetime import datetime;
+
+from datasets import ensureDataset, randomTasks, randomTaskDicts;
+from tasks import Task, FormattedTask, setFormattedTaskFromDict, setFormattedTasksFromDicts, RENDER_CACHE;
+from jsonShelves import IterableShelve, DurabilityPolicy;
+from shardedShelves import ShardedShelve;
+from indexr import taskKey;
+from loggr import Loggr, LogLevel;
+from parsers import UserParserInterface, DELIMITER__SPACE, DELIMITER__COMMA;
+
+SUITE__DEFAULT_SIZES    = [1_000, 10_000, 100_000, 1_000_000];
+SUITE__INSERTS          = 200;
+#   Each plain insert rewrites the whole file, so fewer of them are timed
+SUITE__INSERTS_PERSISTED= 20;
+
+
+#   Cases: each takes the dataset size and a scratch directory, prepares its input and returns
+#   `(callable, operations)` or `(callable, operations, teardown)`; only the callable is timed
+#   -------------------------------------------------------------------------------------------------------------------
+def caseTaskConstruction(size: int, scratch: str):
+    fields = [(task.id, task.name, task.description, task.status, task.priority, task.due_date, task.created_at, task.updated_at, None) for task in randomTasks(size)];
+    return (lambda: [Task(*field) for field in fields]), size;
+
+def caseFormattedTaskConstruction(size: int, scratch: str):
+    fields = [(task.id, task.name, task.description, task.status, task.priority, task.due_date, task.created_at, task.updated_at, None) for task in randomTasks(size)];
+    return (lambda: [FormattedTask(*field) for field in fields]), size;
+
+def caseFromDict(size: int, scratch: str):
+    task_dicts = list(randomTaskDicts(size));
+    return (lambda: [setFormattedTaskFromDict(task_dict) for task_dict in task_dicts]), size;
+
+def caseFromDicts(size: int, scratch: str):
+    task_dicts = list(randomTaskDicts(size));
+    return (lambda: setFormattedTasksFromDicts(task_dicts)), size;
+
+def caseFromDictsTrusted(size: int, scratch: str):
+    task_dicts = list(randomTaskDicts(size));
+    return (lambda: setFormattedTasksFromDicts(task_dicts, trusted=True)), size;
+
+def caseRender(size: int, scratch: str):
+    """Renders every task with an empty `RENDER_CACHE`, so each run formats the lines instead of timing cache hits.
+    """
+    tasks = list(randomTasks(size));
+    def run():
+        RENDER_CACHE.clear();
+        return [str(task) for task in tasks];
+    return run, size;
+
+def caseRenderCached(size: int, scratch: str):
+    """Renders every task again with the lines of the previous run in `RENDER_CACHE` (all hits up to its size).
+    """
+    tasks = list(randomTasks(size));
+    RENDER_CACHE.clear();
+    for task in tasks:
+        str(task);
+    return (lambda: [str(task) for task in tasks]), size, RENDER_CACHE.clear;
+
+def caseShelveLoad(size: int, scratch: str):
+    filepath = ensureDataset(size);
+    return (lambda: IterableShelve(filepath)), size;
+
+def caseShardedLoad(size: int, scratch: str):
+    filepath = os.path.join(scratch, 'sharded.json');
+    shutil.copyfile(ensureDataset(size), filepath);
+    ShardedShelve(filepath, taskKey);
+    return (lambda: ShardedShelve(filepath, taskKey)), size;
+
+def caseShardedUpdate(size: int, scratch: str):
+    """One update per run: only the shard holding the task is rewritten.
+    """
+    filepath = os.path.join(scratch, 'sharded_update.json');
+    shutil.copyfile(ensureDataset(size), filepath);
+    shelve = ShardedShelve(filepath, taskKey);
+    task_dict = shelve.get(1);
+    return (lambda: shelve.update(task_dict)), 1;
+
+def caseShelveSave(size: int, scratch: str):
+    filepath = os.path.join(scratch, 'save.json');
+    shutil.copyfile(ensureDataset(size), filepath);
+    shelve = IterableShelve(filepath);
+    return shelve.save, size;
+
+def caseShelveInsert(size: int, scratch: str):
+    """`SUITE__INSERTS_PERSISTED` single inserts into a shelve that already holds `size` tasks; each insert persists.
+    """
+    filepath = os.path.join(scratch, 'insert.json');
+    shutil.copyfile(ensureDataset(size), filepath);
+    shelve = IterableShelve(filepath);
+    extra = list(randomTaskDicts(SUITE__INSERTS_PERSISTED, seed=size));
+
+    def run():
+        for task_dict in extra:
+            shelve.insert(task_dict);
+        del shelve.data[size:];
+    return run, SUITE__INSERTS_PERSISTED;
+
+def caseShelveInsertJournal(size: int, scratch: str):
+    filepath = os.path.join(scratch, 'insert_journal.json');
+    shutil.copyfile(ensureDataset(size), filepath);
+    shelve = IterableShelve(filepath, journal=True, compact_threshold=SUITE__INSERTS * 1000);
+    extra = list(randomTaskDicts(SUITE__INSERTS, seed=size));
+
+    def run():
+        for task_dict in extra:
+            shelve.insert(task_dict);
+    return run, SUITE__INSERTS;
+
+def _burstCase(size: int, scratch: str, durability: DurabilityPolicy):
+    """`SUITE__INSERTS` updates cycling over 10 tasks of a tracked shelve holding `size` tasks, then a flush.
+    """
+    filepath = os.path.join(scratch, f"burst_{durability.name}.json");
+    shutil.copyfile(ensureDataset(size), filepath);
+    shelve = IterableShelve(filepath, key=taskKey, track_changes=True, durability=durability);
+    task_dicts = [shelve.get(id) for id in range(1, 11)];
+
+    def run():
+        for position in range(SUITE__INSERTS_PERSISTED if durability == DurabilityPolicy.IMMEDIATE else SUITE__INSERTS):
+            task_dict = dict(task_dicts[position % 10]);
+            task_dict['task'] = {**task_dict['task'], 'updated_at': str(position)};
+            shelve.update(task_dict);
+        shelve.flush();
+    return run, SUITE__INSERTS_PERSISTED if durability == DurabilityPolicy.IMMEDIATE else SUITE__INSERTS;
+
+def caseUpdateBurst(size: int, scratch: str):
+    return _burstCase(size, scratch, DurabilityPolicy.IMMEDIATE);
+
+def caseUpdateBurstDeferred(size: int, scratch: str):
+    return _burstCase(size, scratch, DurabilityPolicy.ON_CLOSE);
+
+def _loggrCase(size: int, scratch: str, async_mode: bool):
+    loggr = Loggr(os.path.join(scratch, f"loggr_{async_mode}.log"), LogLevel.INFO, async_mode=async_mode);
+    messages = [f"New task added: {position}" for position in range(size)];
+
+    def run():
+        for message in messages:
+            loggr.info(message);
+        loggr.flush();
+    #   Loggr instances share one `logging` logger, so the handler must go before the next case
+    return run, size, loggr.close;
+
+def caseLoggr(size: int, scratch: str):
+    return _loggrCase(size, scratch, False);
+
+def caseLoggrAsync(size: int, scratch: str):
+    return _loggrCase(size, scratch, True);
+
+def caseParser(size: int, scratch: str):
+    interface = UserParserInterface();
+    interface.setParser(['new', 'task'], [DELIMITER__SPACE, DELIMITER__COMMA], ['--verbose', '--trace'], ['-t', '-y'], ['SILENT', 'STORE', 'UPDATE', 'DELETE', 'RETRIEVE']);
+    lines = [f"new task --verbose -t {'STORE' if position % 2 else 'UPDATE'}".split(DELIMITER__SPACE) for position in range(size)];
+    return (lambda: [interface.buildAction(line) for line in lines]), size;
+
+CASES = {
+    'task.construct':           caseTaskConstruction,
+    'formatted_task.construct': caseFormattedTaskConstruction,
+    'formatted_task.from_dict': caseFromDict,
+    'formatted_task.from_dicts':caseFromDicts,
+    'formatted_task.from_dicts_trusted': caseFromDictsTrusted,
+    'formatted_task.render':    caseRender,
+    'formatted_task.render_cached': caseRenderCached,
+    'shelve.load':              caseShelveLoad,
+    'shelve.save':              caseShelveSave,
+    'sharded.load':             caseShardedLoad,
+    'sharded.update':           caseShardedUpdate,
+    'shelve.insert':            caseShelveInsert,
+    'shelve.insert_journal':    caseShelveInsertJournal,
+    'shelve.update_burst':      caseUpdateBurst,
+    'shelve.update_burst_deferred': caseUpdateBurstDeferred,
+    'loggr.info':               caseLoggr,
+    'loggr.info_async':         caseLoggrAsync,
+    'parser.build_action':      caseParser
+};
+
+
+def runCase(name: str, size: int, repeat: int) -> dict:
+    scratch = tempfile.mkdtemp(prefix='plib-bench-');
+    try:
+        prepared = CASES[name](size, scratch);
+        function, operations = prepared[:2];
+        timings = [];
+        for _ in range(repeat):
+            start = perf_counter();
+            function();
+            timings.append(perf_counter() - start);
+        if(len(prepared) > 2):
+            prepared[2]();
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True);
+
+    best = min(timings);
+    return {'case': name, 'size': size, 'operations': operations, 'best_s': best, 'mean_s': sum(timings) / len(timings), 'ops_per_s': operations / best if best else None};
+
+def compare(results: list[dict], baseline_filepath: str, threshold: float) -> list[dict]:
+    """Returns the results slower than their baseline counterpart by more than `threshold` (relative).
+    """
+    with open(baseline_filepath, 'r') as f:
+        baseline = {(result['case'], result['size']): result for result in json.load(f)['results']};
+
+    regressions = [];
+    for result in results:
+        reference = baseline.get((result['case'], result['size']));
+        if(reference is not None and result['best_s'] > reference['best_s'] * (1 + threshold)):
+            regressions.append({**result, 'baseline_s': reference['best_s'], 'slowdown': result['best_s'] / reference['best_s']});
+    return regressions;
+
+
+if __name__ == '__main__':
+    arguments = argparse.ArgumentParser(description='plib benchmark suite');
+    arguments.add_argument('--sizes', type=int, nargs='+', default=SUITE__DEFAULT_SIZES);
+    arguments.add_argument('--cases', nargs='+', default=list(CASES), choices=list(CASES));
+    arguments.add_argument('--repeat', type=int, default=3);
+    arguments.add_argument('--output', default=None);
+    arguments.add_argument('--compare', default=None);
+    arguments.add_argument('--threshold', type=float, default=0.10);
+    options = arguments.parse_args();
+
+    results = [];
+    for size in options.sizes:
+        for name in options.cases:
+            result = runCase(name, size, options.repeat);
+            results.append(result);
+            print(json.dumps(result), file=sys.stderr);
+
+    report = {
+        'meta': {
+            'timestamp':    datetime.now().isoformat(timespec='seconds'),
+            'python':       platform.python_version(),
+            'platform':     platform.platform(),
+            'sizes':        options.sizes,
+            'repeat':       options.repeat
+        },
+        'results': results
+    };
+
+    if(options.output):
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=4);
+    else:
+        print(json.dumps(report, indent=4));
+
+    if(options.compare):
+        regressions = compare(results, options.compare, options.threshold);
+        for regression in regressions:
+            print(f"REGRESSION {regression['case']} @ {regression['size']}: {regression['slowdown']:.2f}x slower", file=sys.stderr);
+        if(regressions):
+            exit(1);
@@ -1,3 +1,4 @@
+import sys;
 import modules.tasks as tasks;
 import modules.jsonShelves as Shelves
 
@@ -7,11 +8,17 @@ FTASKS: list[tasks.FormattedTask] = [];
 
 
 if __name__ == '__main__':
-    shelve = Shelves.IterableShelve('tasks.json');
-    TASKS = shelve.data;
+    #   Usage: main.py [filepath] [status]
+    filepath    = sys.argv[1] if len(sys.argv) > 1 else 'tasks.json';
+    status      = sys.argv[2] if len(sys.argv) > 2 else None;
     
-    for task in TASKS:
-        t = tasks.setFormattedTaskFromDict(task);
+    #   Entries are streamed from disk, so the file is never held in memory as a whole
+    TASKS = Shelves.iterShelf(filepath);
+    #   Stored statuses are `TaskStatus.X` strings or, in compact records, integer codes
+    wanted      = tasks.decodeTaskStatus(status) if status else None;
+    predicate   = (lambda task: tasks.TASK_STATUS__DECODE.get(task['task']['status']) is wanted) if status else None;
+    
+    for t in tasks.iterFormattedTasksFromDicts(TASKS, predicate):
         print(t);
     
     exit('end of execution');
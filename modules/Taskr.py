@@ -7,15 +7,27 @@ v0.1.0
 """
 
 from enum                   import Enum;
-from typing                 import List;
+from typing                 import Iterable;
 from datetime               import datetime;
 from jsonShelves    import *;
 from tasks          import *;
 from loggr          import *;
+from indexr         import TaskIndexr, taskKey, taskStatus, taskPriority;
+#   sharedShelves, shardedShelves, queries, schedulr, searchr and versionr are imported by the methods that use them
 
 #   The `TaskFile` namedtuple contains information about the tasks file.
 TaskFileData = namedtuple('TaskFileData', ['filepath', 'num_tasks', 'size', 'created', 'last_acessed']);
 
+def taskShelfMeta(entries: list[dict]) -> dict:
+    """Per-status and per-priority task counts, stored in the shelf metadata sidecar (see `jsonShelves.writeShelfMeta`).
+    """
+    status      = dict.fromkeys((member.name for member in TaskStatus), 0);
+    priority    = dict.fromkeys((member.name for member in TaskPriority), 0);
+    for entry in entries:
+        status[taskStatus(entry).name] += 1;
+        priority[taskPriority(entry).name] += 1;
+    return {'status': status, 'priority': priority};
+
 #   Status codes for the `Taskr` class.
 class TaskrStatus(Enum):
     TASKR_STATUS__SUCCESS           = 0;
@@ -31,10 +43,16 @@ class TaskrStatus(Enum):
 class Taskr:
     """Manager class for `Task`, `FormattedTask` objects.
     """
-    __slots__ = ['parser', 'shelve', 'loggr'];
+    __slots__ = ['parser', 'filepath', 'shelve_config', '_shelve', 'loggr', '_indexr', 'scheduler', 'search', 'versions', 'stats', 'compact_enums'];
     parser: TaskParser | None;
-    shelve: IterableShelve | None;
+    _shelve: IterableShelve | None;
     loggr: Loggr | None;
+    _indexr: TaskIndexr | None;
+    scheduler: 'Scheduler | None';
+    search: 'SearchIndex | None';
+    versions: 'VersionStore | None';
+    stats: dict | None;
+    compact_enums: bool;
     
     DEFAULT__FILEPATH_DICT = {
         'logfile'           : r'./logs/taskr.log',
@@ -46,7 +64,31 @@ class Taskr:
         'log_file'          : DEFAULT__FILEPATH_DICT['logfile'],
         'log_level'         : LogLevel.DEBUG,
         'formatter_string'  : '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        'datefmt'           : '%m-%d-%Y %I:%M:%S %p'
+        'datefmt'           : '%m-%d-%Y %I:%M:%S %p',
+        'async_mode'        : False,
+        'queue_size'        : 10000,
+        'policy'            : LogQueuePolicy.BLOCK
+    };
+    
+    DEFAULT__SHELVE_CONFIG = {
+        'journal'           : False,
+        'compact_threshold' : IterableShelve.DEFAULT__COMPACT_THRESHOLD,
+        'track_changes'     : True,
+        'shared'            : False,
+        'compact_enums'     : False,
+        'sharded'           : False,
+        'shards'            : 8,          #   `shardedShelves.SHARDS__DEFAULT`
+        'partition'         : 'hash',
+        'durability'        : DurabilityPolicy.IMMEDIATE,
+        'flush_ops'         : IterableShelve.DEFAULT__FLUSH_OPS,
+        'flush_ms'          : IterableShelve.DEFAULT__FLUSH_MS,
+        'codec'             : None,
+        'dedup'             : False,
+        'stats_only'        : False,      #   answer `count`, `getStats` and `getTaskFileData` from the sidecar only
+        'lazy'              : False,      #   open the shelve on first use instead of in `__init__`
+        'rescan'            : False,      #   on `update` and `close`, also save tasks modified in place, at the cost of a full comparison with the file
+        'versions'          : False,      #   keep versions from the start, so every change can be undone; see `getVersions`
+        'undo_depth'        : 100         #   `versionr.VERSIONS__DEPTH`
     };
     
     def __checkFiles(self, filepaths:dict, create_always:bool=False) -> bool:
@@ -69,27 +111,108 @@ class Taskr:
                     except:
                         return False;
     
-    def __init__(self, filepaths:dict=DEFAULT__FILEPATH_DICT, loggr_config:dict=DEFAULT__LOGGR_CONFIG):
+    def __init__(self, filepaths:dict=DEFAULT__FILEPATH_DICT, loggr_config:dict=DEFAULT__LOGGR_CONFIG, shelve_config:dict=DEFAULT__SHELVE_CONFIG):
         self.__checkFiles(filepaths);
         
         self.parser = TaskParser();
-        self.shelve = IterableShelve(filepaths['tasks_dict']);
-        self.loggr  = Loggr(loggr_config['log_file'], loggr_config['log_level'], loggr_config['formatter_string'], loggr_config['datefmt']);
+        #   Store status/priority as integer codes instead of `TaskStatus.X` strings; both are always read back
+        self.compact_enums = shelve_config.get('compact_enums', False);
+        self.filepath       = filepaths['tasks_dict'];
+        self.shelve_config  = shelve_config;
+        self._shelve        = None;
+        self._indexr        = None;
+        self.versions       = None;
+        #   Stats mode: counts and timestamps come from the metadata sidecar, and the tasks are only loaded by the calls that need them
+        self.stats          = readShelfMeta(self.filepath) if shelve_config.get('stats_only', False) else None;
+        if(self.stats is None and not shelve_config.get('lazy', False)):
+            self._open();
+        self.scheduler = None;
+        self.search = None;
+        self.loggr  = Loggr(loggr_config['log_file'], loggr_config['log_level'], loggr_config['formatter_string'], loggr_config['datefmt'], loggr_config.get('async_mode', False), loggr_config.get('queue_size', 10000), loggr_config.get('policy', LogQueuePolicy.BLOCK));
         
         self.loggr.info('Taskr initialized.');
         
         
         
     
+    def _open(self) -> None:
+        shelve_config = self.shelve_config;
+        #   When a plain shelve writes its file after a change, see `jsonShelves.DurabilityPolicy`
+        durability = {
+            'durability': shelve_config.get('durability', DurabilityPolicy.IMMEDIATE),
+            'flush_ops':  shelve_config.get('flush_ops', IterableShelve.DEFAULT__FLUSH_OPS),
+            'flush_ms':   shelve_config.get('flush_ms', IterableShelve.DEFAULT__FLUSH_MS)
+        };
+        if(shelve_config.get('shared', False)):
+            #   Several processes may work on the same file; see `sharedShelves`
+            from sharedShelves import SharedShelve;
+            shelve = SharedShelve(self.filepath, taskKey, shelve_config['compact_threshold']);
+        elif(shelve_config.get('sharded', False)):
+            #   `tasks_dict` holds the manifest; the tasks live in shard files next to it, see `shardedShelves`
+            from shardedShelves import ShardedShelve, SHARDS__DEFAULT;
+            shelve = ShardedShelve(self.filepath, taskKey, shelve_config.get('shards', SHARDS__DEFAULT), shelve_config.get('partition', 'hash'), track_changes=shelve_config.get('track_changes', True), codec=shelve_config.get('codec'), dedup=shelve_config.get('dedup', False), **durability);
+        else:
+            shelve = IterableShelve(self.filepath, shelve_config['journal'], shelve_config['compact_threshold'], key=taskKey, track_changes=shelve_config.get('track_changes', True), codec=shelve_config.get('codec'), dedup=shelve_config.get('dedup', False), **durability);
+        self._indexr = TaskIndexr();
+        shelve.attach(self._indexr);
+        self._shelve = shelve;
+        if(shelve_config.get('versions', False)):
+            self.getVersions();
+        shelve.meta = self._shelfMeta;
+        if(readShelfMeta(self.filepath) is None):
+            writeShelfMeta(self.filepath, len(shelve), self._shelfMeta(shelve.data));
+    
+    @property
+    def shelve(self) -> IterableShelve:
+        """The shelve of the tasks, opened (and the file loaded) on first access when `Taskr` was created lazily or in stats mode.
+        """
+        if(self._shelve is None):
+            self._open();
+        return self._shelve;
+    
+    @property
+    def indexr(self) -> TaskIndexr:
+        if(self._shelve is None):
+            self._open();
+        return self._indexr;
+    
     def __len__(self) -> int:
-        return len(self.tasks);
+        return self.count();
+    
+    def _sharded(self) -> bool:
+        """Whether the shelve is a `ShardedShelve`, told from the configuration so that `shardedShelves` is only imported when used.
+        """
+        return self.shelve_config.get('sharded', False) and not self.shelve_config.get('shared', False);
+
+    def _shelfMeta(self, entries: list[dict]) -> dict:
+        meta = taskShelfMeta(entries);
+        if(self._sharded()):
+            meta['files'] = self.shelve.files();
+        return meta;
     
     def size(self) -> int:
-        return os.path.getsize(self.shelve.filepath);
+        if(self._shelve is None and self.stats is not None):
+            files = self.stats.get('files', []);
+        else:
+            files = self.shelve.files() if self._sharded() else [];
+        return os.path.getsize(self.filepath) + sum(os.path.getsize(filepath) for filepath in files if os.path.exists(filepath));
+    
+    def getStats(self) -> dict:
+        """Task count, per-status and per-priority counts and last write time, without going through the tasks:
+        from the metadata sidecar in stats mode until the shelve is opened, from the indexes otherwise.
+        """
+        if(self._shelve is None and self.stats is not None):
+            return {'count': self.stats['count'], 'status': self.stats['status'], 'priority': self.stats['priority'], 'last_write': self.stats['last_write']};
+        return {
+            'count':        len(self.shelve),
+            'status':       {member.name: self.indexr.status.count(member) for member in TaskStatus},
+            'priority':     {member.name: self.indexr.priority.count(member) for member in TaskPriority},
+            'last_write':   os.path.getmtime(self.filepath)
+        };
     
     def getTaskFileData(self) -> TaskFileData:
-        filepath    = self.shelve.filepath;
-        num_tasks   = len(self.shelve.data);
+        filepath    = self.filepath;
+        num_tasks   = self.count();
         size        = self.size();
         created     = datetime.fromtimestamp(os.path.getctime(filepath));
         last_acessed= datetime.fromtimestamp(os.path.getatime(filepath));
@@ -98,15 +221,211 @@ class Taskr:
     
             
     def update(self):
-        self.shelve.save();
-        self.loggr.info('Taskr updated.');
+        """Saves the shelve if any task changed since the last save, whatever its durability policy.
+        Tasks modified in place are only found with the `rescan` option, which compares every task with the file (see `IterableShelve.rescan`).
+        """
+        if(self._shelve is None or not (self._shelve.rescan() if self.shelve_config.get('rescan', False) else self._shelve.dirty())):
+            self.loggr.debug('Taskr update skipped, no changes.');
+            self._saveSearchIndex();
+            return;
+        changed = self.shelve.changes() if self.shelve.hasher is not None else [];
+        self.shelve.flush();
+        self._saveSearchIndex();
+        self.loggr.info(f'Taskr updated, {len(changed)} tasks changed.');
+    
+    def refresh(self):
+        """Catches up with the tasks written by other processes when the shelve is shared; a no-op otherwise.
+        """
+        if(self._shelve is not None and self.shelve_config.get('shared', False)):
+            self._shelve.refresh();
     
     def count(self) -> int:
-        return len(self.tasks);
+        return self.stats['count'] if self._shelve is None and self.stats is not None else len(self.shelve);
      
     def close(self):
-        self.shelve.save();
+        if(self._shelve is not None):
+            if(self.shelve_config.get('rescan', False)):
+                self._shelve.rescan();
+            self._shelve.close();
+            self._saveSearchIndex();
         self.loggr.info('Taskr closed.');
+        self.loggr.flush();
+    
+    def getScheduler(self) -> 'Scheduler':
+        """Returns the due-date `Scheduler` of the tasks, attached to the shelve on first use; see `schedulr`.
+        """
+        if(self.scheduler is None):
+            from schedulr import Scheduler;
+            self.scheduler = Scheduler();
+            self.shelve.attach(self.scheduler);
+        return self.scheduler;
+    
+    def _searchPersistent(self) -> bool:
+        """Whether the search index can be saved next to the tasks file: a plain shelve without a journal, whose file holds every change.
+        """
+        shelve = self._shelve;
+        return type(shelve) is IterableShelve and shelve.journal is None and not shelve.dirty();
+
+    def getSearchIndex(self) -> 'SearchIndex':
+        """Returns the full-text `SearchIndex` of the tasks, attached to the shelve on first use; see `searchr`.
+        It is read back from `<tasks_dict>.search` when that file was saved for the current tasks file, and built otherwise.
+        """
+        if(self.search is None):
+            from searchr import SearchIndex, SEARCH__SUFFIX;
+            shelve = self.shelve;
+            search = SearchIndex.load(f"{self.filepath}{SEARCH__SUFFIX}", fileSignature(self.filepath)) if self._searchPersistent() else None;
+            if(search is not None):
+                shelve.attach(search, replay=False);
+            else:
+                search = SearchIndex();
+                shelve.attach(search);
+            self.search = search;
+        return self.search;
+
+    def _saveSearchIndex(self) -> None:
+        if(self.search is not None and self.search.changed and self._searchPersistent()):
+            from searchr import SEARCH__SUFFIX;
+            self.search.save(f"{self.filepath}{SEARCH__SUFFIX}", fileSignature(self.filepath));
+
+    def getVersions(self) -> 'VersionStore':
+        """Returns the `VersionStore` of the tasks, attached to the shelve on first use; see `versionr`.
+        Only the changes made after that can be undone, unless the `versions` option attaches it when the shelve opens.
+        """
+        if(self.versions is None):
+            from versionr import VersionStore, VERSIONS__DEPTH;
+            versions = VersionStore(self.shelve_config.get('undo_depth', VERSIONS__DEPTH));
+            with self.shelve.lock:
+                self.shelve.attach(versions);
+                versions.forget();
+            self.versions = versions;
+        return self.versions;
+
+    def snapshot(self, version: int | None = None) -> 'Snapshot':
+        """Returns a frozen, point-in-time view of the task dictionaries in O(1), e.g. for a report running while tasks are written:
+        `compileQuery('status=PENDING').execute(taskr.snapshot())`. See `VersionStore.snapshot`.
+        """
+        return self.getVersions().snapshot(version);
+
+    def undo(self, n: int = 1) -> int:
+        """Reverts the last `n` task changes (an insert, update or removal each) and returns the number undone.
+        """
+        undone = self.getVersions().undo(self.shelve, n);
+        self.loggr.info(f'Taskr undid {undone} changes.');
+        return undone;
+
+    def getTask(self, id: int) -> FormattedTask | None:
+        """Returns the task stored under `id`, or `None`. Runs in constant time through the id index.
+        """
+        task_dict = self.indexr.get(id);
+        if(task_dict is None):
+            return None;
+        return setFormattedTaskFromDict(task_dict);
+    
+    def query(self, status: TaskStatus | str | None = None, priority: TaskPriority | str | None = None, due_before: str | None = None, due_after: str | None = None) -> list[FormattedTask]:
+        """Returns the tasks matching every given criterion, e.g. `query(TaskStatus.PENDING, TaskPriority.URGENT, due_before='2024-05-01')`.
+        `due_before` is exclusive and `due_after` inclusive; dates compare as `YYYY-MM-DD` strings.
+
+        Returns:
+            list[FormattedTask]
+        """
+        return setFormattedTasksFromDicts(self.indexr.query(status, priority, due_before, due_after));
+    
+    def retrieve(self, query: 'str | list[str] | QueryPlan') -> list[FormattedTask]:
+        """Runs a query such as `retrieve('status=PENDING priority>=HIGH due<2024-05-01 limit:10 order:due')` through the task indexes.
+        See `queries` for the syntax; `query` may also be a plan built by `UserParserInterface` for a `RETRIEVE` action.
+        `text:` terms go through the full-text index (see `getSearchIndex`) and rank the results unless an order is given.
+
+        Returns:
+            list[FormattedTask]
+        """
+        from queries import QueryPlan, compileQuery;
+        plan = query if isinstance(query, QueryPlan) else compileQuery(query);
+        return setFormattedTasksFromDicts(plan.execute(self.indexr, self.getSearchIndex() if plan.searches() else None));
+    
+    def updateTask(self, task: FormattedTask) -> TaskrStatus:
+        """Replaces the stored task sharing the id of `task`.
+
+        Returns:
+            TaskrStatus
+        """
+        try:
+            self.shelve.update(task.get(self.compact_enums));
+            self.loggr.info(f'Task updated: {task}');
+            return TaskrStatus.TASKR_STATUS__SUCCESS;
+        except:
+            return TaskrStatus.TASKR_STATUS__ERR_TASK;
+    
+    def removeTask(self, id: int) -> TaskrStatus:
+        """Removes the task stored under `id`.
+
+        Returns:
+            TaskrStatus
+        """
+        try:
+            self.shelve.pop(id);
+            self.loggr.info(f'Task removed: {id}');
+            return TaskrStatus.TASKR_STATUS__SUCCESS;
+        except:
+            return TaskrStatus.TASKR_STATUS__ERR_TASK;
+    
+    def _batch(self, operation, tasks: Iterable[FormattedTask]) -> list[TaskrStatus]:
+        """Serializes `tasks`, hands the valid ones to a bulk shelve operation and merges both results into one status per task.
+        """
+        statuses    = [];
+        task_dicts  = [];
+        for task in tasks:
+            try:
+                task_dicts.append(task.get(self.compact_enums));
+                statuses.append(None);
+            except:
+                statuses.append(TaskrStatus.TASKR_STATUS__ERR_FORMATTEDTASK);
+        
+        shelf_statuses = iter(operation(task_dicts));
+        for position, status in enumerate(statuses):
+            if(status is None):
+                statuses[position] = TaskrStatus.TASKR_STATUS__SUCCESS if next(shelf_statuses) == ShelfStatus.SHELF_STATUS__SUCCESS else TaskrStatus.TASKR_STATUS__ERR_TASK;
+        
+        return statuses;
+    
+    def _logBatch(self, action: str, statuses: list[TaskrStatus]) -> None:
+        succeeded = statuses.count(TaskrStatus.TASKR_STATUS__SUCCESS);
+        self.loggr.info(f'{succeeded} tasks {action}, {len(statuses) - succeeded} rejected.');
+    
+    def newTasks(self, tasks: Iterable[FormattedTask]) -> list[TaskrStatus]:
+        """Adds a batch of `FormattedTask` objects. The batch is validated as a whole, applied in one pass,
+        persisted once and logged as a single summary line.
+
+        Returns:
+            list[TaskrStatus]: one status per task, in order
+        """
+        statuses = self._batch(self.shelve.insert_many, tasks);
+        self._logBatch('added', statuses);
+        return statuses;
+    
+    def updateTasks(self, tasks: Iterable[FormattedTask]) -> list[TaskrStatus]:
+        """Batch counterpart of `updateTask`.
+
+        Returns:
+            list[TaskrStatus]: one status per task, in order
+        """
+        statuses = self._batch(self.shelve.update_many, tasks);
+        self._logBatch('updated', statuses);
+        return statuses;
+    
+    def removeTasks(self, ids: Iterable[int]) -> list[TaskrStatus]:
+        """Batch counterpart of `removeTask`.
+
+        Returns:
+            list[TaskrStatus]: one status per id, in order
+        """
+        ids = list(ids);
+        task_dicts = [self.shelve.get(id, {'task': {'id': id}}) for id in ids];
+        statuses = [
+            TaskrStatus.TASKR_STATUS__SUCCESS if status == ShelfStatus.SHELF_STATUS__SUCCESS else TaskrStatus.TASKR_STATUS__ERR_TASK
+            for status in self.shelve.remove_many(task_dicts)
+        ];
+        self._logBatch('removed', statuses);
+        return statuses;
     
     def newTask(self, task: FormattedTask) -> TaskrStatus:
         """Given a `FormattedTask` object, add it to the `Taskr` object.
@@ -118,7 +437,7 @@ class Taskr:
             TaskrStatus
         """
         try:
-            self.shelve.insert(task.get());
+            self.shelve.insert(task.get(self.compact_enums));
             self.loggr.info(f'New task added: {task}');
             return TaskrStatus.TASKR_STATUS__SUCCESS;
         except:
@@ -133,7 +452,7 @@ class Taskr:
         try:
             task = setRandomTask();
             print(task);
-            self.shelve.insert(task.get());
+            self.shelve.insert(task.get(self.compact_enums));
             self.loggr.info(f'New task added: {task}');
             return TaskrStatus.TASKR_STATUS__SUCCESS;
         except Exception as e:
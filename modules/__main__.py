@@ -0,0 +1,113 @@
+"""
+Command-line entry point, for scripts and cron jobs: `python -m modules <command>` (or `python modules <command>`) from the repository root.
+
+Modules are imported by the command that needs them, and the tasks file is only read when the answer is not in its metadata sidecar;
+tasks are streamed from disk, never loaded into a `Taskr`:
+    count                   number of tasks
+    stats                   number of tasks by status and priority
+    next [n]                the n tasks due first (default 1)
+    overdue                 the tasks past their due date
+    query <terms...>        the tasks matching a `queries` query, e.g. `query status=PENDING order:due limit:5`
+
+usage: python -m modules [--tasks ./data/tasks_dict.json] <command> [arguments]
+"""
+
+import os;
+import sys;
+
+MODULES_DIR = os.path.dirname(os.path.abspath(__file__));
+if(MODULES_DIR not in sys.path):
+    sys.path.insert(0, MODULES_DIR);
+
+CLI__TASKS      = r'./data/tasks_dict.json';
+CLI__SHARDED    = b'{"format": "sharded"';
+CLI__USAGE      = "usage: python -m modules [--tasks <file>] {count,stats,next [n],overdue,query <terms...>}";
+
+
+def entries(filepath: str):
+    """Streams the task dictionaries of a shelf file, or of every shard of a sharded shelve.
+    """
+    from jsonShelves import iterShelf;
+    with open(filepath, 'rb') as f:
+        sharded = f.read(len(CLI__SHARDED)) == CLI__SHARDED;
+    if(not sharded):
+        yield from iterShelf(filepath);
+        return;
+    from shardedShelves import readManifest, shardFiles;
+    manifest = readManifest(filepath);
+    for shard in shardFiles(filepath, manifest):
+        if(os.path.exists(shard)):
+            yield from iterShelf(shard, codec=manifest.get('codec'));
+
+def scheduled(filepath: str):
+    """`[due, -priority, position, entry]` for every scheduled task, see `schedulr.scheduleItem`.
+    """
+    from schedulr import scheduleItem;
+    for position, entry in enumerate(entries(filepath)):
+        item = scheduleItem(position, entry);
+        if(item is not None):
+            item.append(entry);
+            yield item;
+
+def show(selected: list[dict]) -> None:
+    from tasks import setFormattedTasksFromDicts;
+    for task in setFormattedTasksFromDicts(selected, trusted=True):
+        print(task);
+
+#   Commands
+#   -----------------------------------------------------------------------------------------------------------------------
+def countCommand(filepath: str, arguments: list[str]) -> None:
+    from jsonShelves import readShelfMeta;
+    meta = readShelfMeta(filepath);
+    print(meta['count'] if meta is not None else sum(1 for _ in entries(filepath)));
+
+def statsCommand(filepath: str, arguments: list[str]) -> None:
+    import json;
+    from jsonShelves import readShelfMeta;
+    meta = readShelfMeta(filepath);
+    if(meta is None):
+        from Taskr import taskShelfMeta;
+        data = list(entries(filepath));
+        meta = {'count': len(data), **taskShelfMeta(data)};
+    print(json.dumps({'count': meta['count'], 'status': meta['status'], 'priority': meta['priority']}, indent=4));
+
+def nextCommand(filepath: str, arguments: list[str]) -> None:
+    import heapq;
+    n = int(arguments[0]) if arguments else 1;
+    show([item[-1] for item in heapq.nsmallest(n, scheduled(filepath), key=lambda item: item[:3])]);
+
+def overdueCommand(filepath: str, arguments: list[str]) -> None:
+    import time;
+    now = time.time();
+    items = sorted((item for item in scheduled(filepath) if item[0] < now), key=lambda item: item[:3]);
+    show([item[-1] for item in items]);
+
+def queryCommand(filepath: str, arguments: list[str]) -> None:
+    from queries import compileQuery;
+    show(compileQuery(arguments).execute(entries(filepath)));
+
+CLI__COMMANDS = {
+    'count':    countCommand,
+    'stats':    statsCommand,
+    'next':     nextCommand,
+    'overdue':  overdueCommand,
+    'query':    queryCommand
+};
+
+
+def main(argv: list[str]) -> int:
+    filepath = CLI__TASKS;
+    if(len(argv) >= 2 and argv[0] == '--tasks'):
+        filepath, argv = argv[1], argv[2:];
+    if(not argv or argv[0] not in CLI__COMMANDS):
+        print(CLI__USAGE, file=sys.stderr);
+        return 2;
+    if(not os.path.exists(filepath)):
+        print(f"{filepath} not found.", file=sys.stderr);
+        return 1;
+    CLI__COMMANDS[argv[0]](filepath, argv[1:]);
+    return 0;
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]));
@@ -0,0 +1,183 @@
+"""
+Asyncio facade for `Taskr`.
+
+Every blocking call (shelve reads and writes, log writes) runs on one dedicated worker thread, so the event loop never waits on disk
+and `Taskr` is never entered by two threads at once. Writes are coalesced: the `new_task`, `update_task` and `remove_task` calls made
+by all coroutines during one loop iteration are collected and applied together on the next one, as a single
+`newTasks`/`updateTasks`/`removeTasks` batch per run of the same operation, so they are persisted once.
+Results are the usual `TaskrStatus` codes, one per call.
+
+    async with await AsyncTaskr.open(filepaths) as taskr:
+        status = await taskr.new_task(task);
+        urgent = await taskr.query(priority=TaskPriority.URGENT);
+        async for task in taskr:
+            ...
+"""
+
+import asyncio;
+from concurrent.futures import ThreadPoolExecutor;
+from typing import AsyncIterator, Iterable;
+from tasks import FormattedTask, TaskStatus, TaskPriority, setFormattedTasksFromDicts;
+from Taskr import Taskr, TaskrStatus;
+from queries import QueryPlan;
+
+ASYNC__CHUNK_SIZE = 1024;
+
+#   Coalesced operations and the `Taskr` batch method applying them
+ASYNC__BATCHES = {
+    'new':      'newTasks',
+    'update':   'updateTasks',
+    'remove':   'removeTasks'
+};
+
+
+class AsyncTaskr:
+    """Awaitable wrapper around a `Taskr`. See the module docstring.
+    """
+    __slots__ = ['taskr', 'executor', 'pending', 'flushing', 'inflight', 'closed'];
+
+    def __init__(self, taskr: Taskr) -> None:
+        self.taskr      = taskr;
+        self.executor   = ThreadPoolExecutor(max_workers=1, thread_name_prefix='AsyncTaskr');
+        self.pending    = [];
+        self.flushing   = None;
+        self.inflight   = set();
+        self.closed     = False;
+
+    @classmethod
+    async def open(cls, filepaths: dict = Taskr.DEFAULT__FILEPATH_DICT, loggr_config: dict = Taskr.DEFAULT__LOGGR_CONFIG, shelve_config: dict = Taskr.DEFAULT__SHELVE_CONFIG) -> 'AsyncTaskr':
+        """Builds the `Taskr` (which loads the shelve) off the event loop.
+        """
+        loop = asyncio.get_running_loop();
+        taskr = await loop.run_in_executor(None, Taskr, filepaths, loggr_config, shelve_config);
+        return cls(taskr);
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args);
+
+    #   Coalesced writes
+    #   -------------------------------------------------------------------------------------------------------------------
+    def _submit(self, op: str, item) -> asyncio.Future:
+        if(self.closed):
+            raise RuntimeError("AsyncTaskr is closed.");
+        loop = asyncio.get_running_loop();
+        future = loop.create_future();
+        self.pending.append((op, item, future));
+        if(self.flushing is None):
+            #   `flushing` collects the writes of this iteration; `inflight` tracks it until it is applied
+            self.flushing = loop.create_task(self._flush());
+            self.inflight.add(self.flushing);
+            self.flushing.add_done_callback(self.inflight.discard);
+        return future;
+
+    def _applyPending(self, groups: list[tuple[str, list]]) -> list[list[TaskrStatus]]:
+        """Runs on the worker thread: one batch call per group of consecutive same-operation writes.
+        """
+        return [getattr(self.taskr, ASYNC__BATCHES[op])(items) for op, items in groups];
+
+    async def _flush(self) -> None:
+        #   Let every coroutine scheduled in this iteration queue its write first
+        await asyncio.sleep(0);
+        pending         = self.pending;
+        self.pending    = [];
+        self.flushing   = None;
+
+        groups, futures = [], [];
+        for op, item, future in pending:
+            if(not groups or groups[-1][0] != op):
+                groups.append((op, []));
+                futures.append([]);
+            groups[-1][1].append(item);
+            futures[-1].append(future);
+
+        try:
+            results = await self._run(self._applyPending, groups);
+        except Exception as e:
+            for future in (future for group in futures for future in group):
+                if(not future.done()):
+                    future.set_exception(e);
+            return;
+
+        for group, statuses in zip(futures, results):
+            for future, status in zip(group, statuses):
+                if(not future.done()):
+                    future.set_result(status);
+
+    async def flush(self) -> None:
+        """Waits until every write queued so far is applied.
+        """
+        while(self.inflight):
+            await asyncio.gather(*self.inflight);
+
+    async def new_task(self, task: FormattedTask) -> TaskrStatus:
+        return await self._submit('new', task);
+
+    async def new_tasks(self, tasks: Iterable[FormattedTask]) -> list[TaskrStatus]:
+        return list(await asyncio.gather(*[self._submit('new', task) for task in tasks]));
+
+    async def update_task(self, task: FormattedTask) -> TaskrStatus:
+        return await self._submit('update', task);
+
+    async def remove_task(self, id: int) -> TaskrStatus:
+        return await self._submit('remove', id);
+
+    #   Reads and persistence; queued writes are applied first
+    #   -------------------------------------------------------------------------------------------------------------------
+    async def update(self) -> None:
+        """Async counterpart of `Taskr.update`: saves the shelve if any task changed.
+        """
+        await self.flush();
+        await self._run(self.taskr.update);
+
+    async def get_task(self, id: int) -> FormattedTask | None:
+        await self.flush();
+        return await self._run(self.taskr.getTask, id);
+
+    async def query(self, status: TaskStatus | str | None = None, priority: TaskPriority | str | None = None, due_before: str | None = None, due_after: str | None = None) -> list[FormattedTask]:
+        await self.flush();
+        return await self._run(self.taskr.query, status, priority, due_before, due_after);
+
+    async def retrieve(self, query: str | list[str] | QueryPlan) -> list[FormattedTask]:
+        await self.flush();
+        return await self._run(self.taskr.retrieve, query);
+
+    async def tasks(self, chunk_size: int = ASYNC__CHUNK_SIZE) -> AsyncIterator[FormattedTask]:
+        """Iterates over the stored tasks, decoding `chunk_size` of them at a time on the worker thread.
+        The tasks are those stored when the iteration starts: writes made meanwhile neither skip nor repeat any.
+        """
+        await self.flush();
+        entries = await self._run(self._entries);
+        for position in range(0, len(entries), chunk_size):
+            for task in await self._run(setFormattedTasksFromDicts, entries[position:position + chunk_size]):
+                yield task;
+
+    def _entries(self) -> list[dict]:
+        #   A copy of the references: keyed removals move entries around in `shelve.data`
+        with self.taskr.shelve.lock:
+            return list(self.taskr.shelve.data);
+
+    def __aiter__(self) -> AsyncIterator[FormattedTask]:
+        return self.tasks();
+
+    async def close(self) -> None:
+        """Applies the queued writes, saves and closes the `Taskr`, then stops the worker thread.
+        """
+        if(self.closed):
+            return;
+        await self.flush();
+        self.closed = True;
+        await self._run(self.taskr.update);
+        await self._run(self.taskr.close);
+        self.executor.shutdown(wait=True);
+
+    async def __aenter__(self) -> 'AsyncTaskr':
+        return self;
+
+    async def __aexit__(self, *args) -> None:
+        await self.close();
+
+    def __str__(self) -> str:
+        return f"AsyncTaskr(taskr={self.taskr}, pending={len(self.pending)})";
+
+    def __repr__(self) -> str:
+        return f"AsyncTaskr(taskr={self.taskr}, pending={len(self.pending)}, closed={self.closed})";
@@ -0,0 +1,272 @@
+"""
+Non-interactive batch mode for `UserParserInterface` commands.
+
+`BatchEngine.run` takes any iterable of command lines (or a path to a script file), parses it line by line as a stream with
+`UserParserInterface.parseLine` and executes the actions against a `Taskr`. Consecutive `STORE`, `UPDATE` and `DELETE`
+actions are grouped into one `newTasks`/`updateTasks`/`removeTasks` transaction (up to `group_size` commands);
+a `RETRIEVE` or a change of command closes the current group first, so reads always see the previous writes.
+
+A command line may end with a JSON payload, everything from the first ` {`:
+
+    new task STORE {"task": {"id": 1, "name": "a", ...}}
+    update task UPDATE {"id": 1, "name": "b", ...}
+    delete task DELETE {"id": 1}
+    get task RETRIEVE status=PENDING limit:10
+
+Payloads are task dictionaries as stored (`FormattedTask.get()`) or flat. A `STORE` without payload adds a random task.
+
+usage: python batchr.py <script> [--tasks tasks.json] [--log batchr.log] [--group 1000] [--throughput]
+"""
+
+import sys;
+import json;
+from time import perf_counter;
+from typing import Callable, Iterable, Iterator;
+from parsers import UserParserInterface, DELIMITER__SPACE, DELIMITER__COMMA;
+from queries import QueryCompiler;
+from tasks import FormattedTask, TaskException, setRandomTask;
+from Taskr import Taskr, TaskrStatus;
+
+BATCH__GROUP_SIZE       = 1000;
+BATCH__PAYLOAD_MARKER   = ' {';
+BATCH__MAX_ERRORS       = 100;
+
+BATCH__TOKENS   = ['new', 'update', 'delete', 'get', 'task'];
+BATCH__OPTIONS  = ['--verbose', '--trace'];
+BATCH__FLAGS    = ['-t', '-y'];
+BATCH__COMMANDS = ['SILENT', 'STORE', 'UPDATE', 'DELETE', 'RETRIEVE'];
+
+#   Commands grouped into one transaction, and the `Taskr` batch method running it
+BATCH__GROUPED = {
+    'STORE':    'newTasks',
+    'UPDATE':   'updateTasks',
+    'DELETE':   'removeTasks'
+};
+
+
+def defaultInterface() -> UserParserInterface:
+    interface = UserParserInterface();
+    interface.setParser(BATCH__TOKENS, [DELIMITER__SPACE, DELIMITER__COMMA], BATCH__OPTIONS, BATCH__FLAGS, BATCH__COMMANDS);
+    interface.setQueryCompiler(QueryCompiler());
+    return interface;
+
+
+class BatchReport:
+    """Outcome of a `BatchEngine.run`. `errors` keeps the first `BATCH__MAX_ERRORS` `(line number, message)` pairs.
+    """
+    __slots__ = ['commands', 'succeeded', 'failed', 'invalid', 'transactions', 'elapsed', 'errors'];
+
+    def __init__(self) -> None:
+        self.commands       = 0;
+        self.succeeded      = 0;
+        self.failed         = 0;
+        self.invalid        = 0;
+        self.transactions   = 0;
+        self.elapsed        = 0.0;
+        self.errors         = [];
+
+    def error(self, number: int, message: str) -> None:
+        if(len(self.errors) < BATCH__MAX_ERRORS):
+            self.errors.append((number, message));
+
+    @property
+    def commands_per_second(self) -> float:
+        return self.commands / self.elapsed if self.elapsed else 0.0;
+
+    def get(self) -> dict:
+        return {
+            'commands':             self.commands,
+            'succeeded':            self.succeeded,
+            'failed':               self.failed,
+            'invalid':              self.invalid,
+            'transactions':         self.transactions,
+            'elapsed_s':            self.elapsed,
+            'commands_per_second':  self.commands_per_second,
+            'errors':               self.errors
+        };
+
+    def __str__(self) -> str:
+        return f"BatchReport(commands={self.commands}, succeeded={self.succeeded}, failed={self.failed}, invalid={self.invalid}, commands_per_second={self.commands_per_second:.0f})";
+
+    def __repr__(self) -> str:
+        return f"BatchReport(commands={self.commands}, succeeded={self.succeeded}, failed={self.failed}, invalid={self.invalid}, transactions={self.transactions}, elapsed={self.elapsed})";
+
+
+class BatchEngine:
+    """Runs command scripts against a `Taskr`. See the module docstring for the script format.
+    """
+    __slots__ = ['taskr', 'interface', 'group_size', 'command', 'pending', 'report'];
+
+    def __init__(self, taskr: Taskr, interface: UserParserInterface | None = None, group_size: int = BATCH__GROUP_SIZE) -> None:
+        self.taskr      = taskr;
+        self.interface  = interface or defaultInterface();
+        self.group_size = group_size;
+        self.command    = None;
+        self.pending    = [];
+        self.report     = BatchReport();
+
+    #   Parsing
+    #   -------------------------------------------------------------------------------------------------------------------
+    def _split(self, lines: Iterable[str]) -> Iterator[tuple[int, str, str | None]]:
+        """Yields `(line number, command, payload)`, leaving out blank and comment lines.
+        """
+        for number, line in enumerate(lines, 1):
+            line = line.strip();
+            if(not line or line.startswith('#')):
+                continue;
+            command, marker, payload = line.partition(BATCH__PAYLOAD_MARKER);
+            yield number, command, (marker.strip() + payload) if marker else None;
+
+    def _actions(self, lines: Iterable[str]) -> Iterator[tuple[int, str | dict, str | None]]:
+        for number, command, payload in self._split(lines):
+            yield number, self.interface.parseLine(command), payload;
+
+    #   Execution
+    #   -------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _record(payload):
+        return payload['task'] if isinstance(payload, dict) and 'task' in payload else payload;
+
+    @staticmethod
+    def _id(payload) -> int | None:
+        """The task id a `DELETE` payload names (`{"id": 1}` or `{"task": {"id": 1}}`), or `None` if it names none.
+        """
+        record = BatchEngine._record(payload);
+        id = record.get('id') if isinstance(record, dict) else None;
+        return id if isinstance(id, int) and not isinstance(id, bool) else None;
+
+    def _tasks(self, payloads: list[dict]) -> list[FormattedTask | None]:
+        """Builds the tasks of a group in one validated batch; if the batch is rejected, task by task, with `None` for the bad ones.
+        """
+        records = [self._record(payload) for payload in payloads];
+        try:
+            return FormattedTask.from_records(records);
+        except (TaskException, KeyError, TypeError):
+            pass;
+
+        tasks = [];
+        for record in records:
+            try:
+                tasks.append(FormattedTask.from_records([record])[0]);
+            except (TaskException, KeyError, TypeError):
+                tasks.append(None);
+        return tasks;
+
+    def flush(self) -> None:
+        """Runs the pending group as one transaction.
+        """
+        if(not self.pending):
+            return;
+        numbers     = [number for number, _ in self.pending];
+        payloads    = [payload for _, payload in self.pending];
+        command     = self.command;
+        self.pending = [];
+        self.command = None;
+
+        if(command == 'DELETE'):
+            items = [self._id(payload) for payload in payloads];
+        else:
+            built = iter(self._tasks([payload for payload in payloads if payload is not None]));
+            items = [next(built) if payload is not None else (setRandomTask() if command == 'STORE' else None) for payload in payloads];
+
+        valid = [position for position, item in enumerate(items) if item is not None];
+        for position in range(len(items)):
+            if(items[position] is None):
+                self.report.failed += 1;
+                self.report.error(numbers[position], f"{command}: missing or invalid payload");
+
+        statuses = getattr(self.taskr, BATCH__GROUPED[command])([items[position] for position in valid]) if valid else [];
+        self.report.transactions += 1;
+        for position, status in zip(valid, statuses):
+            if(status == TaskrStatus.TASKR_STATUS__SUCCESS):
+                self.report.succeeded += 1;
+            else:
+                self.report.failed += 1;
+                self.report.error(numbers[position], f"{command}: {status.name}");
+
+    def _execute(self, number: int, action: str | dict, payload: str | None, output: Callable | None) -> None:
+        self.report.commands += 1;
+        if(isinstance(action, str)):
+            self.report.invalid += 1;
+            self.report.error(number, action);
+            return;
+
+        command = action['command'];
+        if(command in BATCH__GROUPED):
+            try:
+                payload = None if payload is None else json.loads(payload);
+            except json.JSONDecodeError as e:
+                self.report.invalid += 1;
+                self.report.error(number, f"Invalid payload: {e}");
+                return;
+            if(command != self.command or len(self.pending) >= self.group_size):
+                self.flush();
+                self.command = command;
+            self.pending.append((number, payload));
+
+        elif(command == 'RETRIEVE'):
+            self.flush();
+            tasks = self.taskr.retrieve(action['plan'] if 'plan' in action else []);
+            if(output is not None):
+                for task in tasks:
+                    output(task);
+            self.report.succeeded += 1;
+
+        elif(command == 'SILENT'):
+            self.report.succeeded += 1;
+
+        else:
+            self.report.invalid += 1;
+            self.report.error(number, f"Invalid command: {command}");
+
+    def run(self, source: Iterable[str] | str, output: Callable | None = None, progress: Callable | None = None, progress_every: int = 10000) -> BatchReport:
+        """Executes every command of `source` (lines, or the path of a script file) and returns the `BatchReport` of this run.
+        `output` receives the tasks found by `RETRIEVE`; `progress`, if given, receives the running report every `progress_every` commands
+        (throughput mode).
+        """
+        self.report = BatchReport();
+        start = perf_counter();
+        lines = open(source, 'r') if isinstance(source, str) else source;
+        try:
+            for number, action, payload in self._actions(lines):
+                self._execute(number, action, payload, output);
+                if(progress is not None and self.report.commands % progress_every == 0):
+                    self.report.elapsed = perf_counter() - start;
+                    progress(self.report);
+            self.flush();
+        finally:
+            if(isinstance(source, str)):
+                lines.close();
+        self.report.elapsed = perf_counter() - start;
+        return self.report;
+
+    def __str__(self) -> str:
+        return f"BatchEngine(taskr={self.taskr}, group_size={self.group_size})";
+
+    def __repr__(self) -> str:
+        return f"BatchEngine(taskr={self.taskr}, group_size={self.group_size})";
+
+
+if __name__ == '__main__':
+    import argparse;
+
+    arguments = argparse.ArgumentParser(description='Runs a script of Taskr commands.');
+    arguments.add_argument('script');
+    arguments.add_argument('--tasks', default=Taskr.DEFAULT__FILEPATH_DICT['tasks_dict']);
+    arguments.add_argument('--log', default=Taskr.DEFAULT__FILEPATH_DICT['logfile']);
+    arguments.add_argument('--group', type=int, default=BATCH__GROUP_SIZE);
+    arguments.add_argument('--throughput', action='store_true', help='report commands per second while running; RETRIEVE results are not printed');
+    options = arguments.parse_args();
+
+    taskr = Taskr(
+        {'logfile': options.log, 'tasks_dict': options.tasks, 'taskfile': Taskr.DEFAULT__FILEPATH_DICT['taskfile']},
+        {**Taskr.DEFAULT__LOGGR_CONFIG, 'log_file': options.log}
+    );
+    engine = BatchEngine(taskr, group_size=options.group);
+    if(options.throughput):
+        report = engine.run(options.script, progress=lambda report: print(f"{report.commands} commands, {report.commands_per_second:.0f}/s", file=sys.stderr));
+    else:
+        report = engine.run(options.script, output=print);
+    taskr.update();
+    taskr.close();
+    print(json.dumps(report.get(), indent=4));
@@ -0,0 +1,233 @@
+"""
+Binary snapshot format for task shelves, read through `mmap`.
+
+Layout (little-endian):
+    header      magic, version, record count and the offsets of the sections below
+    records     one fixed-width record per task, in insertion order
+    index       `(id, record number)` pairs sorted by id, for binary search
+    heap        UTF-8 strings referenced by `(offset, length)` pairs from the records
+
+Opening a `BinaryShelf` only reads the header; a record is decoded when it is accessed.
+"""
+
+import json;
+import mmap;
+import os;
+import struct;
+from jsonShelves import ShelfException, iterShelf, writeShelf;
+from tasks import TaskStatus, TaskPriority;
+from tablr import STATUS_CODES, PRIORITY_CODES;
+
+
+BINSHELF__MAGIC     = b'PLIBSHV1';
+BINSHELF__VERSION   = 1;
+
+#   magic, version, record count, records offset, index offset, heap offset, heap size
+HEADER      = struct.Struct('<8sHxxQQQQQ');
+#   id, status, priority, format flags, name width, description width, then (offset, length) for
+#   name, description, due_date, created_at, updated_at and tags (JSON encoded)
+RECORD      = struct.Struct('<qBBBxHH' + 'QI' * 6);
+INDEX_ENTRY = struct.Struct('<qQ');
+
+STRING__NONE = 0xFFFFFFFF;
+#   Largest format width a record holds (`H` fields)
+WIDTH__MAX   = 0xFFFF;
+
+FLAG__HAS_FORMAT    = 1 << 0;
+FLAG__SHOW_TAGS     = 1 << 1;
+FLAG__SHOW_CREATED  = 1 << 2;
+FLAG__SHOW_UPDATED  = 1 << 3;
+
+STATUS_STRINGS  = {status.value: str(status) for status in TaskStatus};
+PRIORITY_STRINGS= {priority.value: str(priority) for priority in TaskPriority};
+
+
+def writeBinaryShelf(filepath: str, records) -> int:
+    """Writes task dictionaries (as produced by `FormattedTask.get()`) to a binary shelf. Returns the number of records written.
+    Raises `ShelfException` for a value the fixed-width records cannot hold: a string of 4 GiB or more, a format width above 65535.
+    """
+    body    = bytearray();
+    heap    = bytearray();
+    ids     = [];
+    strings = {};
+
+    def ref(value: str | None) -> tuple[int, int]:
+        if(value is None):
+            return 0, STRING__NONE;
+        cached = strings.get(value);
+        if(cached is None):
+            encoded = value.encode('utf-8');
+            if(len(encoded) >= STRING__NONE):
+                raise ShelfException(f"A string of {len(encoded)} bytes does not fit in a binary shelf record.");
+            cached = (len(heap), len(encoded));
+            heap.extend(encoded);
+            strings[value] = cached;
+        return cached;
+
+    for number, record in enumerate(records):
+        task = record['task'];
+        format = record.get('format');
+
+        flags = 0;
+        name_width = description_width = 0;
+        if(format is not None):
+            flags |= FLAG__HAS_FORMAT;
+            flags |= FLAG__SHOW_TAGS if format['showTags'] else 0;
+            flags |= FLAG__SHOW_CREATED if format['showCreated'] else 0;
+            flags |= FLAG__SHOW_UPDATED if format['showUpdated'] else 0;
+            name_width, description_width = format['nameWidth'], format['descriptionWidth'];
+            if(not (0 <= name_width <= WIDTH__MAX and 0 <= description_width <= WIDTH__MAX)):
+                raise ShelfException(f"Task {task['id']}: format widths {name_width}, {description_width} do not fit in a binary shelf record (0..{WIDTH__MAX}).");
+
+        body.extend(RECORD.pack(
+            task['id'], STATUS_CODES[task['status']], PRIORITY_CODES[task['priority']], flags, name_width, description_width,
+            *ref(task['name']), *ref(task['description']), *ref(task['due_date']), *ref(task['created_at']), *ref(task['updated_at']),
+            *ref(None if task['tags'] is None else json.dumps(task['tags']))
+        ));
+        ids.append((task['id'], number));
+
+    ids.sort();
+    index = bytearray(INDEX_ENTRY.size * len(ids));
+    for position, (id, number) in enumerate(ids):
+        INDEX_ENTRY.pack_into(index, position * INDEX_ENTRY.size, id, number);
+
+    records_offset  = HEADER.size;
+    index_offset    = records_offset + len(body);
+    heap_offset     = index_offset + len(index);
+
+    tmp_filepath = f"{filepath}.tmp";
+    with open(tmp_filepath, 'wb') as f:
+        f.write(HEADER.pack(BINSHELF__MAGIC, BINSHELF__VERSION, len(ids), records_offset, index_offset, heap_offset, len(heap)));
+        f.write(body);
+        f.write(index);
+        f.write(heap);
+    os.replace(tmp_filepath, filepath);
+
+    return len(ids);
+
+
+class BinaryShelf:
+    """Read-only, memory-mapped view of a binary shelf. Supports `len()`, indexing by record number, `find(id)` and iteration.
+    """
+    __slots__ = ['filepath', 'file', 'buffer', 'count', 'records_offset', 'index_offset', 'heap_offset', 'heap_size'];
+
+    def __init__(self, filepath: str) -> None:
+        self.filepath   = filepath;
+        self.file       = open(filepath, 'rb');
+        self.buffer     = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ);
+
+        magic, version, self.count, self.records_offset, self.index_offset, self.heap_offset, self.heap_size = HEADER.unpack_from(self.buffer, 0);
+        if(magic != BINSHELF__MAGIC):
+            self.close();
+            raise ShelfException(f"{filepath} is not a binary shelf.");
+        if(version != BINSHELF__VERSION):
+            self.close();
+            raise ShelfException(f"{filepath} uses binary shelf version {version}, expected {BINSHELF__VERSION}.");
+
+    def _string(self, offset: int, length: int) -> str | None:
+        if(length == STRING__NONE):
+            return None;
+        start = self.heap_offset + offset;
+        return self.buffer[start:start + length].decode('utf-8');
+
+    def __len__(self) -> int:
+        return self.count;
+
+    def __getitem__(self, number: int) -> dict:
+        """Decodes record `number` into the `FormattedTask.get()` dictionary it was written from.
+        """
+        if(number < 0):
+            number += self.count;
+        if(not 0 <= number < self.count):
+            raise IndexError(f"record {number} out of range");
+
+        fields = RECORD.unpack_from(self.buffer, self.records_offset + number * RECORD.size);
+        id, status, priority, flags, name_width, description_width = fields[:6];
+        strings = [self._string(fields[i], fields[i + 1]) for i in range(6, 18, 2)];
+        tags = strings[5];
+
+        record = {};
+        if(flags & FLAG__HAS_FORMAT):
+            record['format'] = {
+                'nameWidth':        name_width,
+                'descriptionWidth': description_width,
+                'showTags':         bool(flags & FLAG__SHOW_TAGS),
+                'showCreated':      bool(flags & FLAG__SHOW_CREATED),
+                'showUpdated':      bool(flags & FLAG__SHOW_UPDATED)
+            };
+        record['task'] = {
+            'id':           id,
+            'name':         strings[0],
+            'description':  strings[1],
+            'status':       STATUS_STRINGS[status],
+            'priority':     PRIORITY_STRINGS[priority],
+            'due_date':     strings[2],
+            'created_at':   strings[3],
+            'updated_at':   strings[4],
+            'tags':         None if tags is None else json.loads(tags)
+        };
+        return record;
+
+    def position(self, id: int) -> int | None:
+        """Returns the record number of task `id` by binary search over the id index, or `None`.
+        """
+        low, high = 0, self.count;
+        while(low < high):
+            middle = (low + high) // 2;
+            middle_id, number = INDEX_ENTRY.unpack_from(self.buffer, self.index_offset + middle * INDEX_ENTRY.size);
+            if(middle_id < id):
+                low = middle + 1;
+            elif(middle_id > id):
+                high = middle;
+            else:
+                return number;
+        return None;
+
+    def find(self, id: int) -> dict | None:
+        number = self.position(id);
+        return None if number is None else self[number];
+
+    def __iter__(self):
+        for number in range(self.count):
+            yield self[number];
+
+    def close(self) -> None:
+        if(not self.buffer.closed):
+            self.buffer.close();
+        self.file.close();
+
+    def __enter__(self) -> 'BinaryShelf':
+        return self;
+
+    def __exit__(self, *args) -> None:
+        self.close();
+
+    def __str__(self) -> str:
+        return f"BinaryShelf(filepath={self.filepath})";
+
+    def __repr__(self) -> str:
+        return f"BinaryShelf(filepath={self.filepath})";
+
+
+def jsonToBinary(json_filepath: str, binary_filepath: str) -> int:
+    """Converts an `IterableShelve` JSON file into a binary shelf, streaming the source.
+    """
+    return writeBinaryShelf(binary_filepath, iterShelf(json_filepath));
+
+def binaryToJson(binary_filepath: str, json_filepath: str) -> int:
+    """Converts a binary shelf back into an `IterableShelve` JSON file.
+    """
+    with BinaryShelf(binary_filepath) as shelf:
+        return writeShelf(json_filepath, shelf);
+
+
+if __name__ == '__main__':
+    import sys;
+
+    if(len(sys.argv) != 3):
+        exit('usage: binShelves.py <source> <destination>  (.json <-> .bin)');
+
+    if(sys.argv[1].endswith('.json')):
+        print(f"{jsonToBinary(sys.argv[1], sys.argv[2])} records written.");
+    else:
+        print(f"{binaryToJson(sys.argv[1], sys.argv[2])} records written.");
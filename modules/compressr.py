@@ -0,0 +1,93 @@
+"""
+Compression codecs for shelf files.
+
+A codec opens a file as a text stream that compresses on write and decompresses on read, so shelves are
+encoded and decoded incrementally and the file is never held in memory uncompressed.
+`gzip` (`.gz`), `lzma` (`.xz`, `.lzma`) and `bz2` (`.bz2`) come from the standard library; `zstd` (`.zst`) needs
+`compression.zstd` (Python 3.14+) or the `zstandard` package when a file is opened. Other codecs are added with `registerCodec`.
+
+The codec of a file is chosen explicitly by name or from its last extension: `tasks.json.gz` is a gzip-compressed `tasks.json`.
+"""
+
+import os;
+from collections import namedtuple;
+
+#   `open(filepath, mode)` must return a text stream for modes 'r' and 'w'
+Codec = namedtuple('Codec', ['name', 'open', 'extensions']);
+
+CODECS: dict[str, Codec] = {};
+CODEC_EXTENSIONS: dict[str, str] = {};
+
+
+class CodecException(Exception):
+    def __init__(self, message: str) -> None:
+        super().__init__(message);
+        self.message = message;
+
+    def __str__(self) -> str:
+        return self.message;
+
+    def __repr__(self) -> str:
+        return f"CodecException(message={self.message})";
+
+
+def registerCodec(name: str, opener, extensions: list[str]) -> Codec:
+    """Registers a codec. `opener(filepath, mode)` receives `'r'` or `'w'` and must return a text file object.
+    """
+    codec = Codec(name, opener, tuple(extensions));
+    CODECS[name] = codec;
+    for extension in extensions:
+        CODEC_EXTENSIONS[extension] = name;
+    return codec;
+
+def codecFor(filepath: str, name: str | None = None) -> Codec | None:
+    """Returns the codec named `name`, or the one matching the extension of `filepath`, or `None` for an uncompressed file.
+    """
+    if(name is not None):
+        if(name not in CODECS):
+            raise CodecException(f"Unknown codec {name}, registered: {sorted(CODECS)}.");
+        return CODECS[name];
+    name = CODEC_EXTENSIONS.get(os.path.splitext(filepath)[1]);
+    return None if name is None else CODECS[name];
+
+def stripCodecExtension(filepath: str) -> str:
+    """`tasks.jsonl.gz` -> `tasks.jsonl`; other paths are returned unchanged.
+    """
+    root, extension = os.path.splitext(filepath);
+    return root if extension in CODEC_EXTENSIONS else filepath;
+
+def openText(filepath: str, mode: str = 'r', codec: Codec | None = None):
+    """Opens `filepath` as text through `codec` (uncompressed when `None`).
+    """
+    if(codec is None):
+        return open(filepath, mode, encoding='utf-8');
+    return codec.open(filepath, mode);
+
+
+#   The codec modules are imported on first use, so importing `compressr` stays cheap
+def _openGzip(filepath: str, mode: str):
+    import gzip;
+    return gzip.open(filepath, f"{mode}t", encoding='utf-8', compresslevel=6);
+
+def _openLzma(filepath: str, mode: str):
+    import lzma;
+    return lzma.open(filepath, f"{mode}t", encoding='utf-8');
+
+def _openBz2(filepath: str, mode: str):
+    import bz2;
+    return bz2.open(filepath, f"{mode}t", encoding='utf-8');
+
+def _openZstd(filepath: str, mode: str):
+    try:
+        from compression import zstd;
+    except ImportError:
+        try:
+            import zstandard as zstd;
+        except ImportError:
+            raise CodecException("The zstd codec needs Python 3.14+ (`compression.zstd`) or the `zstandard` package.");
+    return zstd.open(filepath, f"{mode}t", encoding='utf-8');
+
+registerCodec('gzip', _openGzip, ['.gz']);
+registerCodec('lzma', _openLzma, ['.xz', '.lzma']);
+registerCodec('bz2', _openBz2, ['.bz2']);
+registerCodec('zstd', _openZstd, ['.zst']);
@@ -0,0 +1,132 @@
+"""
+Content hashing and change detection for shelves.
+
+Records are hashed from their canonical JSON form, so two equal dictionaries always share a digest
+whatever their key order. `ShelfHasher` follows the listener protocol of `IterableShelve.attach` and hashes lazily:
+nothing is hashed on load, only the records touched since the last save are.
+"""
+
+import json;
+import os;
+from hashlib import blake2b;
+from collections import namedtuple;
+
+HASHR__DIGEST_SIZE  = 16;
+HASHR__CHUNK_SIZE   = 1 << 20;
+
+#   Cheap identity of a file on disk; compared instead of re-reading the file
+FileSignature = namedtuple('FileSignature', ['size', 'mtime_ns', 'inode']);
+
+
+def hashRecord(record) -> bytes:
+    """Returns a stable digest of a JSON-serializable record.
+    """
+    canonical = json.dumps(record, sort_keys=True, separators=(',', ':'));
+    return blake2b(canonical.encode('utf-8'), digest_size=HASHR__DIGEST_SIZE).digest();
+
+def hashFile(filepath: str) -> bytes:
+    """Returns the digest of the raw bytes of a file, read in chunks.
+    """
+    digest = blake2b(digest_size=HASHR__DIGEST_SIZE);
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASHR__CHUNK_SIZE), b''):
+            digest.update(chunk);
+    return digest.digest();
+
+def fileSignature(filepath: str) -> FileSignature | None:
+    try:
+        stat = os.stat(filepath);
+    except FileNotFoundError:
+        return None;
+    return FileSignature(stat.st_size, stat.st_mtime_ns, stat.st_ino);
+
+
+class ShelfHasher:
+    """Tracks which records of a keyed shelve changed since the last save.
+
+    For every key touched after `markSaved`, the digest it had at save time is remembered together with its current record;
+    `changed()` compares the two, so a record edited and then restored does not count as a change.
+    `digest()` returns an order-independent digest of the whole shelve (the XOR of the record digests). It is computed
+    on the first call and then kept up to date incrementally.
+    """
+    __slots__ = ['baseline', 'current', 'entries', 'rolling', 'signature', 'stale'];
+
+    def __init__(self) -> None:
+        self.baseline   = {};
+        self.current    = {};
+        self.entries    = {};
+        self.rolling    = None;
+        self.signature  = None;
+        #   Set when a change was found that the records do not show (an entry modified in place), until the next save
+        self.stale      = False;
+
+    def add(self, key, entry: dict) -> None:
+        if(key not in self.baseline):
+            self.baseline[key] = None;
+        self.current[key] = entry;
+        self.entries[key] = entry;
+        if(self.rolling is not None):
+            self.rolling ^= int.from_bytes(hashRecord(entry), 'big');
+
+    def discard(self, key, entry: dict) -> None:
+        if(key not in self.baseline):
+            self.baseline[key] = hashRecord(entry);
+        self.current[key] = None;
+        self.entries.pop(key, None);
+        if(self.rolling is not None):
+            self.rolling ^= int.from_bytes(hashRecord(entry), 'big');
+
+    def changed(self) -> list:
+        """Returns the keys whose record was inserted, removed or modified since the last save.
+        """
+        changed = [];
+        for key, digest in self.baseline.items():
+            entry = self.current[key];
+            if(digest != (None if entry is None else hashRecord(entry))):
+                changed.append(key);
+        return changed;
+
+    def dirty(self) -> bool:
+        if(self.stale):
+            return True;
+        for key, digest in self.baseline.items():
+            entry = self.current[key];
+            if(digest != (None if entry is None else hashRecord(entry))):
+                return True;
+        return False;
+
+    def digest(self) -> bytes:
+        if(self.rolling is None):
+            self.rolling = 0;
+            for entry in self.entries.values():
+                self.rolling ^= int.from_bytes(hashRecord(entry), 'big');
+        return self.rolling.to_bytes(HASHR__DIGEST_SIZE, 'big');
+
+    def markSaved(self, filepath: str) -> None:
+        self.baseline.clear();
+        self.current.clear();
+        self.signature = fileSignature(filepath);
+        self.stale = False;
+
+    def invalidate(self) -> None:
+        """Makes `dirty()` true until the next `markSaved`, for changes the records cannot show.
+        """
+        self.stale = True;
+
+    def restore(self, baseline: dict) -> None:
+        """Puts back the baseline taken before a `markSaved` whose save then failed, so the keys it held count as changed again.
+        """
+        for key, digest in baseline.items():
+            self.baseline[key]  = digest;
+            self.current[key]   = self.entries.get(key);
+
+    def fileChanged(self, filepath: str) -> bool:
+        """Tells whether `filepath` was modified on disk since the last `markSaved`, from its `os.stat` signature alone.
+        """
+        return fileSignature(filepath) != self.signature;
+
+    def __str__(self) -> str:
+        return f"ShelfHasher(touched={len(self.baseline)})";
+
+    def __repr__(self) -> str:
+        return f"ShelfHasher(touched={len(self.baseline)})";
@@ -0,0 +1,227 @@
+"""
+Secondary indexes over the entries of a keyed `IterableShelve`.
+
+Every index implements the listener protocol of `IterableShelve.attach`: `add(key, entry)` and `discard(key, entry)`.
+"""
+
+from bisect import bisect_left, bisect_right, insort;
+from tasks import TaskStatus, TaskPriority, decodeTaskStatus, decodeTaskPriority;
+
+#   Pending pairs of a `SortedIndex` merged one by one (below) or by sorting the whole list (above)
+SORTED__INSORT = 64;
+
+
+def taskKey(task_dict: dict) -> int:
+    """Returns the id of a task dictionary as produced by `FormattedTask.get()`.
+    """
+    return task_dict['task']['id'];
+
+def taskStatus(task_dict: dict) -> TaskStatus:
+    return toTaskStatus(task_dict['task']['status']);
+
+def taskPriority(task_dict: dict) -> TaskPriority:
+    return toTaskPriority(task_dict['task']['priority']);
+
+def taskDueDate(task_dict: dict) -> str | None:
+    return task_dict['task']['due_date'];
+
+def toTaskStatus(status: TaskStatus | str | int) -> TaskStatus:
+    """Accepts a `TaskStatus`, its name (`"PENDING"`), its stored form (`"TaskStatus.PENDING"`) or its compact code (`1`).
+    """
+    return decodeTaskStatus(status);
+
+def toTaskPriority(priority: TaskPriority | str | int) -> TaskPriority:
+    """Accepts a `TaskPriority`, its name (`"URGENT"`), its stored form (`"TaskPriority.URGENT"`) or its compact code (`4`).
+    """
+    return decodeTaskPriority(priority);
+
+
+class BucketIndex:
+    """Groups entries by the value `field(entry)`. Each bucket maps entry keys to entries, so both `add` and `discard` are O(1).
+    """
+    __slots__ = ['field', 'buckets'];
+
+    def __init__(self, field) -> None:
+        self.field      = field;
+        self.buckets    = {};
+
+    def add(self, key, entry: dict) -> None:
+        self.buckets.setdefault(self.field(entry), {})[key] = entry;
+
+    def discard(self, key, entry: dict) -> None:
+        value   = self.field(entry);
+        bucket  = self.buckets.get(value);
+        if(bucket is not None):
+            bucket.pop(key, None);
+            if(not bucket):
+                del self.buckets[value];
+
+    def bucket(self, value) -> dict:
+        return self.buckets.get(value, {});
+
+    def count(self, value) -> int:
+        return len(self.buckets.get(value, ()));
+
+    def __str__(self) -> str:
+        return f"BucketIndex(buckets={len(self.buckets)})";
+
+    def __repr__(self) -> str:
+        return f"BucketIndex(buckets={len(self.buckets)})";
+
+
+class SortedIndex:
+    """Keeps `(field(entry), key)` pairs in a sorted list for range queries. Entries whose field is `None` are not indexed.
+    Range lookups are O(log N + k). Inserting into a sorted list shifts O(N) items, so `add` only queues the pair;
+    queued pairs are merged before the next lookup, one by one when few, else by one sort of the list (Timsort merges the two runs),
+    so that loading N entries costs O(N log N) instead of O(N^2). `discard` is O(log N) plus the shift of the deletion.
+    """
+    __slots__ = ['field', 'pairs', 'pending'];
+
+    def __init__(self, field) -> None:
+        self.field      = field;
+        self.pairs      = [];
+        self.pending    = {};
+
+    def add(self, key, entry: dict) -> None:
+        value = self.field(entry);
+        if(value is None):
+            return;
+        self.pending[(value, key)] = None;
+        if(len(self.pending) > max(SORTED__INSORT, len(self.pairs))):
+            self._merge();
+
+    def discard(self, key, entry: dict) -> None:
+        value = self.field(entry);
+        if(value is None):
+            return;
+        if(self.pending.pop((value, key), False) is None):
+            return;
+        position = bisect_left(self.pairs, (value, key));
+        if(position < len(self.pairs) and self.pairs[position] == (value, key)):
+            del self.pairs[position];
+
+    def _merge(self) -> None:
+        if(not self.pending):
+            return;
+        if(len(self.pending) <= SORTED__INSORT):
+            for pair in self.pending:
+                insort(self.pairs, pair);
+        else:
+            #   Timsort keeps `pairs` as one sorted run: only the appended tail is sorted, then the two are merged
+            self.pairs.extend(self.pending);
+            self.pairs.sort();
+        self.pending = {};
+
+    def range(self, low=None, high=None, inclusive: bool = False) -> list:
+        """Returns the keys whose value is in `[low, high)` (or `[low, high]` with `inclusive=True`), ordered by value.
+        """
+        self._merge();
+        start   = 0 if low is None else bisect_left(self.pairs, (low,));
+        if(high is None):
+            stop = len(self.pairs);
+        elif(inclusive):
+            stop = bisect_right(self.pairs, (high, float('inf')));
+        else:
+            stop = bisect_left(self.pairs, (high,));
+        return [key for _, key in self.pairs[start:stop]];
+
+    def count(self, low=None, high=None, inclusive: bool = False) -> int:
+        self._merge();
+        start   = 0 if low is None else bisect_left(self.pairs, (low,));
+        if(high is None):
+            stop = len(self.pairs);
+        elif(inclusive):
+            stop = bisect_right(self.pairs, (high, float('inf')));
+        else:
+            stop = bisect_left(self.pairs, (high,));
+        return max(stop - start, 0);
+
+    def __str__(self) -> str:
+        return f"SortedIndex(size={len(self.pairs) + len(self.pending)})";
+
+    def __repr__(self) -> str:
+        return f"SortedIndex(size={len(self.pairs) + len(self.pending)}, pending={len(self.pending)})";
+
+
+class TaskIndexr:
+    """Maintains the id, status, priority and due date indexes for a keyed `IterableShelve` of task dictionaries.
+    Attach it with `shelve.attach(TaskIndexr())`; the shelve keeps it consistent through insert, remove and update.
+    """
+    __slots__ = ['ids', 'status', 'priority', 'due_date'];
+
+    def __init__(self) -> None:
+        self.ids        = {};
+        self.status     = BucketIndex(taskStatus);
+        self.priority   = BucketIndex(taskPriority);
+        self.due_date   = SortedIndex(taskDueDate);
+
+    def add(self, key, entry: dict) -> None:
+        self.ids[key] = entry;
+        self.status.add(key, entry);
+        self.priority.add(key, entry);
+        self.due_date.add(key, entry);
+
+    def discard(self, key, entry: dict) -> None:
+        self.ids.pop(key, None);
+        self.status.discard(key, entry);
+        self.priority.discard(key, entry);
+        self.due_date.discard(key, entry);
+
+    def get(self, key) -> dict | None:
+        return self.ids.get(key);
+
+    def query(self, status: TaskStatus | str | None = None, priority: TaskPriority | str | None = None, due_before: str | None = None, due_after: str | None = None) -> list[dict]:
+        """Returns the task dictionaries matching every given criterion. `due_before` is exclusive and `due_after` inclusive.
+        The smallest matching bucket or due date range drives the lookup and the remaining criteria are checked on its members only,
+        so the cost follows the size of the most selective criterion rather than the size of the shelve.
+        """
+        if(status is not None):
+            status = toTaskStatus(status);
+        if(priority is not None):
+            priority = toTaskPriority(priority);
+
+        candidates = [];
+        if(status is not None):
+            bucket = self.status.bucket(status);
+            candidates.append((len(bucket), 'status', bucket));
+        if(priority is not None):
+            bucket = self.priority.bucket(priority);
+            candidates.append((len(bucket), 'priority', bucket));
+        if(due_before is not None or due_after is not None):
+            candidates.append((self.due_date.count(due_after, due_before), 'due_date', None));
+
+        if(not candidates):
+            return list(self.ids.values());
+
+        _, driver, bucket = min(candidates, key=lambda candidate: candidate[0]);
+        if(driver == 'due_date'):
+            entries = [self.ids[key] for key in self.due_date.range(due_after, due_before)];
+        else:
+            entries = bucket.values();
+
+        results = [];
+        for entry in entries:
+            if(status is not None and driver != 'status' and taskStatus(entry) is not status):
+                continue;
+            if(priority is not None and driver != 'priority' and taskPriority(entry) is not priority):
+                continue;
+            if(driver != 'due_date' and (due_before is not None or due_after is not None)):
+                due_date = taskDueDate(entry);
+                if(due_date is None):
+                    continue;
+                if(due_before is not None and due_date >= due_before):
+                    continue;
+                if(due_after is not None and due_date < due_after):
+                    continue;
+            results.append(entry);
+
+        return results;
+
+    def __len__(self) -> int:
+        return len(self.ids);
+
+    def __str__(self) -> str:
+        return f"TaskIndexr(size={len(self.ids)})";
+
+    def __repr__(self) -> str:
+        return f"TaskIndexr(size={len(self.ids)})";
@@ -1,61 +1,908 @@
+
+
 import json;
+import os;
+import time;
+import threading;
+from enum import Enum;
+from hashlib import blake2b;
+from hashr import ShelfHasher, fileSignature, HASHR__CHUNK_SIZE;
+from compressr import codecFor, openText, stripCodecExtension;
+
+#   Key-deduplicated layout, see `writeShelf`
+SHELF__DEDUP_LAYOUT = 'dedup';
+SHELF__DEDUP_VERSION= 1;
+SHELF__DEDUP_HOIST  = ('format',);
+SHELF__PEEK_SIZE    = 64;
+
+#   Metadata sidecar, see `writeShelfMeta`
+SHELF__META_SUFFIX  = '.meta';
+SHELF__META_VERSION = 1;
+
+
+class ShelfException(Exception):
+    def __init__(self, message: str) -> None:
+        super().__init__(message);
+        self.message = message;
+
+    def __str__(self) -> str:
+        return self.message;
+
+    def __repr__(self) -> str:
+        return f"ShelfException(message={self.message})";
+
+
+class ShelfStatus(Enum):
+    SHELF_STATUS__SUCCESS           = 0;
+    SHELF_STATUS__ERR_INVALID_ENTRY = 1;
+    SHELF_STATUS__ERR_DUPLICATE_KEY = 2;
+    SHELF_STATUS__ERR_MISSING_KEY   = 3;
+    SHELF_STATUS__ERR_CONFLICT      = 4;
+
+
+class DurabilityPolicy(Enum):
+    """When a plain (non-journal) `IterableShelve` writes its file after a change.
+    """
+    IMMEDIATE   = 0;
+    EVERY_N_OPS = 1;
+    EVERY_T_MS  = 2;
+    ON_CLOSE    = 3;
 
 
 class Shelf:
     """A `Shelf` is a container-like object for reading and writing formatted data to `.JSON` files.
+    Files are compressed through `compressr` when `codec` names a codec or the extension matches one (`tasks.json.gz`);
+    with `dedup=True` list shelves are written in the key-deduplicated layout of `writeShelf`. Both are detected when reading.
+    When `meta` is set to a callable, every write also refreshes the `<filepath>.meta` sidecar (see `writeShelfMeta`);
+    `meta(entries)` returns the extra fields to store in it.
     """
-    __slots__ = ['filepath', 'data'];
-    
-    def __init__(self, filepath: str) -> None:
+    __slots__ = ['filepath', 'data', 'codec', 'dedup', 'meta'];
+
+    def __init__(self, filepath: str, codec: str | None = None, dedup: bool = False) -> None:
         self.filepath   = filepath;
+        self.codec      = codecFor(filepath, codec);
+        self.dedup      = dedup;
+        self.meta       = None;
+        self.data       = self._read();
+
+    def _read(self):
+        """Returns the content of the shelf file. A missing or invalid file is replaced by an empty shelf.
+        """
         try:
-            self.data       = json.load(open(filepath, 'r'));
+            return loadShelf(self.filepath, None if self.codec is None else self.codec.name);
         except json.JSONDecodeError:
             print(f"JSONDecodeError: {self.filepath} is not a valid JSON file.");
-            self.data = {};
-            self.save();
         except FileNotFoundError:
             print(f"FileNotFoundError: {self.filepath} not found.");
-            self.data = {};
-            self.save();
-           
-    def save(self) -> None:
+        self._write({});
+        return {};
+
+    def save(self) -> bool:
+        return self._write(self.data);
+
+    def _write(self, data) -> bool:
+        """Writes `data` to a temporary file and atomically renames it over `filepath`, so a reader never sees a half-written shelf.
+        Returns whether the file was written; on failure the previous file is left as it was.
+        """
+        tmp_filepath = f"{self.filepath}.tmp";
         try:
-            json.dump(self.data, open(self.filepath, 'w'));
+            if(isinstance(data, list) and (self.codec is not None or self.dedup)):
+                writeShelf(self.filepath, data, None if self.codec is None else self.codec.name, self.dedup);
+            else:
+                with openText(tmp_filepath, 'w', self.codec) as f:
+                    json.dump(data, f);
+                os.replace(tmp_filepath, self.filepath);
+            if(self.meta is not None):
+                entries = data if isinstance(data, list) else list(data.values());
+                writeShelfMeta(self.filepath, len(entries), self.meta(entries));
         except Exception as e:
             print(f"Error: {e}");
-            
-                
+            return False;
+        return True;
+
+
     def __str__(self) -> str:
         return f"Shelve(filepath={self.filepath})";
-    
+
     def __repr__(self) -> str:
         return f"Shelve(filepath={self.filepath})";
-    
+
+
+def loadShelf(filepath: str, codec: str | None = None):
+    """Returns the whole content of a shelf file: a list of entries, or the dictionary of a `Shelf`.
+    Uncompressed list and dictionary files go through `json.load`; compressed lists, JSON-lines and deduplicated files are streamed with `iterShelf`.
+    """
+    resolved = codecFor(filepath, codec);
+    with openText(filepath, 'r', resolved) as f:
+        head = f.read(SHELF__PEEK_SIZE).lstrip();
+        streamed = head.startswith('{"layout"') or stripCodecExtension(filepath).endswith('.jsonl') or (resolved is not None and head.startswith('['));
+        if(not streamed):
+            f.seek(0);
+            return json.load(f);
+    return list(iterShelf(filepath, codec=codec));
+
+def iterShelf(filepath: str, chunk_size: int = 1 << 16, codec: str | None = None):
+    """Yields the entries of a shelf file one at a time without loading the whole file.
+
+    `.jsonl` files are read as JSON-lines, one entry per line. A list of dictionaries, as written by `IterableShelve`,
+    is decoded incrementally from `chunk_size` character reads, so memory use is bounded by the chunk and the largest entry rather than by the file size.
+    Key-deduplicated files (see `writeShelf`) are read line by line. A `Shelf` dictionary has no incremental layout and is loaded whole.
+    Compressed files (`codec`, or an extension known to `compressr`) are decompressed on the fly.
+    """
+    decoder = json.JSONDecoder();
+    lines = stripCodecExtension(filepath).endswith('.jsonl');
+
+    with openText(filepath, 'r', codecFor(filepath, codec)) as f:
+        buffer = f.read(chunk_size);
+        position = len(buffer) - len(buffer.lstrip());
+
+        if(not buffer.strip()):
+            return;
+
+        if(buffer.startswith('{"layout"', position)):
+            f.seek(0);
+            yield from _iterDedup(f);
+            return;
+
+        if(lines or buffer[position] == '{'):
+            if(not lines):
+                #   A `Shelf` dictionary; values are the entries
+                f.seek(0);
+                yield from json.load(f).values();
+                return;
+
+            f.seek(0);
+            for line in f:
+                if(line.strip()):
+                    yield json.loads(line);
+            return;
+
+        if(buffer[position] != '['):
+            raise ShelfException(f"{filepath} is neither a list of entries nor a JSON-lines file.");
+        position += 1;
+
+        while(True):
+            #   Skip whitespace and separators, refilling the buffer when it runs out
+            while(True):
+                while(position < len(buffer) and buffer[position] in ' \t\r\n,'):
+                    position += 1;
+                if(position < len(buffer)):
+                    break;
+                chunk = f.read(chunk_size);
+                if(not chunk):
+                    raise ShelfException(f"{filepath} ends before the closing bracket.");
+                buffer, position = chunk, 0;
+
+            if(buffer[position] == ']'):
+                return;
+
+            try:
+                entry, end = decoder.raw_decode(buffer, position);
+            except json.JSONDecodeError:
+                chunk = f.read(chunk_size);
+                if(not chunk):
+                    raise;
+                buffer, position = buffer[position:] + chunk, 0;
+                continue;
+
+            yield entry;
+            position = end;
+
+
+def metaPath(filepath: str) -> str:
+    return f"{filepath}{SHELF__META_SUFFIX}";
+
+def writeShelfMeta(filepath: str, count: int, extra: dict | None = None) -> dict:
+    """Writes the metadata sidecar of the shelf file `filepath`, atomically, right after the shelf file itself:
+        {"schema_version": 1, "count": 1000, "last_write": 1714300000.0, "signature": [size, mtime_ns, inode], ...extra}
+    The signature of the shelf file lets `readShelfMeta` tell a current sidecar from one left behind by an interrupted save.
+    """
+    signature = fileSignature(filepath);
+    meta = {
+        'schema_version':   SHELF__META_VERSION,
+        'count':            count,
+        'last_write':       time.time(),
+        'signature':        None if signature is None else list(signature),
+        **(extra or {})
+    };
+    tmp_filepath = f"{metaPath(filepath)}.tmp";
+    with open(tmp_filepath, 'w') as f:
+        json.dump(meta, f);
+    os.replace(tmp_filepath, metaPath(filepath));
+    return meta;
+
+def readShelfMeta(filepath: str) -> dict | None:
+    """Returns the sidecar of the shelf file `filepath` without reading the shelf, or `None` if it is missing, of another schema version,
+    or does not match the shelf file on disk.
+    """
+    try:
+        with open(metaPath(filepath), 'r') as f:
+            meta = json.load(f);
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None;
+    signature = fileSignature(filepath);
+    if(meta.get('schema_version') != SHELF__META_VERSION or signature is None or meta.get('signature') != list(signature)):
+        return None;
+    return meta;
+
+def _iterDedup(f):
+    """Decodes the key-deduplicated layout written by `_writeDedup`. Entries sharing a hoisted value share one object.
+    """
+    header = json.loads(f.readline());
+    if(header.get('version') != SHELF__DEDUP_VERSION):
+        raise ShelfException(f"Unsupported deduplicated layout version {header.get('version')}.");
+    hoist = set(header['hoist']);
+    shapes, profiles = [], [];
+
+    for line in f:
+        if(line.startswith('[')):
+            row = json.loads(line);
+            entry = {};
+            for (top, sub, hoisted), value in zip(shapes[row[0]], row[1:]):
+                if(sub is not None):
+                    nested = entry.get(top);
+                    if(nested is None):
+                        nested = entry[top] = {};
+                    nested[sub] = value;
+                else:
+                    entry[top] = profiles[value] if hoisted else value;
+            yield entry;
+        elif(line.strip()):
+            record = json.loads(line);
+            if('shape' in record):
+                shapes.append([(path[0], path[1] if len(path) > 1 else None, len(path) == 1 and path[0] in hoist) for path in record['keys']]);
+            elif('profile' in record):
+                profiles.append(record['value']);
+            else:
+                yield record['entry'];
+
+def _writeDedup(f, entries, hoist=SHELF__DEDUP_HOIST) -> int:
+    """JSON-lines layout in which keys and shared values are written once:
+        {"layout": "dedup", "version": 1, "hoist": ["format"]}      header
+        {"shape": 0, "keys": [["format"], ["task", "id"], ...]}     key paths of the entries that follow, defined on first use
+        {"profile": 0, "value": {...}}                              a hoisted value (e.g. a format profile), defined on first use
+        [0, 0, 1, "name", ...]                                      an entry: shape index, then values; hoisted keys hold a profile index
+        {"entry": ...}                                              an entry that is not a dictionary
+    Dictionaries nested one level deep are flattened into the shape, so their keys are not repeated either.
+    """
+    f.write(json.dumps({'layout': SHELF__DEDUP_LAYOUT, 'version': SHELF__DEDUP_VERSION, 'hoist': list(hoist)}) + '\n');
+    shapes, profiles = {}, {};
+    count = 0;
+    for entry in entries:
+        count += 1;
+        if(not isinstance(entry, dict)):
+            f.write(json.dumps({'entry': entry}) + '\n');
+            continue;
+
+        paths, values = [], [];
+        for key, value in entry.items():
+            if(key in hoist):
+                canonical = json.dumps(value, sort_keys=True);
+                index = profiles.get(canonical);
+                if(index is None):
+                    index = profiles[canonical] = len(profiles);
+                    f.write(json.dumps({'profile': index, 'value': value}) + '\n');
+                paths.append((key,));
+                values.append(index);
+            elif(isinstance(value, dict) and value):
+                for sub, sub_value in value.items():
+                    paths.append((key, sub));
+                    values.append(sub_value);
+            else:
+                paths.append((key,));
+                values.append(value);
+
+        shape = tuple(paths);
+        index = shapes.get(shape);
+        if(index is None):
+            index = shapes[shape] = len(shapes);
+            f.write(json.dumps({'shape': index, 'keys': [list(path) for path in shape]}) + '\n');
+        values.insert(0, index);
+        f.write(json.dumps(values) + '\n');
+    return count;
+
+def writeShelf(filepath: str, entries, codec: str | None = None, dedup: bool = False) -> int:
+    """Writes an iterable of entries as an `IterableShelve` list, one entry at a time, and atomically renames it over `filepath`.
+    With `dedup` the key-deduplicated layout of `_writeDedup` is written instead; `codec` (or the extension of `filepath`) compresses the stream.
+    Returns the number of entries written.
+    """
+    tmp_filepath = f"{filepath}.tmp";
+    with openText(tmp_filepath, 'w', codecFor(filepath, codec)) as f:
+        count = _writeEntries(f, entries, dedup);
+    os.replace(tmp_filepath, filepath);
+    return count;
+
+def _writeEntries(f, entries, dedup: bool) -> int:
+    if(dedup):
+        return _writeDedup(f, entries);
+    count = 0;
+    f.write('[');
+    for entry in entries:
+        if(count):
+            f.write(', ');
+        f.write(json.dumps(entry));
+        count += 1;
+    f.write(']');
+    return count;
+
+
+class _DigestWriter:
+    """File-like sink hashing what is written to it.
+    """
+    __slots__ = ['digest'];
+
+    def __init__(self) -> None:
+        self.digest = blake2b();
+
+    def write(self, text: str) -> None:
+        self.digest.update(text.encode('utf-8'));
+
+def shelfMatches(filepath: str, entries, codec: str | None = None, dedup: bool = False) -> bool:
+    """Tells whether `filepath` holds exactly what `writeShelf(filepath, entries, codec, dedup)` would write, by comparing
+    the digest of that text with the digest of the (decompressed) file. Nothing is written and the text is never held whole.
+    """
+    expected = _DigestWriter();
+    _writeEntries(expected, entries, dedup);
+    stored = _DigestWriter();
+    try:
+        with openText(filepath, 'r', codecFor(filepath, codec)) as f:
+            for chunk in iter(lambda: f.read(HASHR__CHUNK_SIZE), ''):
+                stored.write(chunk);
+    except FileNotFoundError:
+        return False;
+    return stored.digest.digest() == expected.digest.digest();
+
+
+def repairJournal(filepath: str) -> None:
+    """Truncates a journal file after its last complete line, dropping a record torn by a crash mid-write.
+    """
+    try:
+        with open(filepath, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END);
+            if(size == 0):
+                return;
+            f.seek(size - 1);
+            if(f.read(1) == b'\n'):
+                return;
+            position = size;
+            while(position > 0):
+                step = min(position, 1 << 16);
+                f.seek(position - step);
+                end = f.read(step).rfind(b'\n');
+                if(end != -1):
+                    f.truncate(position - step + end + 1);
+                    return;
+                position -= step;
+            f.truncate(0);
+    except FileNotFoundError:
+        return;
+
+
+class Journal:
+    """A `Journal` is an append-only `.JSONL` log of shelf operations. Each line holds one `{"op": ..., "data": ...}` record.
+    A line torn by a crash mid-write is cut off when the journal is opened, so the next record starts on a line of its own.
+    """
+    __slots__ = ['filepath', 'file', 'count'];
+
+    def __init__(self, filepath: str) -> None:
+        self.filepath   = filepath;
+        repairJournal(filepath);
+        self.file       = open(filepath, 'a');
+        self.count      = 0;
+
+    def append(self, op: str, data) -> None:
+        self.file.write(json.dumps({'op': op, 'data': data}) + '\n');
+        self.file.flush();
+        self.count += 1;
+
+    def extend(self, op: str, entries: list) -> None:
+        """Appends one record per entry with a single write and flush.
+        """
+        self.file.write(''.join(json.dumps({'op': op, 'data': data}) + '\n' for data in entries));
+        self.file.flush();
+        self.count += len(entries);
+
+    def replay(self, filepath: str | None = None):
+        """Yields the `(op, data)` pairs stored in the journal, oldest first.
+        A line that does not decode (e.g. truncated by a crash mid-write) is skipped.
+        """
+        try:
+            with open(filepath or self.filepath, 'r') as f:
+                for line in f:
+                    if(not line.strip()):
+                        continue;
+                    try:
+                        entry = json.loads(line);
+                    except json.JSONDecodeError:
+                        continue;
+                    yield entry['op'], entry['data'];
+        except FileNotFoundError:
+            return;
+
+    def rotate(self) -> str:
+        """Closes the current journal, moves it aside and starts an empty one. Returns the path of the rotated file.
+        """
+        rotated_filepath = f"{self.filepath}.old";
+        self.file.close();
+        os.replace(self.filepath, rotated_filepath);
+        self.file   = open(self.filepath, 'a');
+        self.count  = 0;
+        return rotated_filepath;
+
+    def restore(self, rotated_filepath: str, count: int) -> None:
+        """Undoes `rotate` after a failed compaction: the records appended since are moved after the rotated ones,
+        and the whole is the journal again. `count` is the number of records of the rotated file.
+        """
+        self.file.close();
+        repairJournal(rotated_filepath);
+        with open(self.filepath, 'r') as f, open(rotated_filepath, 'a') as rotated:
+            rotated.write(f.read());
+            rotated.flush();
+            os.fsync(rotated.fileno());
+        os.replace(rotated_filepath, self.filepath);
+        self.file   = open(self.filepath, 'a');
+        self.count += count;
+
+    def close(self) -> None:
+        if(not self.file.closed):
+            self.file.close();
+
+    def __str__(self) -> str:
+        return f"Journal(filepath={self.filepath})";
+
+    def __repr__(self) -> str:
+        return f"Journal(filepath={self.filepath})";
+
+
 class IterableShelve(Shelf):
     """A `IterableShelve` is a list-like object for reading and writing formatted data to `.JSON` files.
     All the data in a `IterableShelve` is stored in a list. Each stored entry must be a dictionary capable of being parsed by the parser in the `json` module.
     The `.JSON` generated file will be a list of dictionaries.
+
+    With `journal=True` the shelve works in write-ahead mode: `insert` and `remove` only append a line to `<filepath>.journal`,
+    and the journal is compacted into the snapshot file in a background thread once it holds `compact_threshold` entries, and on `close()`.
+    On start-up the snapshot is loaded and the journal is replayed on top of it.
+    A crash between writing a compacted snapshot and deleting the rotated journal replays that journal again on the next start:
+    harmless on a keyed shelve (a duplicate insert is rejected, a removal of a missing key ignored, an update rewritten),
+    but an unkeyed shelve gets the inserts of that journal twice.
+    If the snapshot cannot be written, `compact` keeps every record in the journal and raises `ShelfException`.
+
+    With a `key` callable every entry is identified by `key(entry)`, which must be unique. The shelve then keeps a position map so
+    `get`, `update`, `remove` and `pop` run in constant time, and listeners registered with `attach` (e.g. the indexes in `indexr`)
+    are told about every entry that is added or discarded. Removal moves the last entry into the freed slot, so the order of a keyed shelve is not preserved.
+
+    With `track_changes=True` (keyed shelves only) a `hashr.ShelfHasher` follows the entries: `save` is skipped when no entry changed
+    since the last save, `changes()` lists the keys that did, and `fileChanged()` tells whether the file was modified by someone else.
+    An entry modified in place (through a reference, instead of `update`) is not seen by the hasher; `rescan()`, or `close(rescan=True)`,
+    compares the entries with the file to catch it. That serializes every entry and reads the whole file, so it is never done implicitly.
+
+    Without a journal, `durability` decides when changes reach the file: after every write (`IMMEDIATE`, the default),
+    after `flush_ops` writes (`EVERY_N_OPS`), `flush_ms` milliseconds after the first unsaved write (`EVERY_T_MS`, from a timer thread)
+    or only on `flush()`/`close()` (`ON_CLOSE`). Inserts, updates and removals all count as writes. Deferred writes coalesce:
+    any number of changes to the same entry cost one save, and with `track_changes` a save is skipped when the changes cancel out.
     """
-    def __init__(self, filepath: str) -> None:
-        super().__init__(filepath);
-        
+    __slots__ = ['journal', 'compact_threshold', 'lock', 'compacting', 'compactor', 'key', 'positions', 'listeners', 'hasher', 'durability', 'flush_ops', 'flush_ms', 'ops', 'timer'];
+
+    DEFAULT__COMPACT_THRESHOLD  = 10000;
+    DEFAULT__FLUSH_OPS          = 1000;
+    DEFAULT__FLUSH_MS           = 1000;
+
+    def __init__(self, filepath: str, journal: bool = False, compact_threshold: int = DEFAULT__COMPACT_THRESHOLD, key=None, track_changes: bool = False, durability: DurabilityPolicy = DurabilityPolicy.IMMEDIATE, flush_ops: int = DEFAULT__FLUSH_OPS, flush_ms: int = DEFAULT__FLUSH_MS, codec: str | None = None, dedup: bool = False) -> None:
+        super().__init__(filepath, codec, dedup);
+
         if(not isinstance(self.data, list) or self.data == {}):
             self.data = list(self.data.values());
-    
-    def insert(self, object_dict: dict) -> None:
+
+        self.journal            = None;
+        self.compact_threshold  = compact_threshold;
+        self.lock               = threading.RLock();
+        self.compacting         = threading.Lock();
+        self.compactor          = None;
+        self.key                = key;
+        self.positions          = {};
+        self.listeners          = [];
+        self.hasher             = None;
+        self.durability         = durability;
+        self.flush_ops          = flush_ops;
+        self.flush_ms           = flush_ms;
+        self.ops                = 0;
+        self.timer              = None;
+
+        if(key is not None):
+            self._reindex();
+
+        if(journal):
+            self.journal = Journal(f"{filepath}.journal");
+            self._replay();
+
+        if(track_changes):
+            self.hasher = ShelfHasher();
+            self.attach(self.hasher);
+            self.hasher.markSaved(filepath);
+
+    def _reindex(self) -> None:
+        """Indexes the entries by key. Of several entries stored under the same key (files written before shelves were keyed
+        may hold some), the last one is kept and the others are dropped.
+        """
+        self.positions = {};
+        duplicates = [];
+        for position, object_dict in enumerate(self.data):
+            object_key = self.key(object_dict);
+            if(object_key in self.positions):
+                duplicates.append(self.positions[object_key]);
+            self.positions[object_key] = position;
+        if(duplicates):
+            print(f"Duplicate keys in {self.filepath}: {len(duplicates)} earlier entries dropped, the last of each key kept.");
+            dropped = set(duplicates);
+            self.data = [object_dict for position, object_dict in enumerate(self.data) if position not in dropped];
+            self.positions = {self.key(object_dict): position for position, object_dict in enumerate(self.data)};
+
+    def _replay(self) -> None:
+        #   A rotated journal left behind by an interrupted compaction goes first
+        rotated_filepath = f"{self.journal.filepath}.old";
+        for filepath in (rotated_filepath, self.journal.filepath):
+            count = 0;
+            for op, data in self.journal.replay(filepath):
+                self._apply(op, data);
+                count += 1;
+        #   The records replayed from the journal count towards `compact_threshold`, as if appended in this session
+        self.journal.count = count;
+
+        if(os.path.exists(rotated_filepath)):
+            if(not self._write(self.data)):
+                raise ShelfException(f"Cannot write the snapshot of {self.filepath}; {rotated_filepath} was kept.");
+            os.remove(rotated_filepath);
+            self.journal.rotate();
+            os.remove(rotated_filepath);
+
+    def _apply(self, op: str, data: dict) -> None:
         try:
-            self.data.append(object_dict);
-        except Exception as e:
-            print(f"Error: {e}");
-        self.save();
-        
+            if(op == 'insert'):
+                self._insert(data);
+            elif(op == 'remove'):
+                self._remove(data);
+            elif(op == 'update'):
+                self._update(data);
+        except (ValueError, KeyError, ShelfException):
+            pass;
+
+    def _log(self, op: str, data: dict) -> None:
+        self.journal.append(op, data);
+        self._scheduleCompaction();
+
+    def _logMany(self, op: str, entries: list) -> None:
+        self.journal.extend(op, entries);
+        self._scheduleCompaction();
+
+    def _scheduleCompaction(self) -> None:
+        if(self.journal.count >= self.compact_threshold and self.compactor is None):
+            self.compactor = threading.Thread(target=self.compact, daemon=True);
+            self.compactor.start();
+
+    def _insert(self, object_dict: dict) -> None:
+        if(self.key is not None):
+            object_key = self.key(object_dict);
+            if(object_key in self.positions):
+                raise ShelfException(f"Duplicate key {object_key} in {self.filepath}.");
+            self.positions[object_key] = len(self.data);
+            for listener in self.listeners:
+                listener.add(object_key, object_dict);
+
+        self.data.append(object_dict);
+
+    def _remove(self, object_dict: dict) -> dict:
+        if(self.key is None):
+            self.data.remove(object_dict);
+            return object_dict;
+
+        object_key  = self.key(object_dict);
+        position    = self.positions.pop(object_key);
+        removed     = self.data[position];
+        last        = self.data.pop();
+        if(last is not removed):
+            self.data[position] = last;
+            self.positions[self.key(last)] = position;
+
+        for listener in self.listeners:
+            listener.discard(object_key, removed);
+        return removed;
+
+    def _update(self, object_dict: dict) -> None:
+        object_key  = self.key(object_dict);
+        position    = self.positions[object_key];
+        previous    = self.data[position];
+        self.data[position] = object_dict;
+
+        for listener in self.listeners:
+            listener.discard(object_key, previous);
+            listener.add(object_key, object_dict);
+
+    def attach(self, listener, replay: bool = True) -> None:
+        """Registers a listener with `add(key, entry)` and `discard(key, entry)` methods and feeds it the current entries,
+        unless `replay` is false (a listener restored from disk that already holds them).
+        """
+        if(self.key is None):
+            raise ShelfException("Listeners can only be attached to a keyed IterableShelve.");
+
+        with self.lock:
+            if(replay):
+                for object_dict in self.data:
+                    listener.add(self.key(object_dict), object_dict);
+            self.listeners.append(listener);
+
+    def detach(self, listener) -> None:
+        with self.lock:
+            self.listeners.remove(listener);
+
+    def get(self, object_key, default=None) -> dict | None:
+        position = self.positions.get(object_key);
+        if(position is None):
+            return default;
+        return self.data[position];
+
+    def __contains__(self, object_key) -> bool:
+        return object_key in self.positions;
+
+    def __len__(self) -> int:
+        return len(self.data);
+
+    def __iter__(self):
+        return iter(self.data);
+
+    def insert(self, object_dict: dict) -> None:
+        with self.lock:
+            try:
+                self._insert(object_dict);
+            except ShelfException:
+                raise;
+            except Exception as e:
+                print(f"Error: {e}");
+
+            if(self.journal is not None):
+                self._log('insert', object_dict);
+            else:
+                self._persist();
+
     def remove(self, object_dict: dict) -> None:
-        self.data.remove(object_dict);
-        
+        with self.lock:
+            self._remove(object_dict);
+
+            if(self.journal is not None):
+                self._log('remove', object_dict);
+            else:
+                self._persist();
+
+    def pop(self, object_key) -> dict:
+        """Removes and returns the entry stored under `object_key`. Only available on a keyed shelve.
+        """
+        if(self.key is None):
+            raise ShelfException("pop() requires a keyed IterableShelve.");
+
+        with self.lock:
+            removed = self._remove(self.data[self.positions[object_key]]);
+
+            if(self.journal is not None):
+                self._log('remove', removed);
+            else:
+                self._persist();
+        return removed;
+
+    def update(self, object_dict: dict) -> None:
+        """Replaces the entry sharing `key(object_dict)` with `object_dict`. Only available on a keyed shelve.
+        """
+        if(self.key is None):
+            raise ShelfException("update() requires a keyed IterableShelve.");
+
+        with self.lock:
+            self._update(object_dict);
+
+            if(self.journal is not None):
+                self._log('update', object_dict);
+            else:
+                self._persist();
+
+    def _validate(self, entries, must_exist: bool) -> list[ShelfStatus]:
+        """Checks a batch before any of it is applied. Keys must be unique within the batch and,
+        depending on `must_exist`, present in or absent from the shelve.
+        """
+        statuses    = [];
+        seen        = set();
+        for object_dict in entries:
+            if(not isinstance(object_dict, dict)):
+                statuses.append(ShelfStatus.SHELF_STATUS__ERR_INVALID_ENTRY);
+                continue;
+            if(self.key is None):
+                statuses.append(ShelfStatus.SHELF_STATUS__SUCCESS);
+                continue;
+
+            try:
+                object_key = self.key(object_dict);
+                hash(object_key);
+            except Exception:
+                statuses.append(ShelfStatus.SHELF_STATUS__ERR_INVALID_ENTRY);
+                continue;
+
+            if(object_key in seen):
+                statuses.append(ShelfStatus.SHELF_STATUS__ERR_DUPLICATE_KEY);
+            elif(must_exist and object_key not in self.positions):
+                statuses.append(ShelfStatus.SHELF_STATUS__ERR_MISSING_KEY);
+            elif(not must_exist and object_key in self.positions):
+                statuses.append(ShelfStatus.SHELF_STATUS__ERR_DUPLICATE_KEY);
+            else:
+                statuses.append(ShelfStatus.SHELF_STATUS__SUCCESS);
+                seen.add(object_key);
+
+        return statuses;
+
+    def _applyMany(self, op: str, entries, must_exist: bool) -> list[ShelfStatus]:
+        entries = list(entries);
+        with self.lock:
+            statuses = self._validate(entries, must_exist);
+            accepted = [object_dict for object_dict, status in zip(entries, statuses) if status == ShelfStatus.SHELF_STATUS__SUCCESS];
+
+            apply = {'insert': self._insert, 'update': self._update, 'remove': self._remove}[op];
+            if(op == 'remove' and self.key is None):
+                #   Unkeyed removal compares whole entries; entries that are not stored are reported as missing
+                for position, object_dict in enumerate(entries):
+                    if(statuses[position] == ShelfStatus.SHELF_STATUS__SUCCESS):
+                        try:
+                            apply(object_dict);
+                        except ValueError:
+                            statuses[position] = ShelfStatus.SHELF_STATUS__ERR_MISSING_KEY;
+                accepted = [object_dict for object_dict, status in zip(entries, statuses) if status == ShelfStatus.SHELF_STATUS__SUCCESS];
+            else:
+                for object_dict in accepted:
+                    apply(object_dict);
+
+            if(accepted):
+                if(self.journal is not None):
+                    self._logMany(op, accepted);
+                else:
+                    self._persist(len(accepted));
+
+        return statuses;
+
+    def insert_many(self, entries) -> list[ShelfStatus]:
+        """Validates a batch of entries, inserts the valid ones in one pass and persists once.
+        Returns one `ShelfStatus` per entry, in order.
+        """
+        return self._applyMany('insert', entries, False);
+
+    def update_many(self, entries) -> list[ShelfStatus]:
+        """Batch counterpart of `update`. Only available on a keyed shelve.
+        """
+        if(self.key is None):
+            raise ShelfException("update_many() requires a keyed IterableShelve.");
+        return self._applyMany('update', entries, True);
+
+    def remove_many(self, entries) -> list[ShelfStatus]:
+        """Batch counterpart of `remove`.
+        """
+        return self._applyMany('remove', entries, True);
+
+    def changes(self) -> list:
+        """Returns the keys inserted, removed or modified since the last save. Requires `track_changes=True`.
+        """
+        if(self.hasher is None):
+            raise ShelfException("changes() requires track_changes=True.");
+        return self.hasher.changed();
+
+    def dirty(self) -> bool:
+        return True if self.hasher is None else self.hasher.dirty();
+
+    def rescan(self) -> bool:
+        """Returns `dirty()`, after comparing the entries with the file (see `shelfMatches`) when change tracking finds nothing:
+        an entry modified in place then makes the shelve dirty until the next save. Serializes every entry, but writes nothing.
+        """
+        with self.lock:
+            if(self.hasher is None or self.hasher.dirty()):
+                return self.dirty();
+            if(not shelfMatches(self.filepath, self.data, None if self.codec is None else self.codec.name, self.dedup)):
+                self.hasher.invalidate();
+            return self.dirty();
+
+    def fileChanged(self) -> bool:
+        """Tells whether the file on disk was modified since this shelve last loaded or saved it, without reading it.
+        """
+        if(self.hasher is None):
+            raise ShelfException("fileChanged() requires track_changes=True.");
+        return self.hasher.fileChanged(self.filepath);
+
+    def _persist(self, count: int = 1) -> None:
+        """Records `count` plain-mode writes and saves if the durability policy says so.
+        """
+        self.ops += count;
+        if(self.durability == DurabilityPolicy.IMMEDIATE):
+            self.flush();
+        elif(self.durability == DurabilityPolicy.EVERY_N_OPS):
+            if(self.ops >= self.flush_ops):
+                self.flush();
+        elif(self.durability == DurabilityPolicy.EVERY_T_MS):
+            if(self.timer is None):
+                self.timer = threading.Timer(self.flush_ms / 1000, self.flush);
+                self.timer.daemon = True;
+                self.timer.start();
+
+    def flush(self) -> None:
+        """Writes the pending changes now, whatever the durability policy. In journal mode the journal is compacted.
+        """
+        if(self.journal is not None):
+            self.compact();
+            return;
+
+        with self.lock:
+            if(self.timer is not None):
+                self.timer.cancel();
+                self.timer = None;
+            self.ops = 0;
+            self.save();
+
+    def save(self) -> None:
+        if(self.journal is not None):
+            self.compact();
+            return;
+
+        with self.lock:
+            if(not self.dirty()):
+                return;
+            #   A failed write leaves the changes pending, for the next save to retry
+            if(super().save() and self.hasher is not None):
+                self.hasher.markSaved(self.filepath);
+
+    def compact(self) -> None:
+        """Folds the journal into the snapshot file. The journal is rotated under the lock and the snapshot is written outside of it,
+        so inserts are not blocked while the file is being serialized.
+        """
+        if(self.journal is None):
+            return;
+
+        with self.compacting:
+            with self.lock:
+                #   Nothing journaled and nothing changed: the snapshot is already current
+                if(not self.dirty() and os.path.getsize(self.journal.filepath) == 0):
+                    self.compactor = None;
+                    return;
+                snapshot = list(self.data);
+                rotated_count = self.journal.count;
+                rotated_filepath = self.journal.rotate();
+                baseline = None;
+                if(self.hasher is not None):
+                    baseline = dict(self.hasher.baseline);
+                    self.hasher.markSaved(self.filepath);
+
+            if(not self._write(snapshot)):
+                #   The rotated journal is the only copy of its records: put it back in front of the new one
+                with self.lock:
+                    self.journal.restore(rotated_filepath, rotated_count);
+                    if(baseline is not None):
+                        self.hasher.restore(baseline);
+                        self.hasher.invalidate();
+                self.compactor = None;
+                raise ShelfException(f"Cannot write the snapshot of {self.filepath}; the journal was kept.");
+            os.remove(rotated_filepath);
+            if(self.hasher is not None):
+                self.hasher.signature = fileSignature(self.filepath);
+
+        self.compactor = None;
+
+    def close(self, rescan: bool = False) -> None:
+        """Saves pending changes (compacting the journal, if any) and closes the shelve. With `rescan`, entries modified in place are saved too; see `rescan`.
+        """
+        if(rescan):
+            self.rescan();
+        if(self.journal is None):
+            self.flush();
+            return;
+
+        compactor = self.compactor;
+        if(compactor is not None):
+            compactor.join();
+        self.compact();
+        self.journal.close();
+
     def __str__(self) -> str:
         return f"IterableShelve(filepath={self.filepath})";
 
     def __repr__(self) -> str:
         return f"IterableShelve(filepath={self.filepath})";
-    
+
@@ -0,0 +1,114 @@
+"""
+Inter-process file locks.
+
+Locks are advisory and taken on a separate `<path>.lock` file, so the locked file itself can be atomically replaced while the lock is held.
+POSIX systems use `fcntl.flock` (shared and exclusive); on Windows `msvcrt.locking` is used and every lock is exclusive.
+"""
+
+import threading;
+
+try:
+    import fcntl;
+except ImportError:
+    fcntl = None;
+    import msvcrt;
+
+
+class LockException(Exception):
+    def __init__(self, message: str) -> None:
+        super().__init__(message);
+        self.message = message;
+
+    def __str__(self) -> str:
+        return self.message;
+
+    def __repr__(self) -> str:
+        return f"LockException(message={self.message})";
+
+
+class FileLock:
+    """Reentrant inter-process lock on `<filepath>.lock`.
+    Nested acquisitions from the same object only count depth; a shared lock cannot be upgraded to an exclusive one while held.
+    Threads of the same process are serialized by an internal `RLock`.
+    """
+    __slots__ = ['filepath', 'file', 'depth', 'shared', 'mutex'];
+
+    def __init__(self, filepath: str) -> None:
+        self.filepath   = f"{filepath}.lock";
+        self.file       = None;
+        self.depth      = 0;
+        self.shared     = False;
+        self.mutex      = threading.RLock();
+
+    def acquire(self, shared: bool = False) -> None:
+        self.mutex.acquire();
+        if(self.depth > 0):
+            if(self.shared and not shared):
+                self.mutex.release();
+                raise LockException(f"Cannot upgrade the shared lock on {self.filepath} to an exclusive one.");
+            self.depth += 1;
+            return;
+
+        self.file = open(self.filepath, 'a+');
+        try:
+            if(fcntl is not None):
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX);
+            else:
+                self.file.seek(0);
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1);
+        except:
+            self.file.close();
+            self.file = None;
+            self.mutex.release();
+            raise;
+
+        self.depth  = 1;
+        self.shared = shared;
+
+    def release(self) -> None:
+        self.depth -= 1;
+        if(self.depth == 0):
+            if(fcntl is not None):
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN);
+            else:
+                self.file.seek(0);
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1);
+            self.file.close();
+            self.file = None;
+        self.mutex.release();
+
+    def exclusive(self) -> '_Held':
+        return _Held(self, False);
+
+    def sharedLock(self) -> '_Held':
+        return _Held(self, True);
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire();
+        return self;
+
+    def __exit__(self, *args) -> None:
+        self.release();
+
+    def __str__(self) -> str:
+        return f"FileLock(filepath={self.filepath}, depth={self.depth})";
+
+    def __repr__(self) -> str:
+        return f"FileLock(filepath={self.filepath}, depth={self.depth})";
+
+
+class _Held:
+    """Context manager returned by `FileLock.exclusive()` and `FileLock.sharedLock()`.
+    """
+    __slots__ = ['lock', 'shared'];
+
+    def __init__(self, lock: FileLock, shared: bool) -> None:
+        self.lock   = lock;
+        self.shared = shared;
+
+    def __enter__(self) -> FileLock:
+        self.lock.acquire(self.shared);
+        return self.lock;
+
+    def __exit__(self, *args) -> None:
+        self.lock.release();
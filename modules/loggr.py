@@ -6,7 +6,11 @@ Implements a simple, stand-alone logging module.
 
 from enum import Enum;
 import os;
-from logging import getLogger, StreamHandler, Formatter, DEBUG, INFO, WARNING, ERROR, CRITICAL;
+import atexit;
+import queue;
+import threading;
+import time;
+from logging import getLogger, Handler, StreamHandler, Formatter, DEBUG, INFO, WARNING, ERROR, CRITICAL;
 
 class LogLevel(Enum):
     DEBUG = DEBUG;
@@ -21,10 +25,102 @@ class LogStatus(Enum):
     LOG_STATUS__ERR_CANNOT_WRITE    = 2;
     LOG_STATUS__ERR_UNKNOWN         = 3;
     
+class LogQueuePolicy(Enum):
+    """What an asynchronous `Loggr` does when its queue is full.
+    """
+    BLOCK   = 0;
+    DROP    = 1;
+
+#   Queued by `BatchingHandler.flush()`: the writer writes what it holds without waiting for the batch to fill
+LOGGR__FLUSH = object();
+
+class BatchingHandler(Handler):
+    """A `logging.Handler` that hands records to a background writer thread through a bounded queue.
+    The writer formats records in batches and writes each batch with a single `write` + `flush`, once `batch_size`
+    records are waiting or `flush_interval` seconds have passed since the first of them. `flush()` writes the batch at once;
+    records still queued are written on `close()`.
+    """
+    def __init__(self, stream, queue_size: int = 10000, policy: LogQueuePolicy = LogQueuePolicy.BLOCK, batch_size: int = 256, flush_interval: float = 0.5):
+        super().__init__();
+        self.stream         = stream;
+        self.queue          = queue.Queue(queue_size);
+        self.policy         = policy;
+        self.batch_size     = batch_size;
+        self.flush_interval = flush_interval;
+        self.dropped        = 0;
+        self.closed         = False;
+        self.writer         = threading.Thread(target=self._run, name='LoggrWriter', daemon=True);
+        self.writer.start();
+
+    def emit(self, record) -> None:
+        if(self.closed):
+            return;
+        if(self.policy == LogQueuePolicy.BLOCK):
+            self.queue.put(record);
+            return;
+        try:
+            self.queue.put_nowait(record);
+        except queue.Full:
+            self.dropped += 1;
+
+    def _run(self) -> None:
+        stopping = False;
+        while(not stopping):
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)];
+            except queue.Empty:
+                continue;
+
+            #   `None` is the stop sentinel queued by `close()`; it and `LOGGR__FLUSH` end the batch early
+            deadline = time.monotonic() + self.flush_interval;
+            while(len(batch) < self.batch_size and batch[-1] is not None and batch[-1] is not LOGGR__FLUSH):
+                remaining = deadline - time.monotonic();
+                if(remaining <= 0):
+                    break;
+                try:
+                    batch.append(self.queue.get(timeout=remaining));
+                except queue.Empty:
+                    break;
+
+            records = [record for record in batch if record is not None and record is not LOGGR__FLUSH];
+            stopping = batch[-1] is None;
+            self._write(records);
+
+            for _ in batch:
+                self.queue.task_done();
+
+    def _write(self, batch: list) -> None:
+        if(not batch):
+            return;
+        try:
+            self.stream.write(''.join(self.format(record) + '\n' for record in batch));
+            self.stream.flush();
+        except Exception:
+            for record in batch:
+                self.handleError(record);
+
+    def flush(self) -> None:
+        """Blocks until every queued record has been written.
+        """
+        if(not self.closed):
+            self.queue.put(LOGGR__FLUSH);
+            self.queue.join();
+
+    def close(self) -> None:
+        if(not self.closed):
+            self.closed = True;
+            self.queue.put(None);
+            self.writer.join();
+        super().close();
+
 class Loggr:
     """General class for the logger. Implements a simple logging system based on a logfile.
+    With `async_mode=True` records are written by a background thread in batches (see `BatchingHandler`);
+    pending records are flushed on `close()` and at interpreter exit.
     """
-    def __init__(self, log_file, log_level=LogLevel.DEBUG, formatter_string='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%m-%d-%Y %I:%M:%S %p'):
+    def __init__(self, log_file, log_level=LogLevel.DEBUG, formatter_string='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%m-%d-%Y %I:%M:%S %p', async_mode=False, queue_size=10000, policy=LogQueuePolicy.BLOCK, batch_size=256, flush_interval=0.5):
+        self.closed = False;
+        
         #   Set the logfile
         #   Check if the logfile exists
         if(not os.path.exists(log_file)):
@@ -44,7 +140,11 @@ class Loggr:
         self.logger.setLevel(self.log_level.value);
         
         #   Set the handler
-        self.handler = StreamHandler(self.log_file);
+        if(async_mode):
+            self.handler = BatchingHandler(self.log_file, queue_size, policy, batch_size, flush_interval);
+            atexit.register(self.close);
+        else:
+            self.handler = StreamHandler(self.log_file);
         self.handler.setLevel(self.log_level.value);
         
         #   Set the formatter
@@ -94,10 +194,18 @@ class Loggr:
     def get_log_file(self):
         return self.log_file;
     
+    def flush(self):
+        self.handler.flush();
+    
     def close(self):
+        if(self.closed):
+            return;
         self.log('Logging session closed.', LogLevel.INFO);
         self.logger.removeHandler(self.handler);
         self.handler.close();
+        self.closed = True;
+        if(isinstance(self.handler, BatchingHandler)):
+            atexit.unregister(self.close);
         
     def __del__(self):
         self.close();
\ No newline at end of file
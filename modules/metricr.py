@@ -0,0 +1,436 @@
+"""
+Runtime metrics and profiling for Taskr.
+
+`instrument()` replaces the hot-path functions listed in `METRICS__TARGETS` (shelf load/save, shelve inserts and removals,
+task construction, rendering, parsing, `Taskr` queries) with timing wrappers, and `uninstrument()` puts the originals back:
+when instrumentation is off the code runs unchanged, with no flag checks on the hot path.
+
+Every instrumented call records into a `MetricsRegistry`:
+    <metric>.seconds    latency `Histogram`
+    <metric>.calls      counter; <metric>.errors counts the calls that raised
+    <metric>.records    counter of entries processed, where the target reports them
+    <metric>.bytes      counter of bytes written or read, where the target reports them
+
+`MetricsRegistry.export()` hands a snapshot to every attached sink: `MemorySink`, `JsonLinesSink` (one JSON line per export)
+or `PrometheusSink` (text exposition format, for a node_exporter textfile collector). Any object with `emit(snapshot)` is a sink.
+
+`Profiler` switches cProfile and/or tracemalloc on and off at runtime:
+
+    instrument();
+    METRICS.attach(JsonLinesSink('metrics.jsonl'));
+    PROFILER.start(memory=True);
+    ...
+    report = PROFILER.stop();
+    METRICS.export();
+"""
+
+import io;
+import os;
+import sys;
+import json;
+import time;
+import threading;
+import importlib;
+from types import ModuleType;
+import functools;
+import cProfile;
+import pstats;
+import tracemalloc;
+from bisect import bisect_left;
+from collections import deque;
+from time import perf_counter;
+
+#   Latency bucket upper bounds, in seconds
+METRICS__BUCKETS    = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0);
+METRICS__PREFIX     = 'taskr';
+METRICS__MEMORY_SIZE= 100;
+PROFILER__TOP       = 25;
+
+
+class MetricsException(Exception):
+    def __init__(self, message: str) -> None:
+        super().__init__(message);
+        self.message = message;
+
+    def __str__(self) -> str:
+        return self.message;
+
+    def __repr__(self) -> str:
+        return f"MetricsException(message={self.message})";
+
+
+#   Registry
+#   -----------------------------------------------------------------------------------------------------------------------
+class Histogram:
+    """Fixed-bucket histogram: `counts[i]` holds the observations `<= bounds[i]` and above the previous bound, the last slot the rest.
+    """
+    __slots__ = ['bounds', 'counts', 'count', 'sum'];
+
+    def __init__(self, bounds: tuple[float, ...] = METRICS__BUCKETS) -> None:
+        self.bounds = bounds;
+        self.counts = [0] * (len(bounds) + 1);
+        self.count  = 0;
+        self.sum    = 0.0;
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1;
+        self.count  += 1;
+        self.sum    += value;
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile (`inf` past the last bound, `0.0` when empty).
+        """
+        if(not self.count):
+            return 0.0;
+        rank = q * self.count;
+        seen = 0;
+        for index, count in enumerate(self.counts):
+            seen += count;
+            if(seen >= rank):
+                return self.bounds[index] if index < len(self.bounds) else float('inf');
+        return float('inf');
+
+    def get(self) -> dict:
+        return {
+            'bounds':   list(self.bounds),
+            'counts':   list(self.counts),
+            'count':    self.count,
+            'sum':      self.sum,
+            'p50':      self.quantile(0.5),
+            'p99':      self.quantile(0.99)
+        };
+
+    def __str__(self) -> str:
+        return f"Histogram(count={self.count}, sum={self.sum})";
+
+    def __repr__(self) -> str:
+        return f"Histogram(bounds={self.bounds}, counts={self.counts}, count={self.count}, sum={self.sum})";
+
+
+class MetricsRegistry:
+    """Counters and histograms by name, safe to update from several threads, and the sinks they are exported to.
+    """
+    __slots__ = ['counters', 'histograms', 'sinks', 'lock'];
+
+    def __init__(self) -> None:
+        self.counters   = {};
+        self.histograms = {};
+        self.sinks      = [];
+        self.lock       = threading.Lock();
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value;
+
+    def observe(self, name: str, value: float) -> None:
+        with self.lock:
+            histogram = self.histograms.get(name);
+            if(histogram is None):
+                histogram = self.histograms[name] = Histogram();
+            histogram.observe(value);
+
+    def record(self, metric: str, seconds: float, failed: bool, records: int | None, size: int | None) -> None:
+        """Records one instrumented call of `metric`.
+        """
+        with self.lock:
+            histogram = self.histograms.get(f"{metric}.seconds");
+            if(histogram is None):
+                histogram = self.histograms[f"{metric}.seconds"] = Histogram();
+            histogram.observe(seconds);
+            counters = self.counters;
+            counters[f"{metric}.calls"] = counters.get(f"{metric}.calls", 0) + 1;
+            if(failed):
+                counters[f"{metric}.errors"] = counters.get(f"{metric}.errors", 0) + 1;
+            if(records is not None):
+                counters[f"{metric}.records"] = counters.get(f"{metric}.records", 0) + records;
+            if(size is not None):
+                counters[f"{metric}.bytes"] = counters.get(f"{metric}.bytes", 0) + size;
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'timestamp':    time.time(),
+                'counters':     dict(self.counters),
+                'histograms':   {name: histogram.get() for name, histogram in self.histograms.items()}
+            };
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters.clear();
+            self.histograms.clear();
+
+    def attach(self, sink) -> None:
+        self.sinks.append(sink);
+
+    def detach(self, sink) -> None:
+        self.sinks.remove(sink);
+
+    def export(self) -> dict:
+        """Sends a snapshot to every sink and returns it.
+        """
+        snapshot = self.snapshot();
+        for sink in self.sinks:
+            sink.emit(snapshot);
+        return snapshot;
+
+    def __str__(self) -> str:
+        return f"MetricsRegistry(counters={len(self.counters)}, histograms={len(self.histograms)})";
+
+    def __repr__(self) -> str:
+        return f"MetricsRegistry(counters={self.counters}, histograms={list(self.histograms)}, sinks={self.sinks})";
+
+
+#   Sinks
+#   -----------------------------------------------------------------------------------------------------------------------
+class MemorySink:
+    """Keeps the last `size` snapshots.
+    """
+    __slots__ = ['snapshots'];
+
+    def __init__(self, size: int = METRICS__MEMORY_SIZE) -> None:
+        self.snapshots = deque(maxlen=size);
+
+    def emit(self, snapshot: dict) -> None:
+        self.snapshots.append(snapshot);
+
+    def last(self) -> dict | None:
+        return self.snapshots[-1] if self.snapshots else None;
+
+    def __str__(self) -> str:
+        return f"MemorySink(snapshots={len(self.snapshots)})";
+
+    def __repr__(self) -> str:
+        return f"MemorySink(snapshots={len(self.snapshots)}, size={self.snapshots.maxlen})";
+
+
+class JsonLinesSink:
+    """Appends each snapshot to `filepath` as one JSON line.
+    """
+    __slots__ = ['filepath'];
+
+    def __init__(self, filepath: str) -> None:
+        self.filepath = filepath;
+
+    def emit(self, snapshot: dict) -> None:
+        with open(self.filepath, 'a') as f:
+            f.write(json.dumps(snapshot) + '\n');
+
+    def __str__(self) -> str:
+        return f"JsonLinesSink(filepath={self.filepath})";
+
+    def __repr__(self) -> str:
+        return f"JsonLinesSink(filepath={self.filepath})";
+
+
+def prometheusName(name: str, prefix: str = METRICS__PREFIX) -> str:
+    return f"{prefix}_" + ''.join(character if character.isalnum() else '_' for character in name);
+
+def prometheusText(snapshot: dict, prefix: str = METRICS__PREFIX) -> str:
+    """Renders a snapshot in the Prometheus text exposition format: counters as `_total`, histograms as cumulative `_bucket`s.
+    """
+    lines = [];
+    for name, value in sorted(snapshot['counters'].items()):
+        metric = prometheusName(name, prefix) + '_total';
+        lines.append(f"# TYPE {metric} counter");
+        lines.append(f"{metric} {value}");
+    for name, histogram in sorted(snapshot['histograms'].items()):
+        metric = prometheusName(name, prefix);
+        lines.append(f"# TYPE {metric} histogram");
+        cumulative = 0;
+        for bound, count in zip(histogram['bounds'] + ['+Inf'], histogram['counts']):
+            cumulative += count;
+            lines.append(f"{metric}_bucket{{le=\"{bound}\"}} {cumulative}");
+        lines.append(f"{metric}_sum {histogram['sum']}");
+        lines.append(f"{metric}_count {histogram['count']}");
+    return '\n'.join(lines) + '\n';
+
+class PrometheusSink:
+    """Rewrites `filepath` atomically with the latest snapshot in the Prometheus text format.
+    """
+    __slots__ = ['filepath', 'prefix'];
+
+    def __init__(self, filepath: str, prefix: str = METRICS__PREFIX) -> None:
+        self.filepath   = filepath;
+        self.prefix     = prefix;
+
+    def emit(self, snapshot: dict) -> None:
+        tmp_filepath = f"{self.filepath}.tmp";
+        with open(tmp_filepath, 'w') as f:
+            f.write(prometheusText(snapshot, self.prefix));
+        os.replace(tmp_filepath, self.filepath);
+
+    def __str__(self) -> str:
+        return f"PrometheusSink(filepath={self.filepath})";
+
+    def __repr__(self) -> str:
+        return f"PrometheusSink(filepath={self.filepath}, prefix={self.prefix})";
+
+
+#   Instrumentation
+#   -----------------------------------------------------------------------------------------------------------------------
+def _fileSize(filepath: str) -> int | None:
+    try:
+        return os.path.getsize(filepath);
+    except OSError:
+        return None;
+
+def _sized(result) -> int | None:
+    return len(result) if hasattr(result, '__len__') else None;
+
+#   (module, attribute, metric, records(args, result), bytes(args, result)); `None` when the target does not report them
+METRICS__TARGETS = [
+    ('jsonShelves', 'loadShelf',                    'shelf.load',           lambda args, result: _sized(result),    lambda args, result: _fileSize(args[0])),
+    ('jsonShelves', 'writeShelf',                   'shelf.write',          lambda args, result: result,            lambda args, result: _fileSize(args[0])),
+    ('jsonShelves', 'Shelf._write',                 'shelf.save',           lambda args, result: _sized(args[1]),   lambda args, result: _fileSize(args[0].filepath)),
+    ('jsonShelves', 'IterableShelve.insert',        'shelve.insert',        lambda args, result: 1,                 None),
+    ('jsonShelves', 'IterableShelve.update',        'shelve.update',        lambda args, result: 1,                 None),
+    ('jsonShelves', 'IterableShelve.remove',        'shelve.remove',        lambda args, result: 1,                 None),
+    ('jsonShelves', 'IterableShelve._applyMany',    'shelve.batch',         lambda args, result: len(result),       None),
+    ('sharedShelves','SharedShelve.insert',         'shelve.insert',        lambda args, result: 1,                 None),
+    ('sharedShelves','SharedShelve.update',         'shelve.update',        lambda args, result: 1,                 None),
+    ('sharedShelves','SharedShelve.remove',         'shelve.remove',        lambda args, result: 1,                 None),
+    ('sharedShelves','SharedShelve.insert_many',    'shelve.batch',         lambda args, result: len(result),       None),
+    ('sharedShelves','SharedShelve.update_many',    'shelve.batch',         lambda args, result: len(result),       None),
+    ('sharedShelves','SharedShelve.remove_many',    'shelve.batch',         lambda args, result: len(result),       None),
+    ('tasks',       'Task.__init__',                'task.init',            None,                                   None),
+    ('tasks',       'Task.from_records',            'task.from_records',    lambda args, result: len(result),       None),
+    ('tasks',       'FormattedTask.render',         'task.render',          lambda args, result: 1,                 lambda args, result: len(result)),
+    ('tasks',       'render_many',                  'task.render_many',     None,                                   lambda args, result: len(result)),
+    ('parsers',     'UserParserInterface.parseLine','parser.parse_line',    lambda args, result: 1,                 None),
+    ('Taskr',       'Taskr.query',                  'taskr.query',          lambda args, result: len(result),       None),
+    ('Taskr',       'Taskr.retrieve',               'taskr.retrieve',       lambda args, result: len(result),       None),
+    ('Taskr',       'Taskr.update',                 'taskr.update',         None,                                   None)
+];
+
+def _wrap(function, registry: MetricsRegistry, metric: str, records, size):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = perf_counter();
+        failed = True;
+        result = None;
+        try:
+            result = function(*args, **kwargs);
+            failed = False;
+            return result;
+        finally:
+            elapsed = perf_counter() - start;
+            registry.record(
+                metric, elapsed, failed,
+                None if records is None or failed else records(args, result),
+                None if size is None or failed else size(args, result)
+            );
+    return wrapper;
+
+def _resolve(module_name: str, attribute: str):
+    """Returns `(owner, name, raw)`: the module or class holding the attribute and its raw value (classmethods unwrapped from the class `__dict__`).
+    """
+    owner = importlib.import_module(module_name);
+    *path, name = attribute.split('.');
+    for part in path:
+        owner = getattr(owner, part);
+    raw = owner.__dict__.get(name) if isinstance(owner, type) else getattr(owner, name, None);
+    if(raw is None):
+        raise MetricsException(f"{module_name}.{attribute} cannot be instrumented: not found.");
+    return owner, name, raw;
+
+#   (owner, name, original) of every replaced attribute, restored by `uninstrument`
+_INSTRUMENTED: list[tuple[object, str, object]] = [];
+_INSTRUMENT_LOCK = threading.Lock();
+
+def instrument(registry: 'MetricsRegistry | None' = None, targets: list[tuple] | None = None) -> None:
+    """Wraps every target with a timing wrapper recording into `registry` (`METRICS` by default). Calling it again is a no-op
+    until `uninstrument()`. A module-level function is also replaced in every loaded module that imported it by name
+    (`from jsonShelves import loadShelf`, star imports); modules imported later get the wrapper from the patched module.
+    """
+    registry = METRICS if registry is None else registry;
+    with _INSTRUMENT_LOCK:
+        if(_INSTRUMENTED):
+            return;
+        for module_name, attribute, metric, records, size in (METRICS__TARGETS if targets is None else targets):
+            owner, name, raw = _resolve(module_name, attribute);
+            if(isinstance(raw, (classmethod, staticmethod))):
+                wrapped = type(raw)(_wrap(raw.__func__, registry, metric, records, size));
+            else:
+                wrapped = _wrap(raw, registry, metric, records, size);
+            setattr(owner, name, wrapped);
+            _INSTRUMENTED.append((owner, name, raw));
+            if(isinstance(owner, ModuleType)):
+                for module in list(sys.modules.values()):
+                    if(module is not owner and isinstance(module, ModuleType) and module.__dict__.get(name) is raw):
+                        setattr(module, name, wrapped);
+                        _INSTRUMENTED.append((module, name, raw));
+
+def uninstrument() -> None:
+    """Restores the original functions.
+    """
+    with _INSTRUMENT_LOCK:
+        while(_INSTRUMENTED):
+            owner, name, raw = _INSTRUMENTED.pop();
+            setattr(owner, name, raw);
+
+def instrumented() -> bool:
+    return bool(_INSTRUMENTED);
+
+
+#   Profiling
+#   -----------------------------------------------------------------------------------------------------------------------
+class Profiler:
+    """Runtime switch for cProfile (`cpu`) and tracemalloc (`memory`). `stop()` returns the report of the capture.
+    """
+    __slots__ = ['profile', 'memory', 'started'];
+
+    def __init__(self) -> None:
+        self.profile    = None;
+        self.memory     = False;
+        self.started    = None;
+
+    def running(self) -> bool:
+        return self.started is not None;
+
+    def start(self, cpu: bool = True, memory: bool = False) -> None:
+        if(self.running()):
+            raise MetricsException("The profiler is already running.");
+        if(cpu):
+            self.profile = cProfile.Profile();
+            self.profile.enable();
+        if(memory and not tracemalloc.is_tracing()):
+            tracemalloc.start();
+            self.memory = True;
+        self.started = perf_counter();
+
+    def stop(self, top: int = PROFILER__TOP) -> dict:
+        """Stops the capture. The report holds the `top` functions by cumulative time and the `top` allocation sites by size.
+        """
+        if(not self.running()):
+            raise MetricsException("The profiler is not running.");
+        report = {'elapsed_s': perf_counter() - self.started};
+        self.started = None;
+
+        if(self.profile is not None):
+            self.profile.disable();
+            stream = io.StringIO();
+            pstats.Stats(self.profile, stream=stream).sort_stats('cumulative').print_stats(top);
+            report['cpu'] = stream.getvalue();
+            self.profile = None;
+
+        if(self.memory):
+            snapshot = tracemalloc.take_snapshot();
+            current, peak = tracemalloc.get_traced_memory();
+            tracemalloc.stop();
+            self.memory = False;
+            report['memory'] = {
+                'current_bytes':    current,
+                'peak_bytes':       peak,
+                'top':              [str(statistic) for statistic in snapshot.statistics('lineno')[:top]]
+            };
+        return report;
+
+    def __str__(self) -> str:
+        return f"Profiler(running={self.running()})";
+
+    def __repr__(self) -> str:
+        return f"Profiler(running={self.running()}, cpu={self.profile is not None}, memory={self.memory})";
+
+
+METRICS     = MetricsRegistry();
+PROFILER    = Profiler();
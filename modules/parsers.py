@@ -9,11 +9,22 @@ v0.1.0
 #   Constants
 #   ---------------------------------------------------------------------------
 
+import os;
+import json;
+import atexit;
+from bisect import bisect_right;
 from enum import Enum;
+from collections import deque;
+from typing import Iterable, Iterator;
 
 DELIMITER__SPACE = " ";
 DELIMITER__COMMA = ",";
 
+HISTORY__CAPACITY   = 1000;
+HISTORY__SPILL_BATCH= 256;
+HISTORY__SCAN_CHUNK = 1 << 16;
+PARSER__TRACE_SIZE  = 1000;
+
 
 class ParserException(BaseException):
     def __init__(self, message: str) -> None:
@@ -29,6 +40,189 @@ class ParserException(BaseException):
     def __json__(self) -> str:
         return self.__dict__();
 
+class History:
+    """Bounded command history: the last `capacity` lines are kept in a ring buffer, older ones are dropped or,
+    with `spill`, appended to a gzip-compressed JSON-lines log (`{"index": ..., "line": ...}` per line) in batches of
+    `HISTORY__SPILL_BATCH`. Memory use stays flat however many commands are recorded. Entries still waiting for the log
+    are written on `close()`, which also runs at interpreter exit.
+
+    Entries are `(index, line)` pairs; `index` counts every command ever recorded, so it stays valid after eviction.
+    A spill log is shared by every session using it: an existing log is scanned once when the history is created, and the
+    indices continue from its last entry. Every batch is a gzip member of its own, and the byte offset of each is kept:
+    looking up a spilled entry only decompresses the batch holding it.
+
+    `search` and `searchAll` look at the in-memory entries only; spilled entries are reached by index or through `spilled()`.
+    """
+    __slots__ = ['entries', 'capacity', 'spill', 'pending', 'count', 'offsets'];
+    
+    def __init__(self, capacity: int = HISTORY__CAPACITY, spill: str | None = None) -> None:
+        self.entries = deque(maxlen=capacity);
+        self.capacity = capacity;
+        self.spill = spill;
+        self.pending = [];
+        self.count = 0;
+        #   `([first index of each spilled batch], [byte offset of its gzip member])`
+        self.offsets = ([], []);
+        if(spill is not None):
+            self._scan();
+            atexit.register(self.close);
+
+    def _scan(self) -> None:
+        """Indexes the batches already in the spill log and continues the command indices after its last entry.
+        The log is decompressed in chunks, one gzip member at a time; a torn last batch ends the scan.
+        """
+        import zlib;
+        try:
+            f = open(self.spill, 'rb');
+        except FileNotFoundError:
+            return;
+        with f:
+            base = member = 0;
+            decompressor = zlib.decompressobj(31);
+            text = b'';
+            chunk = f.read(HISTORY__SCAN_CHUNK);
+            try:
+                while(chunk):
+                    text += decompressor.decompress(chunk);
+                    *records, text = text.split(b'\n');
+                    for record in records:
+                        index = json.loads(record)['index'];
+                        if(not self.offsets[1] or self.offsets[1][-1] != member):
+                            self.offsets[0].append(index);
+                            self.offsets[1].append(member);
+                        self.count = index + 1;
+                    if(decompressor.eof):
+                        unused = decompressor.unused_data;
+                        base += len(chunk) - len(unused);
+                        member = base;
+                        decompressor = zlib.decompressobj(31);
+                        text = b'';
+                        chunk = unused or f.read(HISTORY__SCAN_CHUNK);
+                    else:
+                        base += len(chunk);
+                        chunk = f.read(HISTORY__SCAN_CHUNK);
+            except (zlib.error, ValueError, KeyError):
+                return;
+    
+    def append(self, line: str) -> int:
+        """Records `line` and returns its command index.
+        """
+        if(len(self.entries) == self.capacity and self.spill is not None):
+            self.pending.append(self.entries[0]);
+            if(len(self.pending) >= HISTORY__SPILL_BATCH):
+                self.flush();
+        index = self.count;
+        self.entries.append((index, line));
+        self.count += 1;
+        return index;
+    
+    def flush(self) -> None:
+        """Writes the evicted entries still waiting for the spill log.
+        """
+        if(not self.pending):
+            return;
+        import gzip;
+        offset = os.path.getsize(self.spill) if os.path.exists(self.spill) else 0;
+        with gzip.open(self.spill, 'at', encoding='utf-8') as f:
+            f.writelines(json.dumps({'index': index, 'line': line}) + '\n' for index, line in self.pending);
+        self.offsets[0].append(self.pending[0][0]);
+        self.offsets[1].append(offset);
+        self.pending = [];
+    
+    def spilled(self) -> Iterator[tuple[int, str]]:
+        """Iterates over the entries evicted from memory, oldest first, those of earlier sessions sharing the log included (only with `spill`).
+        """
+        if(self.spill is None):
+            return;
+        self.flush();
+        import gzip;
+        try:
+            with gzip.open(self.spill, 'rt', encoding='utf-8') as f:
+                for record in f:
+                    entry = json.loads(record);
+                    yield entry['index'], entry['line'];
+        except FileNotFoundError:
+            return;
+    
+    def _spilledLine(self, index: int) -> str | None:
+        """Reads the line of command `index` from the batch of the spill log holding it.
+        """
+        batch = bisect_right(self.offsets[0], index) - 1;
+        if(batch < 0):
+            return None;
+        import gzip;
+        try:
+            with open(self.spill, 'rb') as raw:
+                raw.seek(self.offsets[1][batch]);
+                with gzip.GzipFile(fileobj=raw, mode='rb') as f:
+                    for record in f:
+                        entry = json.loads(record);
+                        if(entry['index'] == index):
+                            return entry['line'];
+                        if(entry['index'] > index):
+                            return None;
+        except FileNotFoundError:
+            return None;
+        return None;
+    
+    def __getitem__(self, index: int) -> str:
+        """Returns the line recorded under command `index`. Evicted entries are read back from the spill log; raises `IndexError` if gone.
+        """
+        if(self.entries and index >= self.entries[0][0]):
+            if(index < self.count):
+                return self.entries[index - self.entries[0][0]][1];
+        elif(0 <= index):
+            for position in range(len(self.pending)):
+                if(self.pending[position][0] == index):
+                    return self.pending[position][1];
+            line = self._spilledLine(index);
+            if(line is not None):
+                return line;
+        raise IndexError(f"No command recorded under index {index}");
+    
+    def last(self, n: int) -> list[tuple[int, str]]:
+        """Returns the `n` most recent entries, oldest first.
+        """
+        n = min(n, len(self.entries));
+        return [self.entries[-position] for position in range(n, 0, -1)];
+    
+    def search(self, prefix: str, before: int | None = None) -> tuple[int, str] | None:
+        """Reverse search: the most recent in-memory entry starting with `prefix` and older than command `before`
+        (pass the previous hit's index to step back through matches), or `None`.
+        """
+        for index, line in reversed(self.entries):
+            if(before is not None and index >= before):
+                continue;
+            if(line.startswith(prefix)):
+                return index, line;
+        return None;
+    
+    def searchAll(self, prefix: str, limit: int | None = None) -> list[tuple[int, str]]:
+        """Returns the in-memory entries starting with `prefix`, most recent first.
+        """
+        matches = [];
+        for index, line in reversed(self.entries):
+            if(line.startswith(prefix)):
+                matches.append((index, line));
+                if(limit is not None and len(matches) >= limit):
+                    break;
+        return matches;
+    
+    def __iter__(self) -> Iterator[tuple[int, str]]:
+        return iter(self.entries);
+    
+    def __len__(self) -> int:
+        return len(self.entries);
+    
+    def close(self) -> None:
+        self.flush();
+    
+    def __str__(self) -> str:
+        return f"History(size={len(self.entries)}, capacity={self.capacity}, count={self.count})";
+    
+    def __repr__(self) -> str:
+        return f"History(size={len(self.entries)}, capacity={self.capacity}, count={self.count}, spill={self.spill})";
+
 class UserParserIntefaceStatus(Enum):
     UPI__SUCCESS                = 0;
     UPI__ERR_INVALID_INPUT      = 1;
@@ -39,11 +233,12 @@ class UserParserIntefaceStatus(Enum):
 class UserParserInterface:
     """Acts as an interface for user input parsers.
     """
-    __slots__ = ['parser', 'history', 'status', 'message', 'index', 'stack'];
+    __slots__ = ['parser', 'history', 'status', 'message', 'index', 'stack', 'compiler'];
     
-    def __init__(self) -> None:
+    def __init__(self, history_capacity: int = HISTORY__CAPACITY, history_spill: str | None = None) -> None:
         self.parser = Parser([], [], [], [], []);
-        self.history = [];
+        self.compiler = None;
+        self.history = History(history_capacity, history_spill);
         self.stack = [];
         self.status = None;
         self.message = None;
@@ -60,16 +255,25 @@ class UserParserInterface:
         
     def setParser(self, tokens: list[str], delimiters: list[str], options: list[str], flags: list[str], commands: list[str]) -> None:
         self.parser = Parser(tokens, delimiters, options, flags, commands);
+    
+    def setQueryCompiler(self, compiler) -> None:
+        """Enables filter expressions (e.g. `queries.QueryCompiler()`). The compiler must provide `isFilter(token) -> bool`
+        and `compile(tokens)`; filter tokens of a `RETRIEVE` action are compiled into `action['plan']`.
+        """
+        self.compiler = compiler;
         
     def parse(self) -> str:
+        return self.parseLine(self.parser._getUserInput());
+    
+    def parseLine(self, line: str) -> str | dict[str, str]:
+        """Parses one command line without prompting. Returns the action, or the error message as `parse` does.
+        """
         try:
-            current_user_input = self.parser._getUserInput();
-            
-            if(not current_user_input):
+            if(not line):
                 raise ParserException("User input cannot be empty");
             else:
-                self.stack.append(current_user_input.split(self.parser.DELIMITERS[0]));
-                self.history.append((self.index, self.stack[-1]));
+                self.stack.append(line.split(self.parser.DELIMITERS[0]));
+                self.history.append(line);
                 self.index += 1;
                 
                 return self.buildAction(self.stack.pop());
@@ -77,10 +281,18 @@ class UserParserInterface:
             self.status  = UserParserIntefaceStatus.UPI__ERR_INVALID_INPUT;
             self.message = e.message;
             return self.message;
+    
+    def parseLines(self, lines: Iterable[str]) -> Iterator[str | dict[str, str]]:
+        """Lazily parses command lines from any iterable, e.g. an open file. Blank lines and lines starting with `#` are skipped.
+        """
+        for line in lines:
+            line = line.strip();
+            if(line and not line.startswith('#')):
+                yield self.parseLine(line);
         
     def parseOption(self, option: str) -> str:
         try:
-            if(option not in self.parser.OPTIONS):
+            if(option not in self.parser.OPTION_SET):
                 raise ParserException(f"Invalid option: {option}");
             else:
                 return option;
@@ -91,7 +303,7 @@ class UserParserInterface:
     
     def parseFlag(self, flag: str) -> str:
         try:
-            if(flag not in self.parser.FLAGS):
+            if(flag not in self.parser.FLAG_SET):
                 raise ParserException(f"Invalid flag: {flag}");
             else:
                 return flag;
@@ -102,7 +314,7 @@ class UserParserInterface:
     
     def parseCommand(self, command: str) -> str:
         try:
-            if(command not in self.parser.COMMANDS):
+            if(command not in self.parser.COMMAND_SET):
                 raise ParserException(f"Invalid command: {command}");
             else:
                 return command;
@@ -112,7 +324,9 @@ class UserParserInterface:
             return self.message;
     
     def getHistory(self) -> list[tuple[int, list[str]]]:
-        return self.history;
+        """Returns the in-memory history as `(index, tokens)` pairs; see `History` for indexed access and search.
+        """
+        return [(index, line.split(self.parser.DELIMITERS[0])) for index, line in self.history];
 
     def buildAction(self, parsed_input: list[str]) -> str | dict[str, str]:
         action = {
@@ -120,6 +334,7 @@ class UserParserInterface:
             'object': None,
             'options': [],
             'flags': [],
+            'filters': [],
             'command': None
         };
         
@@ -130,19 +345,27 @@ class UserParserInterface:
                 action['type'] = parsed_input[0];
                 action['object'] = parsed_input[1];
                 
-                if(action['type'] not in self.parser.TOKENS):
+                if(action['type'] not in self.parser.TOKEN_SET):
                     raise ParserException(f"InvalidInput::Invalid token: {action['type']} is not a valid ACTION TYPE token.");
-                elif(action['object'] not in self.parser.TOKENS):
+                elif(action['object'] not in self.parser.TOKEN_SET):
                     raise ParserException(f"InvalidInput::Invalid token: {action['object']} is not a valid ACTION OBJECT token.");
 
                 for token in parsed_input[2:]:
-                    if("--" in token):
+                    #   Filters first: a term such as `due<2024-05-01` would otherwise pass for a flag
+                    if(self.compiler is not None and self.compiler.isFilter(token)):
+                        action['filters'].append(token);
+                    elif("--" in token):
                         action['options'].append(token);
                     elif("-" in token):
                         action['flags'].append(token);
                     else:
                         action['command'] = token;
                 
+                if(action['filters']):
+                    if(action['command'] != 'RETRIEVE'):
+                        raise ParserException(f"InvalidInput::Filters are only valid with RETRIEVE, not {action['command']}.");
+                    action['plan'] = self.compiler.compile(action['filters']);
+                
                 self.parser.current_action = action;        
                 
         except ParserException as e:
@@ -157,7 +380,7 @@ class UserParserInterface:
     
 
 class Parser:
-    __slots__ = ['TOKENS', 'DELIMITERS', 'OPTIONS', 'FLAGS', 'COMMANDS', 'current_token', 'trace', 'current_action'];
+    __slots__ = ['TOKENS', 'DELIMITERS', 'OPTIONS', 'FLAGS', 'COMMANDS', 'TOKEN_SET', 'OPTION_SET', 'FLAG_SET', 'COMMAND_SET', 'current_token', 'trace', 'current_action'];
     
     def __init__(self, tokens: list[str], delimiters: list[str], options: list[str], flags: list[str], commands: list[str]):
         self.TOKENS = tokens;
@@ -165,9 +388,14 @@ class Parser:
         self.OPTIONS = options;
         self.FLAGS = flags;
         self.COMMANDS = commands;
+        #   Membership tests go through these; the lists keep their order for display
+        self.TOKEN_SET = frozenset(tokens);
+        self.OPTION_SET = frozenset(options);
+        self.FLAG_SET = frozenset(flags);
+        self.COMMAND_SET = frozenset(commands);
         self.current_token = None;
         self.current_action = None;
-        self.trace = [];
+        self.trace = deque(maxlen=PARSER__TRACE_SIZE);
         
     def __str__(self) -> str:
         return f"Parser(tokens={self.TOKENS}, delimiters={self.DELIMITERS}, options={self.OPTIONS}, flags={self.FLAGS}, commands={self.COMMANDS})";
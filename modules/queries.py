@@ -0,0 +1,300 @@
+"""
+Query language and planner for task dictionaries.
+
+A query is a list of terms, all of which must hold:
+
+    status=PENDING  priority>=HIGH  due<2024-05-01  tag:ops  limit:10  order:-priority
+
+- comparisons `field<op>value` with `=`, `!=`, `<`, `<=`, `>`, `>=` on `id`, `name`, `status`, `priority`, `due`, `created`, `updated`;
+  statuses and priorities compare by their code (`PENDING < IN_PROGRESS < ...`, `LOW < ... < URGENT`), dates as `YYYY-MM-DD`
+- `tag:<tag>` keeps the tasks carrying that tag
+- `text:<term>` keeps the tasks whose name, description or tags contain the word (`text:deploy*` for a prefix, `text:a|b` for either);
+  see `searchr`. Without an explicit order, results are ranked by relevance when a `SearchIndex` is given
+- `limit:<n>` and `order:<field>` (`order:-<field>` for descending) shape the result
+
+`compileQuery` turns the terms into a `QueryPlan`. Executed against a `TaskIndexr`, the plan lets the most selective index
+(id, status or priority buckets, due date range, or the inverted index of `searchr` for `text:` terms) produce the candidates; against any other iterable of task dictionaries
+(an `IterableShelve`, `jsonShelves.iterShelf`) it scans the stream. Ordered, limited results go through a bounded heap
+instead of sorting every match.
+"""
+
+import re;
+import heapq;
+import operator;
+from datetime import date;
+from itertools import islice;
+from parsers import ParserException;
+from tasks import TaskStatus, TaskPriority, TaskException, decodeTaskStatus, decodeTaskPriority;
+from indexr import TaskIndexr, taskKey, taskStatus, taskPriority, taskDueDate;
+from searchr import taskTokens, parseTerm, matchesTerm;
+
+
+class QueryException(ParserException):
+    def __repr__(self) -> str:
+        return f"QueryException(message={self.message})";
+
+
+QUERY__COMPARISON   = re.compile(r'^(?P<field>[a-z]+)(?P<op><=|>=|!=|=|<|>)(?P<value>.+)$');
+QUERY__DIRECTIVE    = re.compile(r'^(?P<field>tag|text|limit|order):(?P<value>.+)$');
+
+QUERY__OPERATORS = {
+    '=':    operator.eq,
+    '!=':   operator.ne,
+    '<':    operator.lt,
+    '<=':   operator.le,
+    '>':    operator.gt,
+    '>=':   operator.ge
+};
+
+def _decodeDate(value: str) -> str:
+    try:
+        date.fromisoformat(value);
+    except ValueError:
+        raise QueryException(f"InvalidQuery::{value} is not a YYYY-MM-DD date.");
+    return value;
+
+def _decodeEnum(decoder):
+    def decode(value: str) -> int:
+        try:
+            return decoder(value).value;
+        except TaskException as e:
+            raise QueryException(f"InvalidQuery::{e.message}");
+    return decode;
+
+def _decodeInt(value: str) -> int:
+    try:
+        return int(value);
+    except ValueError:
+        raise QueryException(f"InvalidQuery::{value} is not an integer.");
+
+def _taskField(name: str):
+    return lambda task_dict: task_dict['task'][name];
+
+#   Queryable fields: name -> (comparable value of a task dictionary, decoder of the query value)
+QUERY__FIELDS = {
+    'id':       (taskKey, _decodeInt),
+    'name':     (_taskField('name'), str),
+    'status':   (lambda task_dict: taskStatus(task_dict).value, _decodeEnum(decodeTaskStatus)),
+    'priority': (lambda task_dict: taskPriority(task_dict).value, _decodeEnum(decodeTaskPriority)),
+    'due':      (taskDueDate, _decodeDate),
+    'created':  (_taskField('created_at'), _decodeDate),
+    'updated':  (_taskField('updated_at'), _decodeDate)
+};
+
+def _taskTags(task_dict: dict) -> list:
+    tags = task_dict['task'].get('tags');
+    return tags if isinstance(tags, list) else [];
+
+
+class Condition:
+    """One `field<op>value` (or `tag:value`, `text:value`) term. A task whose field is `None` only matches `!=`.
+    """
+    __slots__ = ['field', 'op', 'value', 'text', 'accessor', 'compare'];
+
+    def __init__(self, field: str, op: str, value, text: str | None = None) -> None:
+        self.field      = field;
+        self.op         = op;
+        self.value      = value;
+        self.text       = str(value) if text is None else text;
+        if(field == 'tag'):
+            self.accessor   = _taskTags;
+            self.compare    = operator.contains;
+        elif(field == 'text'):
+            self.accessor   = lambda task_dict: set(taskTokens(task_dict));
+            self.compare    = matchesTerm;
+        else:
+            self.accessor   = QUERY__FIELDS[field][0];
+            self.compare    = QUERY__OPERATORS[op];
+
+    def test(self, task_dict: dict) -> bool:
+        value = self.accessor(task_dict);
+        if(value is None):
+            return self.op == '!=';
+        return self.compare(value, self.value);
+
+    def __str__(self) -> str:
+        return f"{self.field}:{self.text}" if self.op == ':' else f"{self.field}{self.op}{self.text}";
+
+    def __repr__(self) -> str:
+        return f"Condition(field={self.field}, op={self.op}, value={self.value})";
+
+
+def isFilterToken(token: str) -> bool:
+    """Tells whether `token` is a query term. Terms are recognized by shape and field name only; values are checked by `compileQuery`.
+    """
+    match = QUERY__COMPARISON.match(token);
+    if(match is not None):
+        return match.group('field') in QUERY__FIELDS;
+    return QUERY__DIRECTIVE.match(token) is not None;
+
+def compileQuery(terms: list[str] | str) -> 'QueryPlan':
+    """Compiles query terms (a list, or one string separated by spaces) into a `QueryPlan`. Raises `QueryException` on an invalid term.
+    """
+    if(isinstance(terms, str)):
+        terms = terms.split();
+
+    conditions  = [];
+    limit       = None;
+    order       = None;
+    descending  = False;
+    for term in terms:
+        directive = QUERY__DIRECTIVE.match(term);
+        if(directive is not None):
+            field, value = directive.group('field'), directive.group('value');
+            if(field == 'tag'):
+                conditions.append(Condition('tag', ':', value));
+            elif(field == 'text'):
+                alternatives = parseTerm(value);
+                if(not alternatives):
+                    raise QueryException(f"InvalidQuery::{term} has no word to search.");
+                conditions.append(Condition('text', ':', alternatives, value));
+            elif(field == 'limit'):
+                limit = _decodeInt(value);
+                if(limit < 0):
+                    raise QueryException("InvalidQuery::limit must not be negative.");
+            else:
+                descending  = value.startswith('-');
+                order       = value.lstrip('-');
+                if(order not in QUERY__FIELDS):
+                    raise QueryException(f"InvalidQuery::Cannot order by {order}.");
+            continue;
+
+        comparison = QUERY__COMPARISON.match(term);
+        if(comparison is None or comparison.group('field') not in QUERY__FIELDS):
+            raise QueryException(f"InvalidQuery::{term} is not a query term.");
+        field, text = comparison.group('field'), comparison.group('value');
+        conditions.append(Condition(field, comparison.group('op'), QUERY__FIELDS[field][1](text), text));
+
+    return QueryPlan(conditions, limit, order, descending);
+
+
+class QueryPlan:
+    """Compiled query. `execute(source)` returns the matching task dictionaries; `explain(source)` tells how they would be found.
+    """
+    __slots__ = ['conditions', 'limit', 'order', 'descending'];
+
+    def __init__(self, conditions: list[Condition], limit: int | None = None, order: str | None = None, descending: bool = False) -> None:
+        self.conditions = conditions;
+        self.limit      = limit;
+        self.order      = order;
+        self.descending = descending;
+
+    #   Planning
+    #   -------------------------------------------------------------------------------------------------------------------
+    def searches(self) -> list[Condition]:
+        return [condition for condition in self.conditions if condition.field == 'text'];
+
+    def _candidates(self, indexr: TaskIndexr, search=None) -> list[tuple]:
+        """Returns `(estimated size, description, producer)` for every condition an index of `indexr` (or the `SearchIndex` `search`) can answer.
+        """
+        candidates = [];
+        texts = self.searches();
+        if(search is not None and texts):
+            keys = search.match([search.tokensOf(condition.value) for condition in texts]);
+            description = ' '.join(str(condition) for condition in texts);
+            candidates.append((len(keys), f"search:{description}", lambda keys=keys: (indexr.ids[key] for key in keys if key in indexr.ids)));
+        for condition in self.conditions:
+            if(condition.field == 'id' and condition.op == '='):
+                entry = indexr.get(condition.value);
+                candidates.append((0 if entry is None else 1, f"index:{condition}", lambda entry=entry: [] if entry is None else [entry]));
+
+            elif(condition.field in ('status', 'priority')):
+                index   = indexr.status if condition.field == 'status' else indexr.priority;
+                members = [member for member in (TaskStatus if condition.field == 'status' else TaskPriority) if condition.compare(member.value, condition.value)];
+                size    = sum(index.count(member) for member in members);
+                candidates.append((size, f"index:{condition}", lambda index=index, members=members: (entry for member in members for entry in index.bucket(member).values())));
+
+            elif(condition.field == 'due' and condition.op != '!='):
+                low, high, inclusive = {
+                    '<':    (None, condition.value, False),
+                    '<=':   (None, condition.value, True),
+                    '>':    (condition.value, None, False),
+                    '>=':   (condition.value, None, False),
+                    '=':    (condition.value, condition.value, True)
+                }[condition.op];
+                size = indexr.due_date.count(low, high, inclusive);
+                candidates.append((size, f"index:{condition}", lambda low=low, high=high, inclusive=inclusive: (indexr.ids[key] for key in indexr.due_date.range(low, high, inclusive))));
+        return candidates;
+
+    def _plan(self, source, search=None) -> tuple:
+        """Returns `(description, entries)`: the chosen access path and the candidate entries it produces.
+        """
+        if(isinstance(source, TaskIndexr)):
+            candidates = self._candidates(source, search);
+            if(candidates):
+                size, description, producer = min(candidates, key=lambda candidate: candidate[0]);
+                if(size < len(source)):
+                    return f"{description} (~{size} of {len(source)})", producer();
+            return f"scan (~{len(source)})", source.ids.values();
+        return "scan (stream)", source;
+
+    #   Execution
+    #   -------------------------------------------------------------------------------------------------------------------
+    def matches(self, task_dict: dict) -> bool:
+        for condition in self.conditions:
+            if(not condition.test(task_dict)):
+                return False;
+        return True;
+
+    def execute(self, source, search=None) -> list[dict]:
+        """Runs the query on `source`: a `TaskIndexr` (indexed lookup when a condition fits, scan otherwise) or any iterable of task dictionaries.
+        Candidates from an index are re-checked against every condition, so the result never depends on the path taken.
+        `search`, the `SearchIndex` of the same tasks, answers `text:` terms and ranks their results when no order is given.
+        """
+        _, entries = self._plan(source, search);
+        matches = (task_dict for task_dict in entries if self.matches(task_dict));
+
+        if(self.order is None and search is not None and self.searches()):
+            matches = list(matches);
+            scores = search.score((taskKey(task_dict) for task_dict in matches), [search.tokensOf(condition.value) for condition in self.searches()]);
+            key = lambda task_dict: scores[taskKey(task_dict)];
+            if(self.limit is not None):
+                return heapq.nlargest(self.limit, matches, key=key);
+            return sorted(matches, key=key, reverse=True);
+
+        if(self.order is None):
+            return list(matches if self.limit is None else islice(matches, self.limit));
+
+        accessor = QUERY__FIELDS[self.order][0];
+        #   `None` values always sort last
+        if(self.descending):
+            key = lambda task_dict: ((value := accessor(task_dict)) is not None, value);
+            if(self.limit is not None):
+                return heapq.nlargest(self.limit, matches, key=key);
+            return sorted(matches, key=key, reverse=True);
+
+        key = lambda task_dict: ((value := accessor(task_dict)) is None, value);
+        if(self.limit is not None):
+            return heapq.nsmallest(self.limit, matches, key=key);
+        return sorted(matches, key=key);
+
+    def explain(self, source=None, search=None) -> str:
+        path = self._plan(source, search)[0] if source is not None else "unplanned";
+        terms = ' '.join(str(condition) for condition in self.conditions) or '*';
+        order = '' if self.order is None else f" order:{'-' if self.descending else ''}{self.order}";
+        limit = '' if self.limit is None else f" limit:{self.limit}";
+        return f"{terms}{order}{limit} via {path}";
+
+    def __str__(self) -> str:
+        return f"QueryPlan({self.explain()})";
+
+    def __repr__(self) -> str:
+        return f"QueryPlan(conditions={self.conditions}, limit={self.limit}, order={self.order}, descending={self.descending})";
+
+
+class QueryCompiler:
+    """Hook for `parsers.UserParserInterface.setQueryCompiler`: recognizes query terms and compiles them into a `QueryPlan`.
+    """
+    __slots__ = [];
+
+    def isFilter(self, token: str) -> bool:
+        return isFilterToken(token);
+
+    def compile(self, terms: list[str]) -> QueryPlan:
+        return compileQuery(terms);
+
+    def __str__(self) -> str:
+        return "QueryCompiler()";
+
+    def __repr__(self) -> str:
+        return "QueryCompiler()";
@@ -0,0 +1,219 @@
+"""
+Due-date scheduler over the tasks of a keyed `IterableShelve`.
+
+A `Scheduler` is a shelve listener (`add(key, entry)`, `discard(key, entry)`) keeping the schedulable tasks in a binary heap
+ordered by due date, then priority (URGENT first), then id. Tasks without a due date, and COMPLETED, CANCELED or DELETED ones,
+are not scheduled; a status change is an update, so they drop out (or come back) as the shelve changes.
+
+Deletions are lazy: `discard` only forgets the heap entry of the key, and stale entries are skipped when they reach the top
+(the heap is rebuilt once they outnumber the live ones). So `add` and `discard` are O(log N), and the queries walk the heap
+from the root and stop as soon as the bound is reached, O(k log k) for k results:
+    next(n)             the n tasks due first
+    due_within(delta)   the tasks due before now + delta (seconds or `timedelta`)
+    overdue()           the tasks due before now
+    wait_next()         blocks until the first task is due and takes it off the schedule; `wait_next_async` for asyncio
+
+Due dates are ISO dates or datetimes (`2024-04-28`, `2024-04-28T09:30`); dates are due at midnight, naive values are local time.
+"""
+
+import time;
+import heapq;
+import threading;
+from datetime import datetime, timedelta;
+from tasks import TaskStatus;
+from indexr import taskStatus, taskPriority, taskDueDate;
+
+SCHEDULER__UNSCHEDULED = frozenset({TaskStatus.COMPLETED, TaskStatus.CANCELED, TaskStatus.DELETED});
+
+
+def dueTimestamp(due_date: str | None) -> float | None:
+    """Returns the POSIX timestamp of an ISO due date, or `None` when the task has none (or it does not parse).
+    """
+    if(not due_date):
+        return None;
+    try:
+        return datetime.fromisoformat(due_date).timestamp();
+    except (TypeError, ValueError):
+        return None;
+
+def scheduleItem(key, entry: dict) -> list | None:
+    """`[due timestamp, -priority, key]`, the schedule order of a task, or `None` if the task is not scheduled.
+    """
+    if(taskStatus(entry) in SCHEDULER__UNSCHEDULED):
+        return None;
+    due = dueTimestamp(taskDueDate(entry));
+    if(due is None):
+        return None;
+    return [due, -taskPriority(entry).value, key];
+
+def _seconds(delta: float | timedelta) -> float:
+    return delta.total_seconds() if isinstance(delta, timedelta) else float(delta);
+
+
+class Scheduler:
+    """Heap-backed schedule of the pending tasks of a shelve. See the module docstring.
+    `clock` returns the current POSIX time; it is `time.time` unless replaced (e.g. in simulations).
+    """
+    __slots__ = ['heap', 'live', 'entries', 'lock', 'changed', 'waiters', 'clock'];
+
+    def __init__(self, clock=time.time) -> None:
+        self.heap       = [];
+        self.live       = {};
+        self.entries    = {};
+        self.lock       = threading.RLock();
+        self.changed    = threading.Condition(self.lock);
+        self.waiters    = set();
+        self.clock      = clock;
+
+    #   Listener protocol
+    #   -------------------------------------------------------------------------------------------------------------------
+    def add(self, key, entry: dict) -> None:
+        #   Heap items are lists so a stale item is told apart from the live one of the same key by identity
+        item = scheduleItem(key, entry);
+        if(item is None):
+            return;
+        with self.lock:
+            self.live[key]      = item;
+            self.entries[key]   = entry;
+            heapq.heappush(self.heap, item);
+            if(self.heap[0] is item):
+                self._notify();
+
+    def discard(self, key, entry: dict) -> None:
+        with self.lock:
+            if(self.live.pop(key, None) is None):
+                return;
+            del self.entries[key];
+            if(len(self.heap) > 2 * len(self.live) + 64):
+                self._rebuild();
+
+    def _rebuild(self) -> None:
+        self.heap = list(self.live.values());
+        heapq.heapify(self.heap);
+
+    def _notify(self) -> None:
+        self.changed.notify_all();
+        for waiter in list(self.waiters):
+            loop, event = waiter;
+            try:
+                loop.call_soon_threadsafe(event.set);
+            except RuntimeError:
+                #   The loop of this waiter was closed without it being cancelled: nobody is waiting any more
+                self.waiters.discard(waiter);
+
+    #   Queries
+    #   -------------------------------------------------------------------------------------------------------------------
+    def _top(self) -> list | None:
+        """Drops the stale items on top of the heap and returns the first live one.
+        """
+        heap = self.heap;
+        while(heap and self.live.get(heap[0][2]) is not heap[0]):
+            heapq.heappop(heap);
+        return heap[0] if heap else None;
+
+    def _walk(self, limit: int | None = None, before: float | None = None) -> list[dict]:
+        """Returns up to `limit` live entries due before `before`, in schedule order, without popping: a best-first search
+        over the heap positions, which only ever expands the children of the items it returns.
+        """
+        heap, live = self.heap, self.live;
+        results = [];
+        frontier = [(heap[0], 0)] if heap else [];
+        while(frontier and (limit is None or len(results) < limit)):
+            item, position = heapq.heappop(frontier);
+            if(before is not None and item[0] >= before):
+                break;
+            if(live.get(item[2]) is item):
+                results.append(self.entries[item[2]]);
+            for child in (2 * position + 1, 2 * position + 2):
+                if(child < len(heap)):
+                    heapq.heappush(frontier, (heap[child], child));
+        return results;
+
+    def next(self, n: int = 1) -> list[dict]:
+        """The `n` tasks due first, in schedule order.
+        """
+        with self.lock:
+            self._top();
+            return self._walk(limit=n);
+
+    def peek(self) -> dict | None:
+        with self.lock:
+            item = self._top();
+            return None if item is None else self.entries[item[2]];
+
+    def due_within(self, delta: float | timedelta) -> list[dict]:
+        """The tasks due before now + `delta`, in schedule order (overdue ones included).
+        """
+        with self.lock:
+            self._top();
+            return self._walk(before=self.clock() + _seconds(delta));
+
+    def overdue(self) -> list[dict]:
+        return self.due_within(0);
+
+    #   Waiting
+    #   -------------------------------------------------------------------------------------------------------------------
+    def _take(self) -> tuple[dict | None, float | None]:
+        """Takes the first task off the schedule if it is due; otherwise returns the seconds until it is (`None` if the schedule is empty).
+        """
+        item = self._top();
+        if(item is None):
+            return None, None;
+        delay = item[0] - self.clock();
+        if(delay > 0):
+            return None, delay;
+        heapq.heappop(self.heap);
+        del self.live[item[2]];
+        return self.entries.pop(item[2]), None;
+
+    def wait_next(self, timeout: float | None = None) -> dict | None:
+        """Blocks until the first task is due, takes it off the schedule and returns it; `None` after `timeout` seconds.
+        A task added with an earlier due date wakes the waiter. A taken task is scheduled again when the shelve updates it.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout;
+        with self.changed:
+            while(True):
+                entry, delay = self._take();
+                if(entry is not None):
+                    return entry;
+                remaining = None if deadline is None else deadline - time.monotonic();
+                if(remaining is not None and remaining <= 0):
+                    return None;
+                waits = [wait for wait in (delay, remaining) if wait is not None];
+                self.changed.wait(min(waits) if waits else None);
+
+    async def wait_next_async(self, timeout: float | None = None) -> dict | None:
+        """`wait_next` for asyncio: waits on the event loop instead of blocking a thread.
+        """
+        import asyncio;
+        loop = asyncio.get_running_loop();
+        deadline = None if timeout is None else loop.time() + timeout;
+        while(True):
+            event = asyncio.Event();
+            waiter = (loop, event);
+            with self.lock:
+                entry, delay = self._take();
+                if(entry is not None):
+                    return entry;
+                self.waiters.add(waiter);
+            try:
+                remaining = None if deadline is None else deadline - loop.time();
+                if(remaining is not None and remaining <= 0):
+                    return None;
+                waits = [wait for wait in (delay, remaining) if wait is not None];
+                try:
+                    await asyncio.wait_for(event.wait(), min(waits) if waits else None);
+                except asyncio.TimeoutError:
+                    pass;
+            finally:
+                with self.lock:
+                    self.waiters.discard(waiter);
+
+    def __len__(self) -> int:
+        return len(self.live);
+
+    def __str__(self) -> str:
+        return f"Scheduler(tasks={len(self.live)})";
+
+    def __repr__(self) -> str:
+        return f"Scheduler(tasks={len(self.live)}, heap={len(self.heap)}, waiters={len(self.waiters)})";
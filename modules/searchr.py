@@ -0,0 +1,241 @@
+"""
+Full-text search over task names, descriptions and tags.
+
+A `SearchIndex` is a shelve listener (`add(key, entry)`, `discard(key, entry)`) keeping an inverted index: every token
+(a lowercased word of the name, the description or a tag) maps to its posting list, the keys of the tasks containing it
+with the number of occurrences. Inserts and removals only touch the postings of the tokens of that task.
+
+A search is a list of terms; `word*` matches every token starting with `word`, found by bisection in the sorted vocabulary,
+and `a|b` matches either. Terms are combined with AND (every term must match) or OR (any), and results are ranked by tf-idf:
+each matched token scores `tf * log(1 + N / df)`, divided by the square root of the length of the task text.
+
+    index.search('deploy* prod|staging', limit=10)      ->  [(key, score), ...], best first
+
+The index can be saved next to the shelf (`<shelf>.search`) together with the signature of the shelf file,
+and is only loaded back while that file is unchanged. In queries (see `queries`), the term `text:<term>` searches.
+"""
+
+import re;
+import json;
+import os;
+from math import log, sqrt;
+from bisect import bisect_left;
+from heapq import nlargest, merge;
+
+SEARCH__TOKEN   = re.compile(r'\w+');
+SEARCH__SUFFIX  = '.search';
+SEARCH__VERSION = 1;
+SEARCH__PREFIX  = '*';
+SEARCH__OR      = '|';
+SEARCH__MERGE   = 4096;
+
+
+def tokenize(text) -> list[str]:
+    return SEARCH__TOKEN.findall(text.lower()) if isinstance(text, str) else [];
+
+def taskTokens(task_dict: dict) -> list[str]:
+    """The tokens of the name, description and tags of a task dictionary as produced by `FormattedTask.get()`.
+    """
+    task = task_dict['task'];
+    tokens = tokenize(task.get('name')) + tokenize(task.get('description'));
+    tags = task.get('tags');
+    if(isinstance(tags, list)):
+        for tag in tags:
+            tokens += tokenize(tag);
+    return tokens;
+
+def parseTerm(term: str) -> list[tuple[str, bool]]:
+    """`deploy*|prod` -> `[('deploy', True), ('prod', False)]`: the alternatives of a term, each a token and whether it is a prefix.
+    """
+    alternatives = [];
+    for alternative in term.split(SEARCH__OR):
+        prefix = alternative.endswith(SEARCH__PREFIX);
+        for token in tokenize(alternative.rstrip(SEARCH__PREFIX)):
+            alternatives.append((token, prefix));
+    return alternatives;
+
+def matchesTerm(tokens, alternatives: list[tuple[str, bool]]) -> bool:
+    """Tells whether a set of tokens matches a parsed term, without an index.
+    """
+    for token, prefix in alternatives:
+        if(token in tokens if not prefix else any(candidate.startswith(token) for candidate in tokens)):
+            return True;
+    return False;
+
+
+class SearchIndex:
+    """Inverted index of the task texts of a shelve. See the module docstring.
+    """
+    __slots__ = ['postings', 'lengths', 'vocabulary', 'pending', 'changed'];
+
+    def __init__(self) -> None:
+        self.postings   = {};
+        self.lengths    = {};
+        #   Sorted tokens for prefix search. New tokens wait in `pending` (searched as well) until `SEARCH__MERGE` of them
+        #   are merged in; removed tokens are skipped until the next merge
+        self.vocabulary = [];
+        self.pending    = set();
+        self.changed    = False;
+
+    #   Listener protocol
+    #   -------------------------------------------------------------------------------------------------------------------
+    def add(self, key, entry: dict) -> None:
+        tokens = taskTokens(entry);
+        postings = self.postings;
+        for token in tokens:
+            posting = postings.get(token);
+            if(posting is None):
+                posting = postings[token] = {};
+                self.pending.add(token);
+            posting[key] = posting.get(key, 0) + 1;
+        self.lengths[key] = len(tokens);
+        self.changed = True;
+
+    def discard(self, key, entry: dict) -> None:
+        if(self.lengths.pop(key, None) is None):
+            return;
+        postings = self.postings;
+        for token in set(taskTokens(entry)):
+            posting = postings.get(token);
+            if(posting is not None):
+                posting.pop(key, None);
+                if(not posting):
+                    del postings[token];
+        self.changed = True;
+
+    #   Lookup
+    #   -------------------------------------------------------------------------------------------------------------------
+    def _merge(self) -> None:
+        merged = [];
+        for token in merge(self.vocabulary, sorted(self.pending)):
+            if(token in self.postings and (not merged or merged[-1] != token)):
+                merged.append(token);
+        self.vocabulary = merged;
+        self.pending = set();
+
+    def expand(self, prefix: str) -> list[str]:
+        """The tokens starting with `prefix`.
+        """
+        if(len(self.pending) > SEARCH__MERGE or len(self.vocabulary) > 2 * len(self.postings) + SEARCH__MERGE):
+            self._merge();
+        tokens = set();
+        for vocabulary in (self.vocabulary, sorted(self.pending)):
+            for position in range(bisect_left(vocabulary, prefix), len(vocabulary)):
+                token = vocabulary[position];
+                if(not token.startswith(prefix)):
+                    break;
+                if(token in self.postings):
+                    tokens.add(token);
+        return sorted(tokens);
+
+    def tokensOf(self, alternatives: list[tuple[str, bool]]) -> list[str]:
+        tokens = [];
+        for token, prefix in alternatives:
+            tokens += self.expand(token) if prefix else ([token] if token in self.postings else []);
+        return tokens;
+
+    def lookup(self, alternatives: list[tuple[str, bool]]) -> set:
+        """The keys of the tasks matching a parsed term (see `parseTerm`).
+        """
+        keys = set();
+        for token in self.tokensOf(alternatives):
+            keys.update(self.postings[token]);
+        return keys;
+
+    def score(self, keys, terms: list[list[str]]) -> dict:
+        """tf-idf score of each of `keys`; `terms` holds the index tokens each query term matches (see `tokensOf`).
+        """
+        total = len(self.lengths) or 1;
+        scores = dict.fromkeys(keys, 0.0);
+        for tokens in terms:
+            for token in tokens:
+                posting = self.postings[token];
+                idf = log(1 + total / len(posting));
+                if(len(posting) < len(scores)):
+                    for key, tf in posting.items():
+                        if(key in scores):
+                            scores[key] += tf * idf;
+                else:
+                    for key in scores:
+                        tf = posting.get(key);
+                        if(tf):
+                            scores[key] += tf * idf;
+        lengths = self.lengths;
+        return {key: score / sqrt(lengths.get(key) or 1) for key, score in scores.items()};
+
+    def match(self, terms: list[list[str]], mode: str = 'and') -> set:
+        """The keys matching every (`'and'`) or any (`'or'`) of `terms`, each the index tokens a query term matches.
+        With AND, the rarest term gives the candidates and the others only filter them.
+        """
+        postings = self.postings;
+        if(mode == 'or'):
+            return {key for tokens in terms for token in tokens for key in postings[token]};
+
+        terms = sorted(terms, key=lambda tokens: sum(len(postings[token]) for token in tokens));
+        keys = {key for token in terms[0] for key in postings[token]};
+        for tokens in terms[1:]:
+            if(not keys):
+                break;
+            selected = [postings[token] for token in tokens];
+            keys = {key for key in keys if any(key in posting for posting in selected)};
+        return keys;
+
+    def search(self, query: str | list[str], mode: str = 'and', limit: int | None = None) -> list[tuple]:
+        """Ranked `(key, score)` pairs for the terms of `query` (a string separated by spaces, or a list), best first.
+        `mode` is `'and'` (every term matches) or `'or'` (any term matches).
+        """
+        if(isinstance(query, str)):
+            query = query.split();
+        terms = [self.tokensOf(alternatives) for alternatives in (parseTerm(term) for term in query) if alternatives];
+        if(not terms):
+            return [];
+
+        scores = self.score(self.match(terms, mode), terms);
+        if(limit is not None):
+            return nlargest(limit, scores.items(), key=lambda item: item[1]);
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True);
+
+    #   Persistence
+    #   -------------------------------------------------------------------------------------------------------------------
+    def save(self, filepath: str, signature) -> None:
+        """Writes the index to `filepath` atomically, with the signature of the shelf file it describes.
+        Posting lists are stored flat, `[key, tf, key, tf, ...]`.
+        """
+        tmp_filepath = f"{filepath}.tmp";
+        with open(tmp_filepath, 'w') as f:
+            json.dump({
+                'version':      SEARCH__VERSION,
+                'signature':    None if signature is None else list(signature),
+                'lengths':      [item for pair in self.lengths.items() for item in pair],
+                'postings':     {token: [item for pair in posting.items() for item in pair] for token, posting in self.postings.items()}
+            }, f);
+        os.replace(tmp_filepath, filepath);
+        self.changed = False;
+
+    @classmethod
+    def load(cls, filepath: str, signature) -> 'SearchIndex | None':
+        """Reads an index saved by `save`, or returns `None` if it is missing, of another version, or was saved for another state of the shelf file.
+        """
+        try:
+            with open(filepath, 'r') as f:
+                data = json.load(f);
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None;
+        if(data.get('version') != SEARCH__VERSION or signature is None or data.get('signature') != list(signature)):
+            return None;
+
+        index = cls();
+        lengths = data['lengths'];
+        index.lengths = dict(zip(lengths[::2], lengths[1::2]));
+        index.postings = {token: dict(zip(flat[::2], flat[1::2])) for token, flat in data['postings'].items()};
+        index.vocabulary = sorted(index.postings);
+        return index;
+
+    def __len__(self) -> int:
+        return len(self.lengths);
+
+    def __str__(self) -> str:
+        return f"SearchIndex(tasks={len(self.lengths)}, tokens={len(self.postings)})";
+
+    def __repr__(self) -> str:
+        return f"SearchIndex(tasks={len(self.lengths)}, tokens={len(self.postings)}, changed={self.changed})";
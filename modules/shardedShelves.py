@@ -0,0 +1,304 @@
+"""
+Sharded shelves.
+
+A `ShardedShelve` keeps one logical keyed shelve in N shard files next to a small manifest stored at `filepath`:
+
+    tasks_dict.json             {"format": "sharded", "version": 1, "partition": "hash", "shards": 8, "range_size": 100000, "files": [...], "counts": [...]}
+    tasks_dict.shard-000.json   plain shelf file (a list of entries)
+    ...
+
+A save writes each dirty shard to a new file named after the save generation (`tasks_dict.shard-000.3.json`) and replaces
+the manifest last, atomically: until then the manifest still names the previous files, so a crash leaves the old set or
+the new one, never a mix. The files it no longer names are removed afterwards.
+
+Entries are assigned to shards by key: `hash` spreads keys evenly (integer keys modulo N, other keys through blake2b),
+`range` puts consecutive blocks of `range_size` integer keys in the same shard (the last shard takes everything above).
+Shards are decoded in a process pool (JSON parsing is CPU-bound; serially on a single core) and written in a thread pool (I/O-bound);
+a save rewrites only the shards whose entries changed. The pool always starts its workers with `spawn`, on every platform, and adds
+this directory to their `sys.path` before any task reaches them. Shards are stored with the codec and layout of the shelve
+(see `jsonShelves.writeShelf`); the manifest records the codec. `queryShards` runs a `queries` query on every shard file in parallel
+without loading the shelve.
+
+A file at `filepath` that holds a regular shelf is split into shards on first open.
+"""
+
+import json;
+import os;
+import site;
+from hashlib import blake2b;
+from hashr import ShelfHasher;
+from jsonShelves import IterableShelve, DurabilityPolicy, ShelfException, loadShelf, writeShelf, writeShelfMeta, shelfMatches;
+from compressr import codecFor;
+
+SHARDS__FORMAT      = 'sharded';
+SHARDS__VERSION     = 1;
+SHARDS__PARTITIONS  = ('hash', 'range');
+SHARDS__DEFAULT     = 8;
+SHARDS__RANGE_SIZE  = 100_000;
+#   Start method of the worker processes; `fork` would copy the locks and threads of the parent
+SHARDS__START_METHOD= 'spawn';
+
+
+def shardIndex(key, shards: int, partition: str = 'hash', range_size: int = SHARDS__RANGE_SIZE) -> int:
+    """Returns the shard of `key`. Stable across processes and runs, unlike the built-in `hash` of strings.
+    """
+    if(partition == 'range'):
+        if(not isinstance(key, int)):
+            raise ShelfException(f"Range partitioning needs integer keys, got {key!r}.");
+        return min(max(key, 0) // range_size, shards - 1);
+    if(isinstance(key, int)):
+        return key % shards;
+    return int.from_bytes(blake2b(str(key).encode('utf-8'), digest_size=8).digest(), 'big') % shards;
+
+def _loadShard(filepath: str, codec: str | None = None) -> list:
+    try:
+        data = loadShelf(filepath, codec);
+    except FileNotFoundError:
+        return [];
+    return list(data.values()) if isinstance(data, dict) else data;
+
+def _queryShard(filepath: str, terms: list[str], codec: str | None = None) -> list:
+    from queries import compileQuery;
+    return compileQuery(terms).execute(_loadShard(filepath, codec));
+
+def _processPool(workers: int | None):
+    """A `ProcessPoolExecutor` whose workers can import this module, whatever `sys.path` the parent was given.
+    The initializer is a standard-library function, so the workers can unpickle it before this directory is on their path.
+    """
+    import multiprocessing;
+    from concurrent.futures import ProcessPoolExecutor;
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(SHARDS__START_METHOD), initializer=site.addsitedir, initargs=(os.path.dirname(os.path.abspath(__file__)),));
+
+def readManifest(filepath: str) -> dict | None:
+    """Returns the manifest stored at `filepath`, or `None` if the file is missing or is not a manifest.
+    """
+    try:
+        with open(filepath, 'r') as f:
+            manifest = json.load(f);
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None;
+    if(isinstance(manifest, dict) and manifest.get('format') == SHARDS__FORMAT):
+        return manifest;
+    return None;
+
+def shardFiles(filepath: str, manifest: dict) -> list[str]:
+    directory = os.path.dirname(filepath);
+    return [os.path.join(directory, name) for name in manifest['files']];
+
+def queryShards(filepath: str, terms: list[str] | str, workers: int | None = None) -> list[dict]:
+    """Runs a query (see `queries`) on every shard of the sharded shelve at `filepath`, one process per shard,
+    and merges the partial results; ordering and limit are applied again on the merged set.
+    """
+    from queries import compileQuery;
+    if(isinstance(terms, str)):
+        terms = terms.split();
+    manifest = readManifest(filepath);
+    if(manifest is None):
+        raise ShelfException(f"{filepath} is not a sharded shelve.");
+
+    plan = compileQuery(terms);
+    files = shardFiles(filepath, manifest);
+    codec = manifest.get('codec');
+    with _processPool(workers) as executor:
+        partials = list(executor.map(_queryShard, files, [terms] * len(files), [codec] * len(files)));
+    return plan.execute([entry for partial in partials for entry in partial]);
+
+
+class ShardedShelve(IterableShelve):
+    """A keyed `IterableShelve` stored across shard files. See the module docstring for the layout.
+    In memory it behaves as one shelve (listeners, batches, change tracking); `members` holds the entries of every shard by key
+    so a save serializes the dirty shards only. Journal mode is not available.
+    `codec` and `dedup` apply to the shard files, as they do to the file of an `IterableShelve`; the manifest stays plain JSON.
+    """
+    __slots__ = ['partition', 'shards', 'range_size', 'generation', 'names', 'members', 'dirty_shards', 'workers', 'processes'];
+
+    def __init__(self, filepath: str, key, shards: int = SHARDS__DEFAULT, partition: str = 'hash', range_size: int = SHARDS__RANGE_SIZE, track_changes: bool = False, workers: int | None = None, processes: bool | None = None, durability: DurabilityPolicy = DurabilityPolicy.IMMEDIATE, flush_ops: int = IterableShelve.DEFAULT__FLUSH_OPS, flush_ms: int = IterableShelve.DEFAULT__FLUSH_MS, codec: str | None = None, dedup: bool = False) -> None:
+        if(key is None):
+            raise ShelfException("A ShardedShelve must be keyed.");
+        if(partition not in SHARDS__PARTITIONS):
+            raise ShelfException(f"Unknown partition {partition}, expected one of {SHARDS__PARTITIONS}.");
+
+        #   Read by `_read`, which runs within `IterableShelve.__init__`
+        self.key                = key;
+        self.partition          = partition;
+        self.shards             = shards;
+        self.range_size         = range_size;
+        self.workers            = workers;
+        #   Results come back from the workers pickled, which only pays off when decoding runs on several cores
+        self.processes          = (os.cpu_count() or 1) > 1 if processes is None else processes;
+        super().__init__(filepath, key=key, track_changes=track_changes, durability=durability, flush_ops=flush_ops, flush_ms=flush_ms, codec=codec, dedup=dedup);
+
+    def _read(self) -> list:
+        """Loads the shards named by the manifest. A regular shelf file at `filepath` is split into shards and replaced by a manifest.
+        """
+        manifest = readManifest(self.filepath);
+        if(manifest is not None):
+            self.partition  = manifest['partition'];
+            self.shards     = manifest['shards'];
+            self.range_size = manifest['range_size'];
+            self.generation = manifest.get('generation', 0);
+            self.names      = list(manifest['files']);
+            self.codec      = codecFor(self.filepath, manifest.get('codec'));
+            data            = self._load(shardFiles(self.filepath, manifest));
+        else:
+            self.generation = 0;
+            self.names      = [self._shardName(shard) for shard in range(self.shards)];
+            try:
+                data        = _loadShard(self.filepath, self._codecName());
+            except json.JSONDecodeError:
+                print(f"JSONDecodeError: {self.filepath} is not a valid JSON file.");
+                data        = [];
+
+        self.members        = [{} for _ in range(self.shards)];
+        for object_dict in data:
+            object_key = self.key(object_dict);
+            self.members[self.shardOf(object_key)][object_key] = object_dict;
+        self.dirty_shards   = set();
+        if(manifest is None):
+            self.dirty_shards.update(range(self.shards));
+            self._writeShards(data);
+        return data;
+
+    #   Layout
+    #   -------------------------------------------------------------------------------------------------------------------
+    def shardOf(self, object_key) -> int:
+        return shardIndex(object_key, self.shards, self.partition, self.range_size);
+
+    def _shardName(self, shard: int, generation: int = 0) -> str:
+        root, extension = os.path.splitext(os.path.basename(self.filepath));
+        if(generation == 0):
+            return f"{root}.shard-{shard:03d}{extension or '.json'}";
+        return f"{root}.shard-{shard:03d}.{generation}{extension or '.json'}";
+
+    def _codecName(self) -> str | None:
+        return None if self.codec is None else self.codec.name;
+
+    def files(self) -> list[str]:
+        directory = os.path.dirname(self.filepath);
+        return [os.path.join(directory, name) for name in self.names];
+
+    def manifest(self) -> dict:
+        return {
+            'format':       SHARDS__FORMAT,
+            'version':      SHARDS__VERSION,
+            'partition':    self.partition,
+            'shards':       self.shards,
+            'range_size':   self.range_size,
+            'generation':   self.generation,
+            'codec':        self._codecName(),
+            'files':        list(self.names),
+            'counts':       [len(members) for members in self.members]
+        };
+
+    def _load(self, files: list[str]) -> list:
+        codec = self._codecName();
+        if(self.processes and len(files) > 1):
+            with _processPool(self.workers) as executor:
+                parts = list(executor.map(_loadShard, files, [codec] * len(files)));
+        else:
+            parts = [_loadShard(filepath, codec) for filepath in files];
+        return [object_dict for part in parts for object_dict in part];
+
+    def _writeShards(self, data: list | None = None) -> None:
+        """Writes the dirty shards to new files in a thread pool, then switches the manifest to them with a tmp file and
+        `os.replace`, and removes the files it replaced. If any write fails the manifest and the files it names are left untouched.
+        """
+        directory = os.path.dirname(self.filepath);
+        dirty = sorted(self.dirty_shards);
+        generation = self.generation + 1;
+        names = list(self.names);
+        for shard in dirty:
+            names[shard] = self._shardName(shard, generation);
+        from concurrent.futures import ThreadPoolExecutor;
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(lambda shard: writeShelf(os.path.join(directory, names[shard]), list(self.members[shard].values()), self._codecName(), self.dedup), dirty));
+
+        replaced = [self.names[shard] for shard in dirty];
+        self.generation, self.names = generation, names;
+        tmp_filepath = f"{self.filepath}.tmp";
+        with open(tmp_filepath, 'w') as f:
+            json.dump(self.manifest(), f);
+        os.replace(tmp_filepath, self.filepath);
+        for name in replaced:
+            try:
+                os.remove(os.path.join(directory, name));
+            except FileNotFoundError:
+                pass;
+        self.dirty_shards.clear();
+        if(self.meta is not None):
+            data = self.data if data is None else data;
+            writeShelfMeta(self.filepath, len(data), self.meta(data));
+
+    #   Mutations keep `members` and the dirty set in step with the entries
+    #   -------------------------------------------------------------------------------------------------------------------
+    def _insert(self, object_dict: dict) -> None:
+        super()._insert(object_dict);
+        object_key = self.key(object_dict);
+        shard = self.shardOf(object_key);
+        self.members[shard][object_key] = object_dict;
+        self.dirty_shards.add(shard);
+
+    def _remove(self, object_dict: dict) -> dict:
+        removed = super()._remove(object_dict);
+        object_key = self.key(removed);
+        shard = self.shardOf(object_key);
+        self.members[shard].pop(object_key, None);
+        self.dirty_shards.add(shard);
+        return removed;
+
+    def _update(self, object_dict: dict) -> None:
+        super()._update(object_dict);
+        object_key = self.key(object_dict);
+        shard = self.shardOf(object_key);
+        self.members[shard][object_key] = object_dict;
+        self.dirty_shards.add(shard);
+
+    #   Persistence
+    #   -------------------------------------------------------------------------------------------------------------------
+    def dirty(self) -> bool:
+        if(not self.dirty_shards):
+            return False;
+        return True if self.hasher is None else self.hasher.dirty();
+
+    def rescan(self) -> bool:
+        """`IterableShelve.rescan` shard by shard: only the shards whose file differs from their entries are marked dirty.
+        """
+        with self.lock:
+            if(self.hasher is not None and not self.hasher.dirty()):
+                files = self.files();
+                for shard, members in enumerate(self.members):
+                    if(not shelfMatches(files[shard], list(members.values()), self._codecName(), self.dedup)):
+                        self.dirty_shards.add(shard);
+                if(self.dirty_shards):
+                    self.hasher.invalidate();
+            return self.dirty();
+
+    def save(self) -> None:
+        """Writes the dirty shards and the manifest. As with `IterableShelve.save`, a failed write is reported and leaves
+        the changes pending for the next save; the files on disk stay as they were.
+        """
+        with self.lock:
+            if(not self.dirty()):
+                self.dirty_shards.clear();
+                return;
+            try:
+                self._writeShards();
+            except Exception as e:
+                print(f"Error: {e}");
+                return;
+            if(self.hasher is not None):
+                self.hasher.markSaved(self.filepath);
+
+    def compact(self) -> None:
+        return;
+
+    def close(self, rescan: bool = False) -> None:
+        if(rescan):
+            self.rescan();
+        self.flush();
+
+    def __str__(self) -> str:
+        return f"ShardedShelve(filepath={self.filepath}, shards={self.shards}, partition={self.partition})";
+
+    def __repr__(self) -> str:
+        return f"ShardedShelve(filepath={self.filepath}, shards={self.shards}, partition={self.partition}, range_size={self.range_size})";
@@ -0,0 +1,261 @@
+"""
+Multi-process safe shelves.
+
+A `SharedShelve` lets several processes work on the same shelf file. Every change is appended to the shared
+`<filepath>.journal` under an exclusive `lockr.FileLock`, after the process has caught up with the changes other
+processes appended before it, so no write is ever lost. Compaction rewrites the snapshot atomically (write then rename),
+truncates the journal in place and bumps the generation number stored in `<filepath>.version`.
+
+Readers catch up with `refresh()`: while the generation is unchanged only the new journal lines are read;
+after a compaction by another process the snapshot is reloaded.
+
+Updates and removals are optimistic: if another process changed the same entry since this process last saw it,
+the write is rejected with `ShelfConflict` (`SharedPolicy.REJECT`) or applied anyway (`SharedPolicy.OVERWRITE`).
+"""
+
+import json;
+import os;
+from enum import Enum;
+from hashr import hashRecord;
+from lockr import FileLock;
+from jsonShelves import IterableShelve, Journal, ShelfException, ShelfStatus, loadShelf;
+
+
+class ShelfConflict(ShelfException):
+    def __repr__(self) -> str:
+        return f"ShelfConflict(message={self.message})";
+
+class SharedPolicy(Enum):
+    REJECT      = 0;
+    OVERWRITE   = 1;
+
+
+class SharedShelve(IterableShelve):
+    """A keyed `IterableShelve` that can be shared between processes. See the module docstring for the protocol.
+    """
+    __slots__ = ['filelock', 'policy', 'generation', 'offset'];
+
+    def __init__(self, filepath: str, key, compact_threshold: int = IterableShelve.DEFAULT__COMPACT_THRESHOLD, policy: SharedPolicy = SharedPolicy.REJECT) -> None:
+        self.filelock   = FileLock(filepath);
+        self.policy     = policy;
+        self.offset     = 0;
+
+        with self.filelock.exclusive():
+            if(not os.path.exists(filepath)):
+                #   First process on this file: start from an empty snapshot
+                tmp_filepath = f"{filepath}.tmp";
+                with open(tmp_filepath, 'w') as f:
+                    f.write('[]');
+                os.replace(tmp_filepath, filepath);
+            super().__init__(filepath, False, compact_threshold, key);
+            self.generation = self._readGeneration();
+            self.journal = None;
+            self._openJournal();
+            self._tail();
+
+    #   Shared state on disk
+    #   -------------------------------------------------------------------------------------------------------------------
+    def _versionPath(self) -> str:
+        return f"{self.filepath}.version";
+
+    def _journalPath(self) -> str:
+        return f"{self.filepath}.journal";
+
+    def _readGeneration(self) -> int:
+        try:
+            with open(self._versionPath(), 'r') as f:
+                return json.load(f)['generation'];
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return 0;
+
+    def _writeGeneration(self, generation: int) -> None:
+        tmp_filepath = f"{self._versionPath()}.tmp";
+        with open(tmp_filepath, 'w') as f:
+            json.dump({'generation': generation}, f);
+        os.replace(tmp_filepath, self._versionPath());
+
+    def _openJournal(self) -> None:
+        self.journal = Journal(self._journalPath());
+
+    def _tail(self) -> None:
+        """Applies the complete journal lines appended since `offset`.
+        A record torn by a process that crashed mid-write is skipped (see `_decode`) instead of blocking every later refresh.
+        """
+        try:
+            with open(self._journalPath(), 'rb') as f:
+                f.seek(self.offset);
+                chunk = f.read();
+        except FileNotFoundError:
+            return;
+
+        end = chunk.rfind(b'\n') + 1;
+        for line in chunk[:end].splitlines():
+            if(line.strip()):
+                entry = self._decode(line);
+                if(entry is not None):
+                    self._apply(entry['op'], entry['data']);
+        self.offset += end;
+
+    def _decode(self, line: bytes) -> dict | None:
+        """Decodes a journal line, or returns `None` if it holds no readable record. The next process to append after a torn
+        write continues the same line, so a line that does not decode is read again from its last record start.
+        """
+        for start in (0, line.rfind(b'{"op": ')):
+            if(start < 0):
+                continue;
+            try:
+                entry = json.loads(line[start:]);
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue;
+            if(isinstance(entry, dict) and 'op' in entry and 'data' in entry):
+                if(start > 0):
+                    print(f"Skipped a torn record in {self._journalPath()}.");
+                return entry;
+        print(f"Skipped an unreadable record in {self._journalPath()}.");
+        return None;
+
+    def _reload(self) -> None:
+        """Replaces the in-memory entries with the current snapshot, keeping attached listeners consistent.
+        """
+        try:
+            data = loadShelf(self.filepath, None if self.codec is None else self.codec.name);
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = [];
+        if(isinstance(data, dict)):
+            data = list(data.values());
+
+        for listener in self.listeners:
+            for object_dict in self.data:
+                listener.discard(self.key(object_dict), object_dict);
+
+        self.data = data;
+        self._reindex();
+
+        for listener in self.listeners:
+            for object_dict in self.data:
+                listener.add(self.key(object_dict), object_dict);
+
+        self.offset = 0;
+
+    def refresh(self) -> None:
+        """Catches up with the changes written by other processes.
+        """
+        with self.filelock.sharedLock() if self.filelock.depth == 0 else self.filelock.exclusive():
+            with self.lock:
+                generation = self._readGeneration();
+                if(generation != self.generation):
+                    self._reload();
+                    self.generation = generation;
+                self._tail();
+
+    #   Writes
+    #   -------------------------------------------------------------------------------------------------------------------
+    def _stored(self, object_dict) -> bytes | None:
+        """Digest of the locally stored entry sharing the key of `object_dict`, or `None`.
+        """
+        try:
+            stored = self.get(self.key(object_dict));
+        except Exception:
+            return None;
+        return None if stored is None else hashRecord(stored);
+
+    def _mutate(self, op: str, entries) -> list[ShelfStatus]:
+        entries = list(entries);
+        with self.filelock.exclusive():
+            optimistic = op != 'insert' and self.policy == SharedPolicy.REJECT;
+            before = [self._stored(object_dict) for object_dict in entries] if optimistic else None;
+
+            self.refresh();
+
+            with self.lock:
+                statuses = self._validate(entries, op != 'insert');
+                if(optimistic):
+                    for position, object_dict in enumerate(entries):
+                        if(statuses[position] == ShelfStatus.SHELF_STATUS__SUCCESS and before[position] != self._stored(object_dict)):
+                            statuses[position] = ShelfStatus.SHELF_STATUS__ERR_CONFLICT;
+
+                accepted = [object_dict for object_dict, status in zip(entries, statuses) if status == ShelfStatus.SHELF_STATUS__SUCCESS];
+                apply = {'insert': self._insert, 'update': self._update, 'remove': self._remove}[op];
+                for object_dict in accepted:
+                    apply(object_dict);
+
+                if(accepted):
+                    self.journal.extend(op, accepted);
+                    self.offset = os.path.getsize(self._journalPath());
+
+            if(self.journal.count >= self.compact_threshold):
+                self.compact();
+
+        return statuses;
+
+    @staticmethod
+    def _raise(status: ShelfStatus, object_dict: dict) -> None:
+        if(status == ShelfStatus.SHELF_STATUS__ERR_CONFLICT):
+            raise ShelfConflict(f"Entry {object_dict} was changed by another process.");
+        if(status == ShelfStatus.SHELF_STATUS__ERR_MISSING_KEY):
+            raise KeyError(f"Entry {object_dict} is not stored.");
+        if(status != ShelfStatus.SHELF_STATUS__SUCCESS):
+            raise ShelfException(f"Entry {object_dict} was rejected: {status.name}.");
+
+    def insert(self, object_dict: dict) -> None:
+        self._raise(self._mutate('insert', [object_dict])[0], object_dict);
+
+    def update(self, object_dict: dict) -> None:
+        self._raise(self._mutate('update', [object_dict])[0], object_dict);
+
+    def remove(self, object_dict: dict) -> None:
+        self._raise(self._mutate('remove', [object_dict])[0], object_dict);
+
+    def pop(self, object_key) -> dict:
+        with self.filelock.exclusive():
+            self.refresh();
+            object_dict = self.get(object_key);
+            if(object_dict is None):
+                raise KeyError(object_key);
+            self.remove(object_dict);
+        return object_dict;
+
+    def insert_many(self, entries) -> list[ShelfStatus]:
+        return self._mutate('insert', entries);
+
+    def update_many(self, entries) -> list[ShelfStatus]:
+        return self._mutate('update', entries);
+
+    def remove_many(self, entries) -> list[ShelfStatus]:
+        return self._mutate('remove', entries);
+
+    #   Compaction
+    #   -------------------------------------------------------------------------------------------------------------------
+    def dirty(self) -> bool:
+        return os.path.exists(self._journalPath()) and os.path.getsize(self._journalPath()) > 0;
+
+    def save(self) -> None:
+        self.compact();
+
+    def compact(self) -> None:
+        """Folds the shared journal into the snapshot. The journal is truncated in place so that the append handles
+        other processes hold on it stay valid; the generation bump tells them to reload the snapshot.
+        Both only happen once the snapshot is written: otherwise the journal is left untouched and `ShelfException` is raised.
+        """
+        with self.filelock.exclusive():
+            self.refresh();
+            with self.lock:
+                if(not self.dirty()):
+                    return;
+                if(not self._write(self.data)):
+                    raise ShelfException(f"Cannot write the snapshot of {self.filepath}; the journal was kept.");
+                self.generation += 1;
+                self._writeGeneration(self.generation);
+                open(self._journalPath(), 'w').close();
+                self.journal.count  = 0;
+                self.offset         = 0;
+
+    def close(self) -> None:
+        self.compact();
+        self.journal.close();
+
+    def __str__(self) -> str:
+        return f"SharedShelve(filepath={self.filepath}, generation={self.generation})";
+
+    def __repr__(self) -> str:
+        return f"SharedShelve(filepath={self.filepath}, generation={self.generation})";
@@ -0,0 +1,311 @@
+"""
+Compact, column-oriented in-memory storage for large task sets.
+
+A `TaskTable` keeps one typed column per task field instead of one object per task:
+ids in an `array('q')`, status and priority codes in `bytearray`s, dates as ordinals in `array('i')`
+and names, descriptions, tags and format profiles as indices into interned `StringPool`s.
+The form status and priority were stored in (`TaskStatus.PENDING`, `PENDING` or the integer code) is kept per row,
+so `record` gives back the dictionary it was built from.
+"""
+
+from array import array;
+from datetime import date;
+from tasks import Task, TaskStatus, TaskPriority, TASK_STATUS__DECODE, TASK_PRIORITY__DECODE, TASK_STATUS__BY_INT, TASK_PRIORITY__BY_INT;
+from jsonShelves import IterableShelve, ShelfException, iterShelf, writeShelf;
+
+
+#   Enum <-> code lookup tables, derived from the `tasks` decode tables so every stored encoding is accepted
+STATUS_CODES    = {encoded: status.value for encoded, status in TASK_STATUS__DECODE.items()};
+PRIORITY_CODES  = {encoded: priority.value for encoded, priority in TASK_PRIORITY__DECODE.items()};
+STATUS_BY_CODE  = TASK_STATUS__BY_INT;
+PRIORITY_BY_CODE= TASK_PRIORITY__BY_INT;
+
+#   Stored forms of an enum field, see `TaskTable.forms`: `str(member)`, the integer code, the member name
+FORM__STORED    = 0;
+FORM__CODE      = 1;
+FORM__NAME      = 2;
+
+def enumForm(value) -> int:
+    if(isinstance(value, int)):
+        return FORM__CODE;
+    if(isinstance(value, str) and '.' not in value):
+        return FORM__NAME;
+    return FORM__STORED;
+
+def enumValue(member, form: int):
+    if(form == FORM__CODE):
+        return member.value;
+    if(form == FORM__NAME):
+        return member.name;
+    return str(member);
+
+#   Date column sentinel: 0 is `None`, positive values are `date` ordinals, negative values index the raw string pool
+DATE__NONE = 0;
+
+OPEN_STATUSES = (TaskStatus.PENDING, TaskStatus.IN_PROGRESS);
+
+
+class StringPool:
+    """Interns values so every distinct one is stored once and referenced by its index.
+    """
+    __slots__ = ['values', 'indices'];
+
+    def __init__(self) -> None:
+        self.values     = [];
+        self.indices    = {};
+
+    def intern(self, value) -> int:
+        index = self.indices.get(value);
+        if(index is None):
+            index = len(self.values);
+            self.values.append(value);
+            self.indices[value] = index;
+        return index;
+
+    def __getitem__(self, index: int):
+        return self.values[index];
+
+    def __len__(self) -> int:
+        return len(self.values);
+
+    def __str__(self) -> str:
+        return f"StringPool(size={len(self.values)})";
+
+    def __repr__(self) -> str:
+        return f"StringPool(size={len(self.values)})";
+
+
+class TaskTable:
+    """Column store for task dictionaries as produced by `FormattedTask.get()`.
+    Rows are appended with `append`/`extend`; `task(row)` builds a `Task` view on demand and `record(row)` rebuilds the original dictionary.
+    """
+    __slots__ = ['ids', 'status', 'priority', 'forms', 'due_date', 'created_at', 'updated_at', 'names', 'descriptions', 'tags', 'formats', 'strings', 'tagsets', 'profiles', 'rows'];
+
+    def __init__(self) -> None:
+        self.ids            = array('q');
+        self.status         = bytearray();
+        self.priority       = bytearray();
+        #   Stored form of the status (low 2 bits) and of the priority (next 2 bits)
+        self.forms          = bytearray();
+        self.due_date       = array('i');
+        self.created_at     = array('i');
+        self.updated_at     = array('i');
+        self.names          = array('I');
+        self.descriptions   = array('I');
+        self.tags           = array('i');
+        self.formats        = array('I');
+        self.strings        = StringPool();
+        self.tagsets        = StringPool();
+        self.profiles       = StringPool();
+        self.rows           = {};
+
+    @classmethod
+    def fromRecords(cls, records) -> 'TaskTable':
+        table = cls();
+        table.extend(records);
+        return table;
+
+    @classmethod
+    def fromShelve(cls, shelve: IterableShelve) -> 'TaskTable':
+        return cls.fromRecords(shelve.data);
+
+    @classmethod
+    def fromFile(cls, filepath: str) -> 'TaskTable':
+        """Builds a table straight from a shelf file through `iterShelf`, without materializing the JSON list first.
+        """
+        return cls.fromRecords(iterShelf(filepath));
+
+    def _encodeDate(self, value: str | None) -> int:
+        if(value is None):
+            return DATE__NONE;
+        try:
+            parsed = date.fromisoformat(value);
+            if(parsed.isoformat() == value):
+                return parsed.toordinal();
+        except (ValueError, TypeError):
+            pass;
+        #   Anything that does not round-trip through `date.isoformat` is kept verbatim
+        return -1 - self.strings.intern(value);
+
+    def _decodeDate(self, value: int) -> str | None:
+        if(value == DATE__NONE):
+            return None;
+        if(value < 0):
+            return self.strings[-1 - value];
+        return date.fromordinal(value).isoformat();
+
+    def _encodeTags(self, tags) -> int:
+        if(tags is None):
+            return -1;
+        if(isinstance(tags, list)):
+            tags = tuple(tags);
+        return self.tagsets.intern(tags);
+
+    def _decodeTags(self, index: int):
+        if(index < 0):
+            return None;
+        tags = self.tagsets[index];
+        return list(tags) if isinstance(tags, tuple) else tags;
+
+    def append(self, record: dict) -> int:
+        """Appends one task dictionary and returns its row number. Raises `ShelfException` if a row has the same id, as a keyed shelve does.
+        """
+        task = record['task'];
+        row = len(self.ids);
+        if(task['id'] in self.rows):
+            raise ShelfException(f"Duplicate key {task['id']} in the table.");
+
+        self.ids.append(task['id']);
+        self.status.append(STATUS_CODES[task['status']]);
+        self.priority.append(PRIORITY_CODES[task['priority']]);
+        self.forms.append(enumForm(task['status']) | enumForm(task['priority']) << 2);
+        self.due_date.append(self._encodeDate(task['due_date']));
+        self.created_at.append(self._encodeDate(task['created_at']));
+        self.updated_at.append(self._encodeDate(task['updated_at']));
+        self.names.append(self.strings.intern(task['name']));
+        self.descriptions.append(self.strings.intern(task['description']));
+        self.tags.append(self._encodeTags(task['tags']));
+        self.formats.append(self.profiles.intern(tuple(record['format'].items()) if 'format' in record else ()));
+        self.rows[task['id']] = row;
+
+        return row;
+
+    def extend(self, records) -> None:
+        for record in records:
+            self.append(record);
+
+    def task(self, row: int) -> Task:
+        """Builds a `Task` view of `row`. The fields were validated on the way in, so `Task.__init__` is bypassed.
+        """
+        task = Task.__new__(Task);
+        task.id             = self.ids[row];
+        task.name           = self.strings[self.names[row]];
+        task.description    = self.strings[self.descriptions[row]];
+        task.status         = STATUS_BY_CODE[self.status[row]];
+        task.priority       = PRIORITY_BY_CODE[self.priority[row]];
+        task.due_date       = self._decodeDate(self.due_date[row]);
+        task.created_at     = self._decodeDate(self.created_at[row]);
+        task.updated_at     = self._decodeDate(self.updated_at[row]);
+        task.tags           = self._decodeTags(self.tags[row]);
+        return task;
+
+    def get(self, id: int) -> Task | None:
+        row = self.rows.get(id);
+        return None if row is None else self.task(row);
+
+    def record(self, row: int) -> dict:
+        """Rebuilds the `FormattedTask.get()` dictionary stored at `row`, status and priority in the form they were stored in.
+        """
+        forms = self.forms[row];
+        record = {
+            'format': dict(self.profiles[self.formats[row]]),
+            'task': {
+                'id':           self.ids[row],
+                'name':         self.strings[self.names[row]],
+                'description':  self.strings[self.descriptions[row]],
+                'status':       enumValue(STATUS_BY_CODE[self.status[row]], forms & 3),
+                'priority':     enumValue(PRIORITY_BY_CODE[self.priority[row]], forms >> 2),
+                'due_date':     self._decodeDate(self.due_date[row]),
+                'created_at':   self._decodeDate(self.created_at[row]),
+                'updated_at':   self._decodeDate(self.updated_at[row]),
+                'tags':         self._decodeTags(self.tags[row])
+            }
+        };
+        if(not record['format']):
+            del record['format'];
+        return record;
+
+    def records(self):
+        for row in range(len(self.ids)):
+            yield self.record(row);
+
+    def toShelve(self, shelve: IterableShelve) -> None:
+        """Replaces the content of `shelve` with the rows of the table and saves it.
+        A keyed shelve is brought to the table with `remove_many`, `update_many` and `insert_many`, so its listeners
+        (indexes, change tracking) follow and a shared shelve journals the changes.
+        """
+        records = list(self.records());
+        if(shelve.key is None):
+            with shelve.lock:
+                shelve.data = records;
+                shelve.flush();
+            return;
+
+        keys        = {shelve.key(record) for record in records};
+        removed     = [object_dict for object_dict in shelve.data if shelve.key(object_dict) not in keys];
+        updated     = [record for record in records if shelve.key(record) in shelve];
+        inserted    = [record for record in records if shelve.key(record) not in shelve];
+        for apply, entries in ((shelve.remove_many, removed), (shelve.update_many, updated), (shelve.insert_many, inserted)):
+            if(entries):
+                apply(entries);
+        shelve.flush();
+
+    def save(self, filepath: str) -> int:
+        """Writes the table as an `IterableShelve` file, streaming one record at a time.
+        """
+        return writeShelf(filepath, self.records());
+
+    #   Column scans
+    #   -------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _find(column: bytearray, code: int) -> list[int]:
+        rows = [];
+        needle = bytes((code,));
+        position = column.find(needle);
+        while(position != -1):
+            rows.append(position);
+            position = column.find(needle, position + 1);
+        return rows;
+
+    def filter(self, status: TaskStatus | None = None, priority: TaskPriority | None = None) -> list[int]:
+        """Returns the rows matching `status` and `priority`. Each column is searched with `bytearray.find`, so only matching rows reach Python code.
+        """
+        if(status is None and priority is None):
+            return list(range(len(self.ids)));
+        if(priority is None):
+            return self._find(self.status, status.value);
+        if(status is None):
+            return self._find(self.priority, priority.value);
+
+        #   Scan the rarer column and check the other one per hit
+        if(self.status.count(status.value) <= self.priority.count(priority.value)):
+            column, code = self.priority, priority.value;
+            rows = self._find(self.status, status.value);
+        else:
+            column, code = self.status, status.value;
+            rows = self._find(self.priority, priority.value);
+        return [row for row in rows if column[row] == code];
+
+    def countByStatus(self) -> dict[TaskStatus, int]:
+        return {status: self.status.count(status.value) for status in TaskStatus};
+
+    def countByPriority(self) -> dict[TaskPriority, int]:
+        return {priority: self.priority.count(priority.value) for priority in TaskPriority};
+
+    def overdue(self, today: date | None = None) -> list[int]:
+        """Returns the rows of PENDING or IN_PROGRESS tasks whose due date is before `today`.
+        """
+        today = (today or date.today()).toordinal();
+        rows = [];
+        for status in OPEN_STATUSES:
+            rows.extend(self._find(self.status, status.value));
+        rows.sort();
+
+        due_date = self.due_date;
+        return [row for row in rows if 0 < due_date[row] < today];
+
+    def countOverdue(self, today: date | None = None) -> int:
+        return len(self.overdue(today));
+
+    def __len__(self) -> int:
+        return len(self.ids);
+
+    def __iter__(self):
+        for row in range(len(self.ids)):
+            yield self.task(row);
+
+    def __str__(self) -> str:
+        return f"TaskTable(rows={len(self.ids)}, strings={len(self.strings)})";
+
+    def __repr__(self) -> str:
+        return f"TaskTable(rows={len(self.ids)}, strings={len(self.strings)})";
@@ -7,10 +7,10 @@ nrdc
 v0.1.0
 """
 
-from collections import namedtuple;
+from collections import namedtuple, OrderedDict;
 from enum import Enum;
-from dataclasses import dataclass;
 from datetime import datetime;
+from typing import Callable, Iterable, Iterator;
 from parsers import Parser, ParserException, UserParserInterface, UserParserIntefaceStatus;
 
 class TaskException(Exception):
@@ -38,13 +38,10 @@ def getIntFromTaskStatus(status: TaskStatus) -> int:
     return status.value;
 
 def getTaskStatusFromInt(integer: int) -> TaskStatus:
-    statuses = list(TaskStatus);
-    
-    for status in statuses:
-        if(integer == status.value):
-            return status;
-    
-    raise TaskException(f"{integer} is not a valid `TaskStatus` (integer) value.");
+    status = TASK_STATUS__BY_INT.get(integer);
+    if(status is None):
+        raise TaskException(f"{integer} is not a valid `TaskStatus` (integer) value.");
+    return status;
 
 def tsGet(status: TaskStatus) -> str:
     """Returns a string for the name of the `TaskStatus` value.
@@ -70,12 +67,7 @@ def getIntFromTaskPriority(priority: TaskPriority) -> int:
     return priority.value;
 
 def getTaskPriorityFromInt(integer: int) -> TaskPriority:
-    priorities = list(TaskPriority);
-    
-    for priority in priorities:
-        if(integer == priority):
-            return priority;
-    return TaskPriority.URGENT;
+    return TASK_PRIORITY__BY_INT.get(integer, TaskPriority.URGENT);
 
 def tpGet(priority: TaskPriority) -> str:
     return priority.name;
@@ -83,6 +75,72 @@ def tpGet(priority: TaskPriority) -> str:
 def tpSet(priority_str: str) -> TaskPriority:
     return TaskPriority[priority_str];
 
+#   Enum decoding tables, built once. The integer codes are the compact on-disk encoding (`FormattedTask.get(compact=True)`);
+#   the decode tables accept every encoding found in task files: the member itself, its stored form (`TaskStatus.PENDING`),
+#   its name (`PENDING`) and its integer code (`1`)
+TASK_STATUS__BY_INT     = {status.value: status for status in TaskStatus};
+TASK_PRIORITY__BY_INT   = {priority.value: priority for priority in TaskPriority};
+
+TASK_STATUS__DECODE     = {
+    **TASK_STATUS__BY_INT,
+    **{status: status for status in TaskStatus},
+    **{str(status): status for status in TaskStatus},
+    **{status.name: status for status in TaskStatus}
+};
+TASK_PRIORITY__DECODE   = {
+    **TASK_PRIORITY__BY_INT,
+    **{priority: priority for priority in TaskPriority},
+    **{str(priority): priority for priority in TaskPriority},
+    **{priority.name: priority for priority in TaskPriority}
+};
+
+def decodeTaskStatus(status) -> TaskStatus:
+    try:
+        return TASK_STATUS__DECODE[status];
+    except (KeyError, TypeError):
+        raise TaskException(f"{status} is not a valid `TaskStatus` value.");
+
+def decodeTaskPriority(priority) -> TaskPriority:
+    try:
+        return TASK_PRIORITY__DECODE[priority];
+    except (KeyError, TypeError):
+        raise TaskException(f"{priority} is not a valid `TaskPriority` value.");
+
+#   Accepted value types per task record field, checked once per batch by `validateTaskRecords`
+TASK__RECORD_TYPES = {
+    'id':           {int},
+    'name':         {str},
+    'description':  {str},
+    'due_date':     {str, type(None)},
+    'created_at':   {str, type(None)},
+    'updated_at':   {str, type(None)},
+    'tags':         {list, type(None)}
+};
+
+def validateTaskRecords(records: list[dict]) -> None:
+    """Checks a whole batch of flat task dictionaries column by column, raising `TaskException` on the first bad field.
+    Performs the same checks as `Task.__init__`, but per field rather than per object.
+    """
+    for field, types in TASK__RECORD_TYPES.items():
+        try:
+            column = [record[field] for record in records];
+        except KeyError:
+            raise TaskException(f"Task record is missing the `{field}` field");
+        if(field == 'tags'):
+            column = [value for value in column if value != 'None'];
+        if(not set(map(type, column)) <= types):
+            raise TaskException(f"Task {field} must be one of {sorted(t.__name__ for t in types)}");
+
+    for field, table in (('status', TASK_STATUS__DECODE), ('priority', TASK_PRIORITY__DECODE)):
+        try:
+            unknown = {record[field] for record in records} - table.keys();
+        except KeyError:
+            raise TaskException(f"Task record is missing the `{field}` field");
+        except TypeError:
+            unknown = {'(unhashable value)'};
+        if(unknown):
+            raise TaskException(f"Invalid task {field} value(s): {sorted(map(str, unknown))}");
+
 class Task:
     __slots__ = ['id', 'name', 'description', 'status', 'priority', 'due_date', 'created_at', 'updated_at', 'tags'];
     
@@ -94,15 +152,9 @@ class Task:
         if(not isinstance(description, str)):
             raise TaskException("Task description must be a string");
         if(not isinstance(status, TaskStatus)):
-            try:
-                status = tsSet(status.split(".")[1]);
-            except Exception as e:
-                raise e;
+            status = decodeTaskStatus(status);
         if(not isinstance(priority, TaskPriority)):
-            try:
-                priority = tpSet(priority.split(".")[1]);
-            except Exception as e:
-                raise e;
+            priority = decodeTaskPriority(priority);
         if(not isinstance(due_date, str) and due_date is not None):
             raise TaskException("Task due date must be a string or None");
         if(not isinstance(created_at, str) and created_at is not None):
@@ -122,6 +174,35 @@ class Task:
         self.updated_at = updated_at;
         self.tags = tags;
     
+    @classmethod
+    def from_records(cls, records: Iterable[dict], trusted: bool = False) -> list['Task']:
+        """Builds many tasks at once from flat task dictionaries (the ones `setTaskFromDict` takes).
+        The batch is validated once with `validateTaskRecords`, or not at all when `trusted` (e.g. records this library wrote itself);
+        objects are then filled in directly, bypassing `__init__`, with enums decoded through the lookup tables.
+        """
+        records = records if isinstance(records, list) else list(records);
+        if(not trusted):
+            validateTaskRecords(records);
+        
+        new = cls.__new__;
+        status_of = TASK_STATUS__DECODE.__getitem__;
+        priority_of = TASK_PRIORITY__DECODE.__getitem__;
+        tasks = [];
+        append = tasks.append;
+        for record in records:
+            task = new(cls);
+            task.id = record['id'];
+            task.name = record['name'];
+            task.description = record['description'];
+            task.status = status_of(record['status']);
+            task.priority = priority_of(record['priority']);
+            task.due_date = record['due_date'];
+            task.created_at = record['created_at'];
+            task.updated_at = record['updated_at'];
+            task.tags = record['tags'];
+            append(task);
+        return tasks;
+    
     def getTaskStatusString(self) -> str:
         return {
             TaskStatus.PENDING: '- [ ]',
@@ -172,83 +253,147 @@ class Task:
     def __tuple__(self) -> namedtuple:
         return namedtuple('Task', ['id', 'name', 'description', 'status', 'priority', 'due_date', 'created_at', 'updated_at'])(self.id, self.name, self.description, self.status, self.priority, self.due_date, self.created_at, self.updated_at);
 
+class FormatProfile(namedtuple('FormatProfile', ['nameWidth', 'descriptionWidth', 'showTags', 'showCreated', 'showUpdated'])):
+    """Immutable formatting options for `FormattedTask` rendering. Profiles are shared: use `getFormatProfile` to obtain one.
+    """
+    __slots__ = ();
+    
+    def asDict(self) -> dict:
+        return {
+            'nameWidth': self.nameWidth,
+            'descriptionWidth': self.descriptionWidth,
+            'showTags': self.showTags,
+            'showCreated': self.showCreated,
+            'showUpdated': self.showUpdated
+        };
+
+#   Interned profiles, so tasks formatted the same way point to one object
+FORMAT_PROFILES: dict[tuple, FormatProfile] = {};
+
+def getFormatProfile(nameWidth: int, descriptionWidth: int, showTags: bool, showCreated: bool, showUpdated: bool) -> FormatProfile:
+    if(not isinstance(nameWidth, int)):
+        raise TaskException("Task name width must be an integer");
+    if(not isinstance(descriptionWidth, int)):
+        raise TaskException("Task description width must be an integer");
+    if(not isinstance(showTags, bool)):
+        raise TaskException("Task show tags must be a boolean");
+    if(not isinstance(showCreated, bool)):
+        raise TaskException("Task show created date must be a boolean");
+    if(not isinstance(showUpdated, bool)):
+        raise TaskException("Task show updated date must be a boolean");
+    
+    key = (nameWidth, descriptionWidth, showTags, showCreated, showUpdated);
+    profile = FORMAT_PROFILES.get(key);
+    if(profile is None):
+        profile = FORMAT_PROFILES[key] = FormatProfile(*key);
+    return profile;
+
+DEFAULT_FORMAT_PROFILE = getFormatProfile(4, 10, True, True, True);
+
+#   Rendered lines keyed by (task content, profile, widths), least recently used first
+RENDER_CACHE: OrderedDict = OrderedDict();
+RENDER_CACHE_SIZE = 8192;
+
+FT__STATUS_STRINGS = {
+    TaskStatus.PENDING: '- [ ]',
+    TaskStatus.IN_PROGRESS: '- [_]',
+    TaskStatus.COMPLETED: '- [x]',
+    TaskStatus.CANCELED: '- [c]',
+    TaskStatus.DELETED: '- [d]'
+};
+
+FT__PRIORITY_STRINGS = {
+    TaskPriority.LOW: f"{'(!)':<8}",
+    TaskPriority.MEDIUM: f"{'(!!)':<8}",
+    TaskPriority.HIGH: f"{'(!!!)':<8}",
+    TaskPriority.URGENT: f"{'(_!!!!_)':<8}"
+};
+
 class FormattedTask(Task):
     """Coerces format into `Task` objects for printing.
+    The task fields are kept as they are; padding and column selection happen only when the task is rendered,
+    following its shared `FormatProfile`. Rendered lines are memoized in `RENDER_CACHE`.
     """
+    #   Instances built by `from_records` share the class-level default until `set` is called
+    profile = DEFAULT_FORMAT_PROFILE;
+    
     def __init__(self, id: int, name: str, description: str, status: TaskStatus, priority: TaskPriority, due_date: str | None, created_at: str | None, updated_at: str | None, tags: list[str] | None) -> None:
         super().__init__(id, name, description, status, priority, due_date, created_at, updated_at, tags);
-        self.set(4, 10, True, True, True);
+        self.profile = DEFAULT_FORMAT_PROFILE;
+    
+    @classmethod
+    def from_records(cls, records: Iterable[dict], trusted: bool = False, profile: FormatProfile | None = None) -> list['FormattedTask']:
+        tasks = super().from_records(records, trusted);
+        if(profile is not None and profile is not DEFAULT_FORMAT_PROFILE):
+            for task in tasks:
+                task.profile = profile;
+        return tasks;
     
     def getTaskPriorityString(self) -> str:
-        priority_str = {
-            TaskPriority.LOW: '(!)',
-            TaskPriority.MEDIUM: '(!!)',
-            TaskPriority.HIGH: '(!!!)',
-            TaskPriority.URGENT: '(_!!!!_)'
-        }[self.priority];
-        
-        return f"{priority_str:<8}";
+        return FT__PRIORITY_STRINGS[self.priority];
     
     def set(self, nameWidth: int, descriptionWidth: int, showTags: bool, showCreated: bool, showUpdated: bool) -> None:
-        if(not isinstance(nameWidth, int)):
-            raise TaskException("Task name width must be an integer");
-        if(not isinstance(descriptionWidth, int)):
-            raise TaskException("Task description width must be an integer");
-        if(not isinstance(showTags, bool)):
-            raise TaskException("Task show tags must be a boolean");
-        if(not isinstance(showCreated, bool)):
-            raise TaskException("Task show created date must be a boolean");
-        if(not isinstance(showUpdated, bool)):
-            raise TaskException("Task show updated date must be a boolean");
-        
+        self.profile = getFormatProfile(nameWidth, descriptionWidth, showTags, showCreated, showUpdated);
+    
+    @property
+    def format(self) -> dict:
+        return self.profile.asDict();
+    
+    def _contentKey(self) -> tuple:
+        tags = tuple(self.tags) if isinstance(self.tags, list) else self.tags;
+        return (self.id, self.name, self.description, self.status, self.priority, self.due_date, self.created_at, self.updated_at, tags);
+    
+    def render(self, profile: FormatProfile | None = None, nameWidth: int | None = None, descriptionWidth: int | None = None) -> str:
+        """Renders the task with `profile` (its own by default). `nameWidth`/`descriptionWidth` override the profile widths, e.g. to align a table.
+        """
+        profile = profile or self.profile;
+        nameWidth = profile.nameWidth if nameWidth is None else nameWidth;
+        descriptionWidth = profile.descriptionWidth if descriptionWidth is None else descriptionWidth;
         
-        self.name = f"{self.name:<{nameWidth}}";
-        self.description = f"{self.description:<{descriptionWidth}}";
-        self.tags = f"{self.tags}" if showTags else "";
-        self.created_at = f"{self.created_at}" if showCreated else "";
-        self.updated_at = f"{self.updated_at}" if showUpdated else "";
+        key = (self._contentKey(), profile, nameWidth, descriptionWidth);
+        line = RENDER_CACHE.get(key);
+        if(line is not None):
+            RENDER_CACHE.move_to_end(key);
+            return line;
         
-        self.format = {
-            'nameWidth': nameWidth,
-            'descriptionWidth': descriptionWidth,
-            'showTags': showTags,
-            'showCreated': showCreated,
-            'showUpdated': showUpdated
-        };
+        parts = [
+            f"{FT__STATUS_STRINGS[self.status]} {FT__PRIORITY_STRINGS[self.priority]} [#{self.id}] {self.name:<{nameWidth}}",
+            f"{self.description:<{descriptionWidth}}"
+        ];
+        if(self.due_date is not None):
+            parts.append(f"due::{self.due_date}");
+        if(profile.showCreated):
+            parts.append(f"cdate::{self.created_at}");
+        if(profile.showUpdated):
+            parts.append(f"udate::{self.updated_at}");
+        if(profile.showTags):
+            parts.append(f"tags::{self.tags}");
+        line = ' - '.join(parts);
         
+        RENDER_CACHE[key] = line;
+        if(len(RENDER_CACHE) > RENDER_CACHE_SIZE):
+            RENDER_CACHE.popitem(last=False);
+        return line;
+    
     def __str__(self) -> str:
-        catched_str = super().__str__();
-        
-        if(self.format["showCreated"] == False):
-            catched_str = catched_str.replace(f"- cdate::{self.created_at}", "");
-        if(self.format["showUpdated"] == False):
-            catched_str = catched_str.replace(f"- udate::{self.updated_at}", "");        
-        if(self.format['showTags']):
-            catched_str += f" - tags::{self.tags}";
-        if(self.due_date is None):
-            catched_str = catched_str.replace("- due::None", "");
-        
-        return catched_str;
+        return self.render();
     
     def __json__(self) -> str:
         return super().__json__() + self.format;
     
-    def get(self) -> dict:
+    def get(self, compact: bool = False) -> dict:
+        """Serializes the task. With `compact`, status and priority are stored as their integer codes instead of `TaskStatus.X` strings;
+        both forms are read back by every decoder.
+        """
         return {
-            'format': {
-                'nameWidth': self.format['nameWidth'],
-                'descriptionWidth': self.format['descriptionWidth'],
-                'showTags': self.format['showTags'],
-                'showCreated': self.format['showCreated'],
-                'showUpdated': self.format['showUpdated']
-            },
+            'format': self.profile.asDict(),
             
             'task': {
                 'id': self.id,
                 'name': self.name,
                 'description': self.description,
-                'status': str(self.status),
-                'priority': str(self.priority),
+                'status': self.status.value if compact else str(self.status),
+                'priority': self.priority.value if compact else str(self.priority),
                 'due_date': self.due_date,
                 'created_at': self.created_at,
                 'updated_at': self.updated_at,
@@ -256,6 +401,16 @@ class FormattedTask(Task):
             }            
         };
 
+def render_many(tasks: Iterable[FormattedTask], profile: FormatProfile | None = None) -> str:
+    """Renders `tasks` as one aligned table: name and description columns are as wide as the widest entry (and at least the profile widths).
+    """
+    tasks = list(tasks);
+    profile = profile or DEFAULT_FORMAT_PROFILE;
+    nameWidth = max([profile.nameWidth] + [len(task.name) for task in tasks]);
+    descriptionWidth = max([profile.descriptionWidth] + [len(task.description) for task in tasks]);
+    
+    return '\n'.join([task.render(profile, nameWidth, descriptionWidth) for task in tasks]);
+
 
 def setRandomTask() -> FormattedTask:
     from math import floor;
@@ -280,6 +435,29 @@ def setTaskFromDict(task: dict) -> Task:
 def setFormattedTaskFromDict(task: dict) -> FormattedTask:
     return FormattedTask(task['task']['id'], task['task']['name'], task['task']['description'], task['task']['status'], task['task']['priority'], task['task']['due_date'], task['task']['created_at'], task['task']['updated_at'], task['task']['tags']);
 
+def setFormattedTasksFromDicts(tasks: Iterable[dict], trusted: bool = False) -> list[FormattedTask]:
+    """Batch variant of `setFormattedTaskFromDict`: one validation for the whole batch, see `Task.from_records`.
+    """
+    return FormattedTask.from_records([task['task'] for task in tasks], trusted);
+
+#   Task dictionaries decoded per batch by `iterFormattedTasksFromDicts`
+TASK__DECODE_CHUNK = 1024;
+
+def iterFormattedTasksFromDicts(tasks: Iterable[dict], predicate: Callable[[dict], bool] | None = None, trusted: bool = False) -> Iterator[FormattedTask]:
+    """Lazily builds a `FormattedTask` for each task dictionary, skipping the ones `predicate` rejects before any object is built.
+    Paired with `jsonShelves.iterShelf` this walks a task file of any size in constant memory.
+    Tasks are decoded in batches of `TASK__DECODE_CHUNK` with `setFormattedTasksFromDicts`.
+    """
+    chunk = [];
+    for task in tasks:
+        if(predicate is None or predicate(task)):
+            chunk.append(task);
+            if(len(chunk) == TASK__DECODE_CHUNK):
+                yield from setFormattedTasksFromDicts(chunk, trusted);
+                chunk = [];
+    if(chunk):
+        yield from setFormattedTasksFromDicts(chunk, trusted);
+
 #   Parser classes for Task objects
 #   -------------------------------------------------------------------------------------------------------------------
 class TaskParser:
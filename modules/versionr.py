@@ -0,0 +1,381 @@
+"""
+Copy-on-write snapshots of a keyed `IterableShelve`.
+
+A `VersionStore` is a shelve listener (`add(key, entry)`, `discard(key, entry)`) mirroring the entries in a `PersistentMap`,
+an immutable hash array mapped trie: a change copies the O(log32 N) nodes on the path to its key and shares every other node
+with the previous version. So `snapshot()` is O(1), and a `Snapshot` can be read (iterated, queried) from any thread while
+writers go on; it never changes. Versions nobody refers to any longer are freed by the garbage collector; `release()`
+(or leaving a `with` block) drops the reference of a snapshot early.
+
+The store also keeps the map before each of the last `depth` changes, so they can be undone:
+
+    with store.snapshot() as frozen:            # point-in-time view
+        report = compileQuery('status=PENDING').execute(frozen);
+    store.undo(shelve, 3);                      # reverts the last 3 changes through the shelve (file, indexes and listeners)
+
+A change is the insert, update or removal of one entry; a batch of n entries is n changes. Entries are shared with
+the shelve, not copied: they are never modified in place, updates replace them.
+"""
+
+import threading;
+import weakref;
+from collections import deque;
+
+VERSIONS__BITS      = 5;
+VERSIONS__MASK      = (1 << VERSIONS__BITS) - 1;
+VERSIONS__HASH_MASK = (1 << 64) - 1;
+VERSIONS__DEPTH     = 100;
+
+
+class VersionException(Exception):
+    def __init__(self, message: str) -> None:
+        super().__init__(message);
+        self.message = message;
+
+    def __str__(self) -> str:
+        return self.message;
+
+    def __repr__(self) -> str:
+        return f"VersionException(message={self.message})";
+
+
+#   Trie nodes
+#   -----------------------------------------------------------------------------------------------------------------------
+#   A node holds a bitmap of the 32 possible slots at its level and the occupied ones, in order. A slot is either a leaf,
+#   the tuple `(hash, key, value)`, or a child node. Keys whose 64-bit hashes are equal share a `_Collision` node.
+#   Nodes are never modified once built.
+class _Bitmap:
+    __slots__ = ['bitmap', 'items'];
+
+    def __init__(self, bitmap: int, items: tuple) -> None:
+        self.bitmap = bitmap;
+        self.items  = items;
+
+
+class _Collision:
+    __slots__ = ['hash', 'pairs'];
+
+    def __init__(self, hash: int, pairs: tuple) -> None:
+        self.hash   = hash;
+        self.pairs  = pairs;
+
+
+def _hash(key) -> int:
+    return hash(key) & VERSIONS__HASH_MASK;
+
+def _slotHash(slot) -> int:
+    return slot[0] if type(slot) is tuple else slot.hash;
+
+def _join(slot, leaf: tuple, shift: int):
+    """A node holding `slot` (a leaf or a `_Collision`) and `leaf`, whose hashes agree below `shift`.
+    """
+    h1, h2 = _slotHash(slot), leaf[0];
+    if(h1 == h2):
+        pairs = slot.pairs if type(slot) is _Collision else ((slot[1], slot[2]),);
+        return _Collision(h1, pairs + ((leaf[1], leaf[2]),));
+    i1, i2 = (h1 >> shift) & VERSIONS__MASK, (h2 >> shift) & VERSIONS__MASK;
+    if(i1 == i2):
+        return _Bitmap(1 << i1, (_join(slot, leaf, shift + VERSIONS__BITS),));
+    return _Bitmap((1 << i1) | (1 << i2), (slot, leaf) if i1 < i2 else (leaf, slot));
+
+def _get(node, h: int, key, default):
+    shift = 0;
+    while(True):
+        if(type(node) is _Collision):
+            if(node.hash == h):
+                for pair_key, value in node.pairs:
+                    if(pair_key == key):
+                        return value;
+            return default;
+        bit = 1 << ((h >> shift) & VERSIONS__MASK);
+        if(not node.bitmap & bit):
+            return default;
+        slot = node.items[(node.bitmap & (bit - 1)).bit_count()];
+        if(type(slot) is tuple):
+            return slot[2] if slot[0] == h and slot[1] == key else default;
+        node = slot;
+        shift += VERSIONS__BITS;
+
+def _assoc(node, leaf: tuple, shift: int) -> tuple:
+    """Returns `(node with leaf, whether the key is new)`; `node` itself when it already holds that exact value.
+    """
+    h = leaf[0];
+    if(type(node) is _Collision):
+        if(node.hash != h):
+            return _join(node, leaf, shift), True;
+        for position, (key, value) in enumerate(node.pairs):
+            if(key == leaf[1]):
+                if(value is leaf[2]):
+                    return node, False;
+                return _Collision(h, node.pairs[:position] + ((key, leaf[2]),) + node.pairs[position + 1:]), False;
+        return _Collision(h, node.pairs + ((leaf[1], leaf[2]),)), True;
+
+    bit = 1 << ((h >> shift) & VERSIONS__MASK);
+    position = (node.bitmap & (bit - 1)).bit_count();
+    items = node.items;
+    if(not node.bitmap & bit):
+        return _Bitmap(node.bitmap | bit, items[:position] + (leaf,) + items[position:]), True;
+
+    slot = items[position];
+    if(type(slot) is tuple):
+        if(slot[0] == h and slot[1] == leaf[1]):
+            if(slot[2] is leaf[2]):
+                return node, False;
+            child, added = leaf, False;
+        else:
+            child, added = _join(slot, leaf, shift + VERSIONS__BITS), True;
+    else:
+        child, added = _assoc(slot, leaf, shift + VERSIONS__BITS);
+        if(child is slot):
+            return node, False;
+    return _Bitmap(node.bitmap, items[:position] + (child,) + items[position + 1:]), added;
+
+def _dissoc(node, h: int, key, shift: int):
+    """Returns the node without `key`: `node` itself when the key is absent, `None` when nothing is left,
+    or a single leaf for the parent to hold in place of a node below the root.
+    """
+    if(type(node) is _Collision):
+        pairs = tuple(pair for pair in node.pairs if pair[0] != key) if node.hash == h else node.pairs;
+        if(len(pairs) == len(node.pairs)):
+            return node;
+        if(len(pairs) == 1):
+            return (h, pairs[0][0], pairs[0][1]);
+        return _Collision(h, pairs);
+
+    bit = 1 << ((h >> shift) & VERSIONS__MASK);
+    if(not node.bitmap & bit):
+        return node;
+    position = (node.bitmap & (bit - 1)).bit_count();
+    items = node.items;
+    slot = items[position];
+    if(type(slot) is tuple):
+        if(slot[0] != h or slot[1] != key):
+            return node;
+        child = None;
+    else:
+        child = _dissoc(slot, h, key, shift + VERSIONS__BITS);
+        if(child is slot):
+            return node;
+
+    if(child is None):
+        if(len(items) == 1):
+            return None;
+        items = items[:position] + items[position + 1:];
+        if(shift > 0 and len(items) == 1 and type(items[0]) is tuple):
+            return items[0];
+        return _Bitmap(node.bitmap & ~bit, items);
+    if(shift > 0 and len(items) == 1 and type(child) is tuple):
+        return child;
+    return _Bitmap(node.bitmap, items[:position] + (child,) + items[position + 1:]);
+
+def _leaves(node):
+    """Yields the `(key, value)` pairs below `node`, depth first.
+    """
+    stack = [node];
+    while(stack):
+        node = stack.pop();
+        if(type(node) is _Collision):
+            yield from node.pairs;
+            continue;
+        for slot in node.items:
+            if(type(slot) is tuple):
+                yield slot[1], slot[2];
+            else:
+                stack.append(slot);
+
+
+VERSIONS__EMPTY = _Bitmap(0, ());
+
+
+class PersistentMap:
+    """Immutable mapping; `assoc` and `dissoc` return a new map sharing all but O(log32 N) nodes with this one.
+    """
+    __slots__ = ['root', 'count'];
+
+    def __init__(self, root: _Bitmap = VERSIONS__EMPTY, count: int = 0) -> None:
+        self.root   = root;
+        self.count  = count;
+
+    def get(self, key, default=None):
+        return _get(self.root, _hash(key), key, default);
+
+    def assoc(self, key, value) -> 'PersistentMap':
+        root, added = _assoc(self.root, (_hash(key), key, value), 0);
+        if(root is self.root):
+            return self;
+        return PersistentMap(root, self.count + 1 if added else self.count);
+
+    def dissoc(self, key) -> 'PersistentMap':
+        root = _dissoc(self.root, _hash(key), key, 0);
+        if(root is self.root):
+            return self;
+        return PersistentMap(VERSIONS__EMPTY if root is None else root, self.count - 1);
+
+    def items(self):
+        return _leaves(self.root);
+
+    def keys(self):
+        return (key for key, _ in _leaves(self.root));
+
+    def values(self):
+        return (value for _, value in _leaves(self.root));
+
+    def __contains__(self, key) -> bool:
+        return _get(self.root, _hash(key), key, _Bitmap) is not _Bitmap;
+
+    def __iter__(self):
+        return self.keys();
+
+    def __len__(self) -> int:
+        return self.count;
+
+    def __str__(self) -> str:
+        return f"PersistentMap(count={self.count})";
+
+    def __repr__(self) -> str:
+        return f"PersistentMap(count={self.count})";
+
+
+class Snapshot:
+    """Frozen version of the entries of a shelve. Iterating yields the entries, so a `QueryPlan` can execute on it.
+    """
+    __slots__ = ['entries', 'version', '__weakref__'];
+
+    def __init__(self, entries: PersistentMap, version: int) -> None:
+        self.entries = entries;
+        self.version = version;
+
+    def get(self, key, default=None) -> dict | None:
+        return self.entries.get(key, default);
+
+    def keys(self):
+        return self.entries.keys();
+
+    def release(self) -> None:
+        """Drops the version held by this snapshot, so it can be freed before the snapshot itself is.
+        """
+        self.entries = PersistentMap();
+
+    def __enter__(self) -> 'Snapshot':
+        return self;
+
+    def __exit__(self, *exc_info) -> None:
+        self.release();
+
+    def __contains__(self, key) -> bool:
+        return key in self.entries;
+
+    def __iter__(self):
+        return self.entries.values();
+
+    def __len__(self) -> int:
+        return len(self.entries);
+
+    def __str__(self) -> str:
+        return f"Snapshot(version={self.version}, entries={len(self.entries)})";
+
+    def __repr__(self) -> str:
+        return f"Snapshot(version={self.version}, entries={len(self.entries)})";
+
+
+class VersionStore:
+    """Versioned mirror of the entries of a keyed shelve, with O(1) snapshots and undo. See the module docstring.
+    """
+    __slots__ = ['current', 'version', 'history', 'lock', 'snapshots', 'pending', 'replaying'];
+
+    def __init__(self, depth: int = VERSIONS__DEPTH) -> None:
+        self.current    = PersistentMap();
+        self.version    = 0;
+        #   `(version, key, map)` before each of the last `depth` changes, oldest first
+        self.history    = deque(maxlen=depth);
+        self.lock       = threading.RLock();
+        self.snapshots  = weakref.WeakSet();
+        #   `(key, map)` right after a discard: an `add` of the same key that follows is the second half of an update
+        self.pending    = None;
+        self.replaying  = False;
+
+    #   Listener protocol
+    #   -------------------------------------------------------------------------------------------------------------------
+    def add(self, key, entry: dict) -> None:
+        with self.lock:
+            previous = self.current;
+            self.current = previous.assoc(key, entry);
+            pending, self.pending = self.pending, None;
+            if(pending is None or pending[0] != key or pending[1] is not previous):
+                self._record(key, previous);
+
+    def discard(self, key, entry: dict) -> None:
+        with self.lock:
+            previous = self.current;
+            self.current = previous.dissoc(key);
+            self._record(key, previous);
+            self.pending = (key, self.current);
+
+    def _record(self, key, previous: PersistentMap) -> None:
+        if(not self.replaying):
+            self.history.append((self.version, key, previous));
+        self.version += 1;
+
+    def forget(self) -> None:
+        """Drops the undo history, e.g. right after attaching, so that loading the entries is not a change.
+        """
+        with self.lock:
+            self.history.clear();
+            self.pending = None;
+
+    #   Versions
+    #   -------------------------------------------------------------------------------------------------------------------
+    def snapshot(self, version: int | None = None) -> Snapshot:
+        """Returns a frozen view of the entries, in O(1): the current version, or one of the last `depth` versions.
+        Raises `VersionException` for a version no longer (or not yet) kept.
+        """
+        with self.lock:
+            if(version is None or version == self.version):
+                snapshot = Snapshot(self.current, self.version);
+            else:
+                entries = next((entries for past, _, entries in self.history if past == version), None);
+                if(entries is None):
+                    raise VersionException(f"VersionUnavailable::Version {version} is not kept (current is {self.version}).");
+                snapshot = Snapshot(entries, version);
+            self.snapshots.add(snapshot);
+        return snapshot;
+
+    def undo(self, shelve, n: int = 1) -> int:
+        """Reverts the last `n` changes (at most the kept ones) by writing the entries they replaced back through `shelve`,
+        which must be the shelve this store is attached to. Returns the number of changes undone.
+        """
+        with shelve.lock, self.lock:
+            records = [self.history.pop() for _ in range(min(n, len(self.history)))];
+            if(not records):
+                return 0;
+            target = records[-1][2];
+            removes, updates, inserts = [], [], [];
+            for key in dict.fromkeys(record[1] for record in records):
+                before, now = target.get(key), self.current.get(key);
+                if(before is now):
+                    continue;
+                if(before is None):
+                    removes.append(now);
+                elif(now is None):
+                    inserts.append(before);
+                else:
+                    updates.append(before);
+
+            self.replaying = True;
+            try:
+                for apply, entries in ((shelve.remove_many, removes), (shelve.update_many, updates), (shelve.insert_many, inserts)):
+                    if(entries):
+                        apply(entries);
+            finally:
+                self.replaying = False;
+                self.pending = None;
+        return len(records);
+
+    def __len__(self) -> int:
+        return len(self.current);
+
+    def __str__(self) -> str:
+        return f"VersionStore(version={self.version}, entries={len(self.current)})";
+
+    def __repr__(self) -> str:
+        return f"VersionStore(version={self.version}, entries={len(self.current)}, history={len(self.history)}, snapshots={len(self.snapshots)})";
@@ -0,0 +1,67 @@
+"""
+Tests for `shardedShelves`: the manifest only switches to a new set of shard files once every dirty shard is written.
+"""
+
+import os;
+import errno;
+import pytest;
+from unittest import mock;
+
+import shardedShelves;
+from indexr import taskKey;
+from jsonShelves import DurabilityPolicy;
+from shardedShelves import ShardedShelve, readManifest;
+
+SHARDS = 4;
+
+
+def task(id: int, name: str) -> dict:
+    return {'task': {'id': id, 'name': name}};
+
+def names(filepath: str) -> set:
+    return {object_dict['task']['name'] for object_dict in ShardedShelve(filepath, taskKey, processes=False).data};
+
+@pytest.fixture
+def filepath(tmp_path) -> str:
+    filepath = str(tmp_path / 'tasks_dict.json');
+    shelve = ShardedShelve(filepath, taskKey, shards=SHARDS, processes=False);
+    shelve.insert_many([task(id, 'saved') for id in range(1, 41)]);
+    shelve.close();
+    return filepath;
+
+def failingWrite(failures: int):
+    """A `writeShelf` that fails with ENOSPC from its `failures`-th call on, as on a full disk.
+    """
+    write, calls = shardedShelves.writeShelf, [];
+    def patched(path, entries, *args, **kwargs):
+        calls.append(path);
+        if(len(calls) >= failures):
+            raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC));
+        return write(path, entries, *args, **kwargs);
+    return patched;
+
+
+def test_failed_shard_write_keeps_manifest(filepath):
+    manifest = readManifest(filepath);
+    shelve = ShardedShelve(filepath, taskKey, processes=False, durability=DurabilityPolicy.ON_CLOSE);
+    shelve.update_many([task(id, 'unsaved') for id in range(1, 41)]);
+
+    with mock.patch('shardedShelves.writeShelf', failingWrite(3)):
+        shelve.save();
+    assert readManifest(filepath) == manifest;
+    assert all(os.path.exists(path) for path in shardedShelves.shardFiles(filepath, manifest));
+    assert names(filepath) == {'saved'};
+    assert shelve.dirty_shards;
+
+def test_save_after_failure_switches_manifest(filepath):
+    previous = shardedShelves.shardFiles(filepath, readManifest(filepath));
+    shelve = ShardedShelve(filepath, taskKey, processes=False, durability=DurabilityPolicy.ON_CLOSE);
+    shelve.update_many([task(id, 'unsaved') for id in range(1, 41)]);
+    with mock.patch('shardedShelves.writeShelf', failingWrite(3)):
+        shelve.save();
+
+    shelve.save();
+    manifest = readManifest(filepath);
+    assert manifest['generation'] > 0;
+    assert names(filepath) == {'unsaved'};
+    assert not any(os.path.exists(path) for path in previous);
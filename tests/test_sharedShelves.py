@@ -0,0 +1,76 @@
+"""
+Tests for `sharedShelves`: optimistic updates under both policies and journal tails torn by a crashed writer.
+Two `SharedShelve` objects on the same file stand for two processes; each holds its own `FileLock`.
+"""
+
+import os;
+import pytest;
+
+from indexr import taskKey;
+from jsonShelves import ShelfStatus;
+from sharedShelves import SharedShelve, SharedPolicy, ShelfConflict;
+
+
+def task(id: int, name: str) -> dict:
+    return {'task': {'id': id, 'name': name}};
+
+@pytest.fixture
+def filepath(tmp_path) -> str:
+    return str(tmp_path / 'tasks_dict.json');
+
+def names(shelve: SharedShelve) -> dict:
+    return {taskKey(object_dict): object_dict['task']['name'] for object_dict in shelve.data};
+
+
+def test_reject_stale_update(filepath):
+    first, second = SharedShelve(filepath, taskKey), SharedShelve(filepath, taskKey);
+    first.insert(task(1, 'created'));
+    second.refresh();
+
+    first.update(task(1, 'first'));
+    with pytest.raises(ShelfConflict):
+        second.update(task(1, 'second'));
+    assert names(second) == {1: 'first'};
+    assert names(SharedShelve(filepath, taskKey)) == {1: 'first'};
+
+def test_reject_batch_only_conflicting_entries(filepath):
+    first, second = SharedShelve(filepath, taskKey), SharedShelve(filepath, taskKey);
+    first.insert_many([task(1, 'created'), task(2, 'created')]);
+    second.refresh();
+
+    first.update(task(1, 'first'));
+    statuses = second.update_many([task(1, 'second'), task(2, 'second')]);
+    assert statuses == [ShelfStatus.SHELF_STATUS__ERR_CONFLICT, ShelfStatus.SHELF_STATUS__SUCCESS];
+    assert names(SharedShelve(filepath, taskKey)) == {1: 'first', 2: 'second'};
+
+def test_overwrite_applies_stale_update(filepath):
+    first, second = SharedShelve(filepath, taskKey), SharedShelve(filepath, taskKey, policy=SharedPolicy.OVERWRITE);
+    first.insert(task(1, 'created'));
+    second.refresh();
+
+    first.update(task(1, 'first'));
+    second.update(task(1, 'second'));
+    first.refresh();
+    assert names(first) == {1: 'second'};
+    assert names(SharedShelve(filepath, taskKey)) == {1: 'second'};
+
+def test_refresh_skips_torn_record(filepath):
+    first, second = SharedShelve(filepath, taskKey), SharedShelve(filepath, taskKey);
+    first.insert(task(1, 'created'));
+    #   A writer crashed mid-record; the next append continues the same line
+    with open(f"{filepath}.journal", 'a') as f:
+        f.write('{"op": "insert", "da');
+    second.insert(task(2, 'created'));
+
+    first.refresh();
+    assert names(first) == {1: 'created', 2: 'created'};
+
+def test_compaction_folds_journal(filepath):
+    first, second = SharedShelve(filepath, taskKey), SharedShelve(filepath, taskKey);
+    first.insert_many([task(1, 'created'), task(2, 'created')]);
+    first.compact();
+    assert os.path.getsize(f"{filepath}.journal") == 0;
+
+    second.refresh();
+    assert second.generation == first.generation;
+    assert names(second) == {1: 'created', 2: 'created'};